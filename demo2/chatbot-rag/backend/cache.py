@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+import numpy as np
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry"""
+
+    def __init__(self, max_size: int = 1024):
+        """
+        Initialize LRUCache
+
+        Args:
+            max_size: Maximum number of entries kept; 0 disables the cache
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        Look up an entry and mark it as most recently used
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any):
+        """Store an entry, evicting the least recently used ones beyond max_size"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries, keeping the hit and miss counters"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Get the size, capacity, hit and miss counts and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SemanticCache:
+    """
+    Thread-safe bounded cache looked up by embedding similarity instead of exact key
+
+    A lookup returns the value of the most similar live entry if its cosine
+    similarity to the query embedding reaches the threshold. Entries carry a
+    scope, such as a collection version, and only match lookups with the same
+    scope, so bumping the version invalidates everything cached before it.
+    Entries expire after ttl_seconds, and the least recently used one is
+    evicted when the cache is full.
+    """
+
+    def __init__(self, max_size: int = 256, threshold: float = 0.95, ttl_seconds: float = 3600):
+        """
+        Initialize SemanticCache
+
+        Args:
+            max_size: Maximum number of entries kept; 0 disables the cache
+            threshold: Minimum cosine similarity for a lookup to match an entry
+            ttl_seconds: Seconds an entry stays valid; 0 keeps entries until evicted
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._vectors: np.ndarray | None = None  # slot -> normalized embedding
+        self._expires = np.full(max(max_size, 0), -np.inf)  # slot -> expiry time, -inf if free
+        # slot -> (scope, value, tags)
+        self._entries: OrderedDict[int, tuple[Hashable, Any, frozenset]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, embedding: list[float], scope: Hashable = None) -> Any | None:
+        """
+        Look up the entry most similar to an embedding and mark it as most recently used
+
+        Args:
+            embedding: Query embedding
+            scope: Only entries stored with an equal scope match
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        if self.max_size <= 0:
+            return None
+        query = _normalize(embedding)
+        with self._lock:
+            slot = self._best_slot(query, scope)
+            if slot is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return self._entries[slot][1]
+
+    def _best_slot(self, query: np.ndarray, scope: Hashable) -> int | None:
+        """Find the live slot of the most similar entry in scope (caller holds the lock)"""
+        if not self._entries or self._vectors is None or len(query) != self._vectors.shape[1]:
+            return None
+        scores = self._vectors @ query
+        scores[self._expires <= time.monotonic()] = -np.inf
+        for slot, (entry_scope, _, _) in self._entries.items():
+            if entry_scope != scope:
+                scores[slot] = -np.inf
+        slot = int(np.argmax(scores))
+        return slot if scores[slot] >= self.threshold else None
+
+    def put(
+        self,
+        embedding: list[float],
+        value: Any,
+        scope: Hashable = None,
+        tags: frozenset = frozenset(),
+    ):
+        """
+        Store an entry, replacing an expired or the least recently used one when full
+
+        Args:
+            embedding: Query embedding
+            value: Cached value
+            scope: Scope the entry matches lookups in
+            tags: Labels the entry can be discarded by, such as the documents it depends on
+        """
+        if self.max_size <= 0:
+            return
+        vector = _normalize(embedding)
+        with self._lock:
+            if self._vectors is None or len(vector) != self._vectors.shape[1]:
+                self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+                self._expires[:] = -np.inf
+                self._entries.clear()
+
+            now = time.monotonic()
+            free = np.flatnonzero(self._expires <= now)
+            if len(free):
+                slot = int(free[0])
+                self._entries.pop(slot, None)
+            else:
+                slot, _ = self._entries.popitem(last=False)
+
+            self._vectors[slot] = vector
+            self._expires[slot] = now + self.ttl_seconds if self.ttl_seconds > 0 else np.inf
+            self._entries[slot] = (scope, value, tags)
+
+    def discard(self, tag: Hashable) -> int:
+        """Drop the entries stored with a tag and return how many there were"""
+        with self._lock:
+            slots = [slot for slot, (_, _, tags) in self._entries.items() if tag in tags]
+            for slot in slots:
+                del self._entries[slot]
+                self._expires[slot] = -np.inf
+            return len(slots)
+
+    def clear(self):
+        """Drop all entries, keeping the hit and miss counters"""
+        with self._lock:
+            self._expires[:] = -np.inf
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._expires > time.monotonic()))
+
+    def stats(self) -> dict:
+        """Get the size, capacity, threshold, TTL, hit and miss counts and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _normalize(embedding: list[float]) -> np.ndarray:
+    """Scale an embedding to unit length"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
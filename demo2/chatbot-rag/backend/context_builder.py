@@ -0,0 +1,111 @@
+# Rough number of characters per LLM token, used to estimate prompt sizes
+CHARS_PER_TOKEN = 4
+
+# Smallest remainder of the budget worth filling with a truncated passage
+MIN_PARTIAL_TOKENS = 64
+
+# Shortest overlap recognized between chunks without offsets; chunks overlap by far
+# more, so shorter matches are likely coincidental
+OVERLAP_PROBE_CHARS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of LLM tokens in a text"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def pack_context(chunks: list[str], metadatas: list[dict], token_budget: int = 0) -> list[str]:
+    """
+    Assemble retrieved chunks into deduplicated passages that fit a token budget
+
+    Hits are grouped by document and put in document order. Consecutive chunks
+    are merged into one passage, dropping the text they overlap by: it is cut
+    at the chunk's start and end offsets when they are stored, or found by
+    matching the chunks' edges otherwise. Passages are then taken in order of
+    their best-ranked chunk until the budget is spent, and returned grouped
+    by document, most relevant document first.
+
+    Args:
+        chunks: Chunk texts, best first
+        metadatas: Chunk metadata with doc_id and chunk_index, and optionally
+            start_offset and end_offset
+        token_budget: Maximum estimated tokens of all passages; 0 for no limit
+
+    Returns:
+        Passages of text
+    """
+    # Group hits by document, keeping each document's best rank
+    documents: dict[str, list[tuple[int, str, dict]]] = {}
+    for rank, (text, metadata) in enumerate(zip(chunks, metadatas, strict=True)):
+        documents.setdefault(metadata.get("doc_id"), []).append((rank, text, metadata))
+
+    # Merge runs of consecutive chunks within each document
+    passages = []  # (best rank, document order, text)
+    for document_order, hits in enumerate(documents.values()):
+        hits.sort(key=lambda hit: hit[2].get("chunk_index", 0))
+        rank, text, previous = hits[0]
+        for next_rank, next_text, metadata in hits[1:]:
+            merged = _merge(text, previous, next_text, metadata)
+            if merged is None:
+                passages.append((rank, document_order, text))
+                rank, text = next_rank, next_text
+            else:
+                rank, text = min(rank, next_rank), merged
+            previous = metadata
+        passages.append((rank, document_order, text))
+
+    # Take the most relevant passages that fit, truncating the last one if worthwhile
+    selected = []
+    remaining = token_budget
+    for rank, document_order, text in sorted(passages):
+        if token_budget:
+            tokens = estimate_tokens(text)
+            if tokens > remaining:
+                if remaining < MIN_PARTIAL_TOKENS:
+                    continue
+                text = _truncate(text, remaining)
+                tokens = remaining
+            remaining -= tokens
+        selected.append((document_order, rank, text))
+
+    return [text for _, _, text in sorted(selected)]
+
+
+def _merge(text: str, metadata: dict, next_text: str, next_metadata: dict) -> str | None:
+    """Join two chunks of a document without their overlap, or None if they are not adjacent"""
+    if next_metadata.get("chunk_index", 0) != metadata.get("chunk_index", 0) + 1:
+        return None
+
+    end = metadata.get("end_offset")
+    next_start = next_metadata.get("start_offset")
+    if end is not None and next_start is not None:
+        if next_start > end + 1:
+            return None
+        # Chunks are exact spans of the document text, so the overlap is known
+        overlap = end - next_start
+        if overlap < 0:
+            # The whitespace between the spans was trimmed from both chunks
+            return f"{text} {next_text}"
+        return text + next_text[overlap:]
+
+    overlap = _overlap_length(text, next_text)
+    return text + next_text[overlap:] if overlap else f"{text} {next_text}"
+
+
+def _overlap_length(text: str, next_text: str) -> int:
+    """Find the length of the longest end of text that next_text starts with, if not too short"""
+    probe = next_text[:OVERLAP_PROBE_CHARS]
+    position = text.find(probe, max(len(text) - len(next_text), 0))
+    while position != -1:
+        if next_text.startswith(text[position:]):
+            return len(text) - position
+        position = text.find(probe, position + 1)
+    return 0
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Cut a text to about the given number of tokens, at a word boundary"""
+    cut = text[: tokens * CHARS_PER_TOKEN]
+    if len(cut) < len(text) and " " in cut:
+        cut = cut[: cut.rfind(" ")]
+    return cut + " ..."
@@ -1,104 +1,425 @@
-import re
+import io
+import os
+import threading
+from bisect import bisect_right
+from collections.abc import Generator, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
 
 import docx
 import openpyxl
 import pypdf
 from pptx import Presentation
 
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizerBase
+
+# File types process_document can handle
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".doc", ".xlsx", ".xls", ".pptx", ".ppt", ".txt", ".md"}
+
+# Block size used when streaming plain text files
+TEXT_READ_SIZE = 1024 * 1024
+
+# PDFs with fewer pages than this are always extracted serially
+PARALLEL_PDF_MIN_PAGES = 32
+
+# Page ranges handed out per PDF worker, so slow pages don't stall one worker
+PDF_RANGES_PER_WORKER = 4
+
+# Characters buffered before tokenizing when chunking by tokens
+TOKENIZE_BLOCK_CHARS = 64 * 1024
+
+
+class TextChunk(NamedTuple):
+    """A chunk of text and its [start, end) span in the normalized document text"""
+
+    text: str
+    start: int
+    end: int
+
 
 class DocumentProcessor:
     """Process various document types and extract text"""
 
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        pdf_workers: int = 1,
+        parallel_pdf_min_pages: int = PARALLEL_PDF_MIN_PAGES,
+        excel_max_rows_per_sheet: int | None = None,
+        excel_skip_sheets: Iterable[str] = (),
+        tokenizer: "PreTrainedTokenizerBase | None" = None,
+        max_tokens: int | None = None,
+        token_overlap: int | None = None,
+    ):
+        """
+        Initialize DocumentProcessor
+
+        Chunks are measured in characters (chunk_size, chunk_overlap) unless a
+        tokenizer is given, in which case they are sized in tokens so that each
+        chunk fits the embedding model's input exactly.
+
+        Args:
+            chunk_size: Characters per chunk
+            chunk_overlap: Characters shared by consecutive chunks
+            pdf_workers: Processes used to extract large PDFs; one pool of them is
+                shared by all documents processed concurrently
+            parallel_pdf_min_pages: Page count from which PDFs are extracted in parallel
+            excel_max_rows_per_sheet: Rows extracted per Excel sheet (None for all)
+            excel_skip_sheets: Names of Excel sheets to skip
+            tokenizer: Fast tokenizer of the embedding model, enables token-based chunking
+            max_tokens: Model input limit including special tokens
+                (default: tokenizer.model_max_length)
+            token_overlap: Tokens shared by consecutive chunks (default: 20% of a chunk)
+        """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.pdf_workers = pdf_workers
+        self.parallel_pdf_min_pages = parallel_pdf_min_pages
+        self._pdf_pool: ProcessPoolExecutor | None = None  # started on the first large PDF
+        self._pdf_pool_lock = threading.Lock()
+        self.excel_max_rows_per_sheet = excel_max_rows_per_sheet
+        self.excel_skip_sheets = set(excel_skip_sheets)
+
+        self.tokenizer = tokenizer
+        if tokenizer is not None:
+            # Leave room for the [CLS]/[SEP] style tokens the model adds
+            max_tokens = max_tokens or tokenizer.model_max_length
+            self.max_tokens = max_tokens - tokenizer.num_special_tokens_to_add()
+            self.token_overlap = (
+                token_overlap if token_overlap is not None else self.max_tokens // 5
+            )
+
+    def process_document(
+        self, file_path: str, stream: bool = False
+    ) -> list[str] | Iterator[TextChunk]:
+        """
+        Process document and return text chunks
+
+        Args:
+            file_path: Path to the document
+            stream: Return a lazy iterator that extracts and chunks the document
+                piece by piece instead of building the full text in memory
+
+        Returns:
+            List of text chunks, or an iterator of TextChunk when stream is True
+        """
+        segments = self._iter_segments(Path(file_path))
 
-    def process_document(self, file_path: str) -> list[str]:
-        """Process document and return text chunks"""
-        file_path = Path(file_path)
+        if stream:
+            return self._iter_chunks(segments)
+
+        # Split into chunks
+        return self._create_chunks("".join(segments))
+
+    def _iter_segments(self, file_path: Path) -> Iterator[str]:
+        """Return an iterator over the text segments of a document"""
         extension = file_path.suffix.lower()
 
         # Extract text based on file type
         if extension == ".pdf":
-            text = self._extract_from_pdf(file_path)
+            return self._extract_from_pdf(file_path)
         elif extension in [".docx", ".doc"]:
-            text = self._extract_from_docx(file_path)
+            return self._extract_from_docx(file_path)
         elif extension in [".xlsx", ".xls"]:
-            text = self._extract_from_excel(file_path)
+            return self._extract_from_excel(file_path)
         elif extension in [".pptx", ".ppt"]:
-            text = self._extract_from_pptx(file_path)
+            return self._extract_from_pptx(file_path)
         elif extension in [".txt", ".md"]:
-            text = self._extract_from_text(file_path)
+            return self._extract_from_text(file_path)
         else:
             raise ValueError(f"Unsupported file type: {extension}")
 
-        # Split into chunks
-        chunks = self._create_chunks(text)
-        return chunks
-
-    def _extract_from_pdf(self, file_path: Path) -> str:
-        """Extract text from PDF"""
-        text = ""
+    def _extract_from_pdf(self, file_path: Path) -> Iterator[str]:
+        """Extract text from PDF, one page at a time"""
         with open(file_path, "rb") as file:
             pdf_reader = pypdf.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            page_count = len(pdf_reader.pages)
+
+            # Small files aren't worth the cost of starting worker processes
+            if self.pdf_workers <= 1 or page_count < self.parallel_pdf_min_pages:
+                for page in pdf_reader.pages:
+                    yield page.extract_text() + "\n"
+                return
+
+        # Split the pages into contiguous ranges and extract them in parallel
+        range_count = min(page_count, self.pdf_workers * PDF_RANGES_PER_WORKER)
+        bounds = [page_count * i // range_count for i in range(range_count + 1)]
+        # map returns results in submission order, so pages stay in order
+        for pages in self._get_pdf_pool().map(
+            _extract_pdf_pages, [str(file_path)] * range_count, bounds[:-1], bounds[1:]
+        ):
+            yield from pages
+
+    def _get_pdf_pool(self) -> ProcessPoolExecutor:
+        """Get the PDF worker pool, starting it on first use"""
+        with self._pdf_pool_lock:
+            if self._pdf_pool is None:
+                self._pdf_pool = ProcessPoolExecutor(max_workers=self.pdf_workers)
+            return self._pdf_pool
 
-    def _extract_from_docx(self, file_path: Path) -> str:
-        """Extract text from DOCX"""
+    def close(self):
+        """Stop the PDF worker processes"""
+        with self._pdf_pool_lock:
+            if self._pdf_pool is not None:
+                self._pdf_pool.shutdown()
+                self._pdf_pool = None
+
+    def _extract_from_docx(self, file_path: Path) -> Iterator[str]:
+        """Extract text from DOCX, one paragraph at a time"""
         doc = docx.Document(file_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
-
-    def _extract_from_excel(self, file_path: Path) -> str:
-        """Extract text from Excel"""
-        workbook = openpyxl.load_workbook(file_path)
-        text = ""
-        for sheet in workbook.worksheets:
-            for row in sheet.iter_rows(values_only=True):
-                text += " ".join([str(cell) for cell in row if cell is not None]) + "\n"
-        return text
-
-    def _extract_from_pptx(self, file_path: Path) -> str:
-        """Extract text from PowerPoint"""
+        for i, paragraph in enumerate(doc.paragraphs):
+            yield paragraph.text if i == 0 else "\n" + paragraph.text
+
+    def _extract_from_excel(self, file_path: Path) -> Iterator[str]:
+        """Extract text from Excel, streaming one row at a time"""
+        # Read-only mode parses rows on demand instead of building every cell object
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                if sheet.title in self.excel_skip_sheets:
+                    continue
+
+                # Don't trust the stored sheet size, some writers get it wrong
+                sheet.reset_dimensions()
+                rows = islice(sheet.iter_rows(values_only=True), self.excel_max_rows_per_sheet)
+                for row in rows:
+                    yield " ".join([str(cell) for cell in row if cell is not None]) + "\n"
+        finally:
+            workbook.close()
+
+    def _extract_from_pptx(self, file_path: Path) -> Iterator[str]:
+        """Extract text from PowerPoint, one shape at a time"""
         prs = Presentation(file_path)
-        text = ""
         for slide in prs.slides:
             for shape in slide.shapes:
                 if hasattr(shape, "text"):
-                    text += shape.text + "\n"
-        return text
+                    yield shape.text + "\n"
 
-    def _extract_from_text(self, file_path: Path) -> str:
-        """Extract text from plain text files"""
+    def _extract_from_text(self, file_path: Path) -> Iterator[str]:
+        """Extract text from plain text files in fixed-size blocks"""
         with open(file_path, encoding="utf-8") as file:
-            return file.read()
+            yield from iter(lambda: file.read(TEXT_READ_SIZE), "")
 
     def _create_chunks(self, text: str) -> list[str]:
         """Split text into overlapping chunks"""
-        # Clean text
-        text = re.sub(r"\s+", " ", text).strip()
+        return [chunk.text for chunk in self._iter_chunks([text])]
+
+    def _iter_chunks(self, segments: Iterable[str]) -> Iterator[TextChunk]:
+        """
+        Split a stream of text segments into overlapping chunks
+
+        Whitespace is collapsed as segments arrive and chunk boundaries are
+        computed as offsets into a single buffer, so no text is copied until
+        a chunk is yielded. Only the text that has not been chunked yet is
+        buffered. Chunk offsets are relative to the whole normalized document.
+        """
+        if self.tokenizer is not None:
+            return self._iter_token_chunks(segments)
+        return self._iter_char_chunks(segments)
+
+    def _iter_char_chunks(self, segments: Iterable[str]) -> Iterator[TextChunk]:
+        """Split a stream of text segments into chunks of chunk_size characters"""
+        buffer = ""
+        base = 0  # Document offset of buffer[0]
+        start = 0  # Document offset of the next chunk
 
-        chunks = []
-        start = 0
-        text_length = len(text)
+        for segment in _normalize_segments(segments):
+            # Drop the already chunked prefix before growing the buffer
+            buffer = buffer[start - base :] + segment
+            base = start
 
+            # A trailing space may still be stripped, so it doesn't count yet
+            text_length = base + len(buffer) - buffer.endswith(" ")
+            while start + self.chunk_size < text_length:
+                end = self._chunk_end(buffer, base, start, text_length)
+                if chunk := self._make_chunk(buffer, base, start, end):
+                    yield chunk
+                start = end - self.chunk_overlap
+
+        # Chunk whatever is left once the end of the text is known
+        text_length = base + len(buffer.rstrip())
         while start < text_length:
-            end = start + self.chunk_size
+            end = self._chunk_end(buffer, base, start, text_length)
+            if chunk := self._make_chunk(buffer, base, start, min(end, text_length)):
+                yield chunk
+            start = end - self.chunk_overlap
+
+    def _iter_token_chunks(self, segments: Iterable[str]) -> Iterator[TextChunk]:
+        """Split a stream of text segments into chunks of at most max_tokens tokens"""
+        buffer = ""
+        base = 0  # Document offset of buffer[0]
+        start = 0  # Document offset of the next chunk
+
+        for segment in _normalize_segments(segments):
+            # Drop the already chunked prefix before growing the buffer
+            buffer = buffer[start - base :] + segment
+            base = start
+
+            # Tokenize in large blocks, leaving out the last word since it may continue
+            if len(buffer) >= TOKENIZE_BLOCK_CHARS:
+                stop = base + max(buffer.rfind(" "), 0)
+                start = yield from self._emit_token_chunks(buffer, base, start, stop, final=False)
+
+        text_length = base + len(buffer.rstrip())
+        yield from self._emit_token_chunks(buffer, base, start, text_length, final=True)
+
+    def _emit_token_chunks(
+        self, buffer: str, base: int, start: int, stop: int, final: bool
+    ) -> Generator[TextChunk, None, int]:
+        """
+        Chunk the buffered text between document offsets start and stop by token count
+
+        Unless final is set, the chunk that would reach stop is held back
+        until more text has arrived.
 
-            # Try to break at sentence boundary
-            if end < text_length:
-                # Look for sentence ending
-                chunk_text = text[start:end]
+        Returns:
+            Document offset of the first chunk that has not been emitted
+        """
+        # Token offsets relative to buffer
+        shift = start - base
+        offsets = [
+            (token_start + shift, token_end + shift)
+            for token_start, token_end in self.tokenizer(
+                buffer[shift : stop - base],
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                verbose=False,
+            )["offset_mapping"]
+        ]
+        token_ends = [end for _, end in offsets]
+
+        first = 0
+        while first < len(offsets):
+            last = first + self.max_tokens
+            if last >= len(offsets) and not final:
+                break
+            last = min(last, len(offsets))
+
+            start = base + offsets[first][0]
+            end = base + offsets[last - 1][1]
+            if last < len(offsets):
+                # Prefer to break after the last sentence ending in the chunk
+                lo, hi = start - base, end - base + 1
                 last_period = max(
-                    chunk_text.rfind(". "), chunk_text.rfind("? "), chunk_text.rfind("! ")
+                    buffer.rfind(". ", lo, hi),
+                    buffer.rfind("? ", lo, hi),
+                    buffer.rfind("! ", lo, hi),
                 )
-                if last_period > self.chunk_size * 0.5:  # At least 50% of chunk size
-                    end = start + last_period + 1
+                if last_period >= 0 and last_period + base - start > (end - start) * 0.5:
+                    end = last_period + base + 1
 
-            chunks.append(text[start:end].strip())
-            start = end - self.chunk_overlap
+            # A span can tokenize into more tokens on its own than inside the document
+            # (e.g. when it starts mid-word), so shrink it until the model takes all of it
+            fitted_end = self._fit_token_span(buffer, base, start, end, token_ends)
+            if chunk := self._make_chunk(buffer, base, start, fitted_end):
+                yield chunk
+            if last == len(offsets) and fitted_end == end:
+                return stop
+            end = fitted_end
+
+            # Start the next chunk token_overlap tokens before this one ends
+            previous = first
+            first = max(bisect_right(token_ends, end - base) - self.token_overlap, previous + 1)
+
+            # Don't start in the middle of a word, it would tokenize differently
+            while first > previous + 1 and _inside_word(buffer, offsets[first][0]):
+                first -= 1
+
+        return base + offsets[first][0] if first < len(offsets) else stop
+
+    def _fit_token_span(
+        self, buffer: str, base: int, start: int, end: int, token_ends: list[int]
+    ) -> int:
+        """Move end back by whole tokens until buffer[start:end] is at most max_tokens long"""
+        while True:
+            text = buffer[start - base : end - base]
+            excess = (
+                len(self.tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
+                - self.max_tokens
+            )
+            if excess <= 0:
+                return end
+            # Drop the excess tokens from the end, keeping at least one token
+            index = bisect_right(token_ends, end - base) - 1 - excess
+            earliest = bisect_right(token_ends, start - base)
+            end = base + token_ends[max(index, earliest)]
+            if index < earliest:
+                return end
 
-        return [chunk for chunk in chunks if chunk]
+    def _chunk_end(self, buffer: str, base: int, start: int, text_length: int) -> int:
+        """Find where the chunk starting at start should end"""
+        end = start + self.chunk_size
+
+        # Try to break at the last sentence ending inside the chunk
+        if end < text_length:
+            lo, hi = start - base, end - base
+            last_period = max(
+                buffer.rfind(". ", lo, hi), buffer.rfind("? ", lo, hi), buffer.rfind("! ", lo, hi)
+            )
+            # At least 50% of chunk size
+            if last_period >= 0 and last_period + base - start > self.chunk_size * 0.5:
+                end = last_period + base + 1
+
+        return end
+
+    @staticmethod
+    def _make_chunk(buffer: str, base: int, start: int, end: int) -> TextChunk | None:
+        """Build the chunk for a span, trimming the single space at either edge"""
+        if start < end and buffer[start - base] == " ":
+            start += 1
+        if start < end and buffer[end - base - 1] == " ":
+            end -= 1
+        if start == end:
+            return None
+        return TextChunk(buffer[start - base : end - base], start, end)
+
+
+def _normalize_segments(segments: Iterable[str]) -> Iterator[str]:
+    """Collapse whitespace across a stream of segments as if they were one string"""
+    # Starting as if after a space drops the leading whitespace of the document
+    after_space = True
+    for segment in segments:
+        segment = _collapse_whitespace(segment)
+        if segment.startswith(" ") and after_space:
+            segment = segment[1:]
+        if segment:
+            after_space = segment.endswith(" ")
+            yield segment
+
+
+def _inside_word(text: str, index: int) -> bool:
+    """Whether index falls between two word characters of text"""
+    return 0 < index < len(text) and text[index - 1].isalnum() and text[index].isalnum()
+
+
+def _collapse_whitespace(text: str) -> str:
+    """Collapse every whitespace run into a single space"""
+    # Same result as re.sub(r"\s+", " ", text), but str.split() is much faster
+    words = " ".join(text.split())
+    if not words:
+        return " " if text else ""
+    leading = " " if text[0].isspace() else ""
+    trailing = " " if text[-1].isspace() else ""
+    return leading + words + trailing
+
+
+# PDF last opened by this worker process, as ((path, mtime, size), reader), so a worker
+# handed several page ranges of the same file parses it only once
+_worker_pdf: tuple[tuple, pypdf.PdfReader] | None = None
+
+
+def _extract_pdf_pages(file_path: str, first_page: int, last_page: int) -> list[str]:
+    """Extract the text of pages [first_page, last_page) from a PDF"""
+    global _worker_pdf
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    if _worker_pdf is None or _worker_pdf[0] != key:
+        _worker_pdf = None  # release the previous file before reading the next one
+        with open(file_path, "rb") as file:
+            _worker_pdf = (key, pypdf.PdfReader(io.BytesIO(file.read())))
+    pdf_reader = _worker_pdf[1]
+    return [pdf_reader.pages[i].extract_text() + "\n" for i in range(first_page, last_page)]
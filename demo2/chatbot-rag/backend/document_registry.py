@@ -0,0 +1,127 @@
+import sqlite3
+import threading
+
+# Columns of a document record, in the order they are returned
+DOCUMENT_FIELDS = ("doc_id", "source", "timestamp", "chunk_count", "content_hash")
+
+
+class DocumentRegistry:
+    """
+    One row per indexed document, kept in SQLite next to the vector index
+
+    Listing, counting and duplicate checks read this table instead of the
+    metadata of every chunk. Rows are numbered in insertion order, and pages
+    are addressed by the number of the last row returned, so reading a page
+    costs the same however deep it is and documents added meanwhile do not
+    shift later pages. Several processes, such as the server and the ingestion
+    CLI, may share the file.
+    """
+
+    def __init__(self, path: str | None = None):
+        """
+        Initialize DocumentRegistry
+
+        Args:
+            path: SQLite database file, created if missing; in memory when None
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            if path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id TEXT NOT NULL UNIQUE,
+                    source TEXT,
+                    timestamp TEXT,
+                    chunk_count INTEGER NOT NULL,
+                    content_hash TEXT
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash)"
+            )
+
+    def add(
+        self,
+        doc_id: str,
+        source: str,
+        timestamp: str,
+        chunk_count: int,
+        content_hash: str | None = None,
+    ):
+        """Record a fully indexed document"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents"
+                " (doc_id, source, timestamp, chunk_count, content_hash) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, source, timestamp, chunk_count, content_hash),
+            )
+
+    def remove(self, doc_id: str) -> bool:
+        """Forget a document; returns whether it was recorded"""
+        with self._lock, self._conn:
+            return (
+                self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount > 0
+            )
+
+    def get(self, doc_id: str) -> dict | None:
+        """Get the record of a document, or None if it is not recorded"""
+        return self._fetch_one("WHERE doc_id = ?", (doc_id,))
+
+    def find_by_hash(self, content_hash: str) -> dict | None:
+        """Get the record of the first document indexed from a file with this hash"""
+        return self._fetch_one("WHERE content_hash = ? ORDER BY seq LIMIT 1", (content_hash,))
+
+    def _fetch_one(self, condition: str, parameters: tuple) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(DOCUMENT_FIELDS)} FROM documents {condition}", parameters
+            ).fetchone()
+        return dict(zip(DOCUMENT_FIELDS, row, strict=True)) if row else None
+
+    def list(self, limit: int = 100, cursor: str | None = None) -> tuple[list[dict], str | None]:
+        """
+        List documents in the order they were indexed
+
+        Args:
+            limit: Maximum number of documents returned
+            cursor: next_cursor of the previous page; the first page when None
+
+        Returns:
+            Tuple of document records and the cursor of the next page, None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            after = int(cursor) if cursor else 0
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}") from None
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT seq, {', '.join(DOCUMENT_FIELDS)} FROM documents"
+                " WHERE seq > ? ORDER BY seq LIMIT ?",
+                (after, limit + 1),
+            ).fetchall()
+
+        documents = [dict(zip(DOCUMENT_FIELDS, row[1:], strict=True)) for row in rows[:limit]]
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return documents, next_cursor
+
+    def count(self) -> int:
+        """Get the number of documents recorded"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def clear(self):
+        """Forget all documents"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents")
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,56 @@
+from typing import Any, Protocol
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Sentence embedding model used for chunks and queries
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Runtimes the embedding model can be loaded with
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Dynamically quantized export shipped in the model repository; runs on any AVX2 x86-64 CPU
+DEFAULT_INT8_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+class Embedder(Protocol):
+    """Interface the RAG engine and document processor need from an embedding model"""
+
+    tokenizer: Any
+    max_seq_length: int
+
+    def encode(self, sentences: list[str], batch_size: int = 32, **kwargs) -> np.ndarray: ...
+
+
+def load_embedder(
+    model_name: str = EMBEDDING_MODEL, backend: str = "torch", onnx_file: str | None = None
+) -> Embedder:
+    """
+    Load the embedding model with the requested runtime
+
+    All backends share the model's tokenizer, pooling and normalization, so
+    their embeddings are interchangeable up to numerical error and an index
+    built with one can be queried with another.
+
+    Args:
+        model_name: Sentence Transformers model name or path
+        backend: "torch" (PyTorch), "onnx" (ONNX Runtime) or "onnx-int8"
+            (ONNX Runtime with an int8-quantized export of the model)
+        onnx_file: ONNX file inside the model repository, overriding the
+            backend's default (e.g. "onnx/model_qint8_arm64.onnx" on ARM)
+
+    Returns:
+        The loaded model
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+    if backend == "onnx-int8":
+        model_kwargs = {"file_name": onnx_file or DEFAULT_INT8_ONNX_FILE}
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+    raise ValueError(f"Unknown embedding backend: {backend} (expected one of {EMBEDDING_BACKENDS})")
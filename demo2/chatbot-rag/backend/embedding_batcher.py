@@ -0,0 +1,102 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Collects texts submitted concurrently and embeds them in shared batches"""
+
+    def __init__(
+        self,
+        encode: Callable[[list[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+    ):
+        """
+        Initialize EmbeddingBatcher and start its scheduler thread
+
+        Args:
+            encode: Function embedding a list of texts in one forward pass
+            max_batch_size: Maximum number of texts embedded together
+            max_wait_ms: How long the first text of a batch waits for others to join it
+        """
+        self.encode_batch = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self.batches = 0
+        self.items = 0
+
+        self._queue: queue.Queue[tuple[str, Future]] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """
+        Queue a text for the next batch
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            Future resolving to the embedding as a list of floats
+        """
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str, timeout: float | None = None) -> list[float]:
+        """Embed a text as part of a batch, blocking until its embedding is ready"""
+        return self.submit(text).result(timeout)
+
+    def stats(self) -> dict:
+        """Get the number of batches run and the average batch size"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def _run(self):
+        """Scheduler loop: gather a batch, embed it, hand the results back"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        # Deadline passed, but take whatever is already waiting
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: list[tuple[str, Future]]):
+        """Embed one batch, embedding duplicate texts only once"""
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            embeddings = dict(zip(texts, self.encode_batch(texts).tolist(), strict=True))
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(texts)} queries: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        for text, future in batch:
+            future.set_result(embeddings[text])
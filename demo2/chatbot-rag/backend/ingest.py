@@ -0,0 +1,381 @@
+"""
+Bulk-load a directory or zip archive of documents into the vector store
+
+Files are extracted and chunked in parallel worker processes. Chunks from
+many files are pooled into large, fixed-size embedding batches and written
+to the collection with one add call per batch. Progress is appended to a
+manifest, so an interrupted run picks up where it stopped.
+
+Usage (from the backend directory):
+    python ingest.py ../corpus --persist-dir ../data/chroma
+    python ingest.py ../corpus.zip --persist-dir ../data/chroma --batch-size 512 --workers 8
+    python ingest.py ../acme-corpus --persist-dir ../data/chroma --tenant acme
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+from document_processor import SUPPORTED_EXTENSIONS, DocumentProcessor, TextChunk
+from dotenv import load_dotenv
+from embedders import EMBEDDING_BACKENDS
+from rag_engine import RAGEngine, build_chunk_record
+from tenant_collections import validate_tenant
+
+logger = logging.getLogger(__name__)
+
+# Block size used when hashing files
+HASH_READ_SIZE = 1024 * 1024
+
+# Document processor of each worker process
+_worker_processor: DocumentProcessor | None = None
+
+
+class Manifest:
+    """Append-only JSONL log of ingestion progress, used to resume interrupted runs"""
+
+    def __init__(self, path: Path):
+        """
+        Load the manifest, creating it if needed
+
+        Args:
+            path: Manifest file path
+        """
+        self.path = path
+        self.completed: set[str] = set()
+        self.started: dict[str, str] = {}  # key -> doc_id of documents not completed yet
+
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry["status"] == "started":
+                        self.started[entry["key"]] = entry["doc_id"]
+                    elif entry["status"] == "completed":
+                        self.started.pop(entry["key"], None)
+                        self.completed.add(entry["key"])
+                    elif entry["status"] == "reset":
+                        self.started.pop(entry["key"], None)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._file = open(path, "a", encoding="utf-8")  # noqa: SIM115
+
+    def record(self, key: str, status: str, **fields):
+        """Append an entry and flush it to disk"""
+        entry = {"key": key, "status": status, "time": datetime.now().isoformat(), **fields}
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Close the manifest file"""
+        self._file.close()
+
+
+def iter_sources(path: Path) -> Iterator[tuple[str, str | None]]:
+    """
+    List the supported documents in a directory tree or zip archive
+
+    Yields:
+        Tuples of file path and zip member name (None for plain files)
+    """
+    if path.is_dir():
+        for file_path in sorted(path.rglob("*")):
+            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                yield str(file_path), None
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                if (
+                    not member.is_dir()
+                    and Path(member.filename).suffix.lower() in SUPPORTED_EXTENSIONS
+                ):
+                    yield str(path), member.filename
+    else:
+        raise ValueError(f"{path} is neither a directory nor a zip archive")
+
+
+def source_key(file_path: str, member: str | None) -> str:
+    """Identify a source in the manifest"""
+    return f"{file_path}!{member}" if member else file_path
+
+
+def _init_worker(processor_options: dict):
+    """Create the document processor of a worker process"""
+    global _worker_processor
+    _worker_processor = DocumentProcessor(**processor_options)
+
+
+def extract_source(file_path: str, member: str | None) -> tuple[str, list[TextChunk]]:
+    """
+    Hash and chunk one document (runs in a worker process)
+
+    Returns:
+        Tuple of the content hash and the document chunks
+    """
+    if member is None:
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while block := f.read(HASH_READ_SIZE):
+                sha256.update(block)
+        return sha256.hexdigest(), list(_worker_processor.process_document(file_path, stream=True))
+
+    # Zip members are extracted to a temporary file with the same extension
+    with zipfile.ZipFile(file_path) as archive:
+        data = archive.read(member)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = Path(tmp_dir) / Path(member).name
+        tmp_path.write_bytes(data)
+        chunks = list(_worker_processor.process_document(str(tmp_path), stream=True))
+    return hashlib.sha256(data).hexdigest(), chunks
+
+
+class BulkIngester:
+    """Pool chunks from many documents into fixed-size embedding batches"""
+
+    def __init__(
+        self,
+        rag_engine: RAGEngine,
+        manifest: Manifest,
+        batch_size: int,
+        tenant: str | None = None,
+    ):
+        self.rag_engine = rag_engine
+        self.manifest = manifest
+        self.batch_size = batch_size
+        self.tenant = tenant
+
+        self._pending: list[tuple[str, str, dict]] = []  # (id, text, metadata) not yet added
+        self._remaining: dict[str, int] = {}  # doc_id -> chunks not yet added
+        # doc_id -> (key, source name, timestamp, hash, chunks)
+        self._documents: dict[str, tuple[str, str, str, str, int]] = {}
+
+        self.files_indexed = 0
+        self.files_skipped = 0
+        self.chunks_indexed = 0
+
+    def add(self, key: str, source_name: str, content_hash: str, chunks: list[TextChunk]):
+        """Queue the chunks of one document, flushing full batches"""
+        existing = self.rag_engine.find_document_by_hash(content_hash, self.tenant)
+        if existing or not chunks:
+            # Already indexed under another name, or nothing to index
+            doc_id = existing[0] if existing else None
+            self.manifest.record(key, "completed", doc_id=doc_id, content_hash=content_hash)
+            self.files_skipped += 1
+            return
+
+        doc_id = str(uuid.uuid4())
+        self.manifest.record(key, "started", doc_id=doc_id)
+        timestamp = datetime.now().isoformat()
+        self._documents[doc_id] = (key, source_name, timestamp, content_hash, len(chunks))
+        self._remaining[doc_id] = len(chunks)
+
+        for i, chunk in enumerate(chunks):
+            self._pending.append(
+                build_chunk_record(doc_id, source_name, i, chunk, timestamp, content_hash)
+            )
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Embed and add the pending chunks, completing documents whose chunks are all in"""
+        if not self._pending:
+            return
+
+        ids, texts, metadatas = zip(*self._pending, strict=True)
+        self.rag_engine.add_chunks(ids, texts, metadatas, self.tenant)
+        self.chunks_indexed += len(ids)
+        self._pending = []
+
+        for metadata in metadatas:
+            doc_id = metadata["doc_id"]
+            self._remaining[doc_id] -= 1
+            if self._remaining[doc_id] == 0:
+                del self._remaining[doc_id]
+                key, source_name, timestamp, content_hash, chunk_count = self._documents.pop(doc_id)
+                self.rag_engine.record_document(
+                    doc_id, source_name, timestamp, chunk_count, content_hash, self.tenant
+                )
+                self.manifest.record(
+                    key, "completed", doc_id=doc_id, content_hash=content_hash, chunks=chunk_count
+                )
+                self.files_indexed += 1
+
+
+def ingest(
+    source: Path,
+    rag_engine: RAGEngine,
+    manifest: Manifest,
+    batch_size: int = 256,
+    workers: int | None = None,
+    processor_options: dict | None = None,
+    tenant: str | None = None,
+) -> BulkIngester:
+    """
+    Ingest every supported document below source that the manifest hasn't completed
+
+    Args:
+        source: Directory or zip archive
+        rag_engine: Engine the documents are indexed into
+        manifest: Progress manifest of this corpus
+        batch_size: Chunks per embedding batch and collection add call
+        workers: Extraction processes (default: CPU count)
+        processor_options: Keyword arguments for the DocumentProcessor of each worker
+        tenant: Tenant whose collection the documents are indexed into; the default one when None
+
+    Returns:
+        The ingester, holding the run statistics
+    """
+    # Drop chunks of documents that were only partially indexed by an earlier run; a
+    # tenant without a collection yet has none
+    has_collection = rag_engine.has_collection(tenant)
+    for key, doc_id in manifest.started.items():
+        removed = rag_engine.delete_document(doc_id, tenant) if has_collection else 0
+        logger.info(f"Removed {removed} chunks of interrupted document {key}")
+        manifest.record(key, "reset", doc_id=doc_id)
+    manifest.started.clear()
+
+    ingester = BulkIngester(rag_engine, manifest, batch_size, tenant)
+    sources = [
+        (file_path, member)
+        for file_path, member in iter_sources(source)
+        if source_key(file_path, member) not in manifest.completed
+    ]
+    logger.info(f"{len(sources)} documents to ingest ({len(manifest.completed)} already done)")
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(processor_options or {},)
+    ) as executor:
+        # Keep a bounded number of documents in flight so memory stays flat
+        in_flight: dict[Future, tuple[str, str | None]] = {}
+        remaining = iter(sources)
+        while True:
+            for file_path, member in remaining:
+                in_flight[executor.submit(extract_source, file_path, member)] = (file_path, member)
+                if len(in_flight) >= workers * 2:
+                    break
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, member = in_flight.pop(future)
+                key = source_key(file_path, member)
+                try:
+                    content_hash, chunks = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to extract {key}: {e}")
+                    continue
+                ingester.add(key, Path(member or file_path).name, content_hash, chunks)
+
+    ingester.flush()
+    return ingester
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("source", type=Path, help="Directory or zip archive of documents")
+    parser.add_argument(
+        "--persist-dir",
+        default=os.getenv("CHROMA_PERSIST_DIRECTORY", "../data/chroma"),
+        help="Vector index directory the documents are written to",
+    )
+    parser.add_argument(
+        "--collection",
+        default=os.getenv("CHROMA_COLLECTION", "documents"),
+        help="Collection name",
+    )
+    parser.add_argument(
+        "--tenant",
+        help="Tenant whose collection the documents are written to (default: the collection)",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="Progress manifest (default: <persist-dir>/ingest_manifest[_<tenant>].jsonl)",
+    )
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding batch")
+    parser.add_argument("--workers", type=int, help="Extraction processes (default: CPU count)")
+    parser.add_argument(
+        "--chunk-by",
+        choices=["tokens", "chars"],
+        default=os.getenv("CHUNKING_MODE", "tokens"),
+        help="Size chunks with the embedding model's tokenizer or by characters",
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        choices=EMBEDDING_BACKENDS,
+        default=os.getenv("EMBEDDING_BACKEND", "torch"),
+        help="Runtime the embedding model is loaded with",
+    )
+    args = parser.parse_args()
+    if args.tenant:
+        try:
+            validate_tenant(args.tenant)
+        except ValueError as e:
+            parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # Tenants are passed per call, so their collections are laid out as the server's
+    rag_engine = RAGEngine(
+        collection_name=args.collection,
+        persist_directory=args.persist_dir,
+        embedding_backend=args.embedding_backend,
+        embedding_onnx_file=os.getenv("EMBEDDING_ONNX_FILE") or None,
+        vector_store=os.getenv("VECTOR_STORE", "chroma"),
+        vector_dtype=os.getenv("VECTOR_DTYPE", "float32"),
+        # The server builds its keyword index from the stored texts when it opens the collection
+        hybrid_search=False,
+    )
+    manifest_name = (
+        f"ingest_manifest_{args.tenant}.jsonl" if args.tenant else "ingest_manifest.jsonl"
+    )
+    manifest = Manifest(args.manifest or Path(args.persist_dir) / manifest_name)
+
+    processor_options = {}
+    if args.chunk_by == "tokens":
+        processor_options = {
+            "tokenizer": rag_engine.embedder.tokenizer,
+            "max_tokens": rag_engine.embedder.max_seq_length,
+        }
+
+    start = time.perf_counter()
+    try:
+        ingester = ingest(
+            args.source,
+            rag_engine,
+            manifest,
+            args.batch_size,
+            args.workers,
+            processor_options,
+            args.tenant,
+        )
+    finally:
+        manifest.close()
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Indexed {ingester.files_indexed} documents ({ingester.chunks_indexed} chunks), "
+        f"skipped {ingester.files_skipped}, in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import contextlib
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+
+from document_processor import DocumentProcessor, TextChunk
+from rag_engine import RAGEngine
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionQueue:
+    """Bounded queue of document ingestion jobs processed by background workers"""
+
+    def __init__(
+        self,
+        rag_engine: RAGEngine,
+        document_processor: DocumentProcessor,
+        workers: int = 2,
+        max_pending: int = 16,
+        max_finished: int = 1000,
+    ):
+        """
+        Initialize IngestionQueue and start its worker threads
+
+        Args:
+            rag_engine: Engine the documents are indexed into
+            document_processor: Processor used to extract and chunk documents
+            workers: Number of worker threads
+            max_pending: Maximum number of queued jobs before submit() is refused
+            max_finished: Number of finished jobs kept for status queries
+        """
+        self.rag_engine = rag_engine
+        self.document_processor = document_processor
+        self.max_finished = max_finished
+
+        self._queue: queue.Queue[str] = queue.Queue(maxsize=max_pending)
+        self._jobs: dict[str, dict] = {}
+        # (tenant, content hash) -> queued/running job id
+        self._active_hashes: dict[tuple[str | None, str], str] = {}
+        self._lock = threading.Lock()
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"ingestion-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        file_path: Path,
+        source_name: str,
+        content_hash: str,
+        replaces: str | None = None,
+        tenant: str | None = None,
+    ) -> dict:
+        """
+        Queue a saved upload for ingestion
+
+        An upload with the same content as a queued or running job of the same
+        tenant is not queued again; the existing job is returned instead.
+        Unless queue.Full is raised, the queue takes over the file and removes
+        it once the job has finished, or at once if an existing job is returned.
+
+        Args:
+            file_path: Path of the saved upload
+            source_name: Name of the source document
+            content_hash: Hash of the file content
+            replaces: Document removed once the upload is indexed, for a new version of it
+            tenant: Tenant whose collection the document is indexed into; the default one when None
+
+        Returns:
+            Snapshot of the job
+
+        Raises:
+            queue.Full: If the queue is at capacity
+        """
+        with self._lock:
+            key = (tenant, content_hash)
+            if key in self._active_hashes and not replaces:
+                remove_upload(file_path)
+                return dict(self._jobs[self._active_hashes[key]])
+
+            job_id = str(uuid.uuid4())
+            now = datetime.now().isoformat()
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "filename": source_name,
+                "file_path": str(file_path),
+                "content_hash": content_hash,
+                "chunks_done": 0,
+                "chunks_total": None,
+                "document_id": None,
+                "replaces": replaces,
+                "tenant": tenant,
+                "duplicate": False,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+
+            # Refuse the job rather than block the request when the queue is full
+            self._queue.put_nowait(job_id)
+            self._jobs[job_id] = job
+            self._active_hashes.setdefault(key, job_id)
+            logger.info(f"Queued ingestion job {job_id} for {source_name}")
+            return dict(job)
+
+    def get_job(self, job_id: str) -> dict | None:
+        """
+        Get a snapshot of a job
+
+        Args:
+            job_id: Unique job identifier
+
+        Returns:
+            Job dict, or None if the job is unknown
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def pending_count(self) -> int:
+        """Get the number of jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    def _work(self):
+        """Worker loop: process queued jobs until the process exits"""
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._process(job_id)
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed: {e}")
+                self._update(job_id, status="failed", error=str(e))
+            finally:
+                with self._lock:
+                    job = self._jobs[job_id]
+                    remove_upload(job["file_path"])
+                    key = (job["tenant"], job["content_hash"])
+                    if self._active_hashes.get(key) == job_id:
+                        del self._active_hashes[key]
+                    self._prune_finished()
+                self._queue.task_done()
+
+    def _process(self, job_id: str):
+        """Extract, chunk, embed and index the document of a job"""
+        job = self._update(job_id, status="running")
+
+        # The same content may have been indexed while this job was queued
+        existing = self.rag_engine.find_document_by_hash(job["content_hash"], job["tenant"])
+        if existing:
+            doc_id, chunk_count = existing
+            self._update(
+                job_id,
+                status="completed",
+                document_id=doc_id,
+                chunks_done=chunk_count,
+                chunks_total=chunk_count,
+                duplicate=True,
+            )
+            self._remove_replaced(job, doc_id)
+            return
+
+        chunks = self.document_processor.process_document(job["file_path"], stream=True)
+        doc_id, chunk_count = self.rag_engine.add_document_stream(
+            self._count_chunks(job_id, chunks),
+            job["filename"],
+            content_hash=job["content_hash"],
+            progress=lambda done: self._update(job_id, chunks_done=done),
+            tenant=job["tenant"],
+        )
+
+        if not chunk_count:
+            raise ValueError("Could not extract text from document")
+
+        # The old version is removed only now, so it keeps answering questions until then
+        self._remove_replaced(job, doc_id)
+        self._update(job_id, status="completed", document_id=doc_id)
+        logger.info(f"Ingestion job {job_id} indexed {chunk_count} chunks as {doc_id}")
+
+    def _remove_replaced(self, job: dict, doc_id: str):
+        """Delete the document a job replaces, unless the upload resolved to that same document"""
+        if job["replaces"] and job["replaces"] != doc_id:
+            removed = self.rag_engine.delete_document(job["replaces"], job["tenant"])
+            logger.info(f"Removed {removed} chunks of {job['replaces']}, replaced by {doc_id}")
+
+    def _count_chunks(self, job_id: str, chunks: Iterable[TextChunk]) -> Iterator[TextChunk]:
+        """Pass chunks through, recording the total once extraction has finished"""
+        count = 0
+        for chunk in chunks:
+            count += 1
+            yield chunk
+        self._update(job_id, chunks_total=count)
+
+    def _update(self, job_id: str, **fields) -> dict:
+        """Update fields of a job and return a snapshot of it"""
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=datetime.now().isoformat())
+            return dict(job)
+
+    def _prune_finished(self):
+        """Forget the oldest finished jobs beyond max_finished (caller holds the lock)"""
+        finished = [
+            job_id for job_id, job in self._jobs.items() if job["status"] in ("completed", "failed")
+        ]
+        for job_id in finished[: max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+
+def remove_upload(file_path: str | Path):
+    """Delete a saved upload and the directory it was saved in, if now empty"""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(file_path)
+    with contextlib.suppress(OSError):
+        os.rmdir(Path(file_path).parent)
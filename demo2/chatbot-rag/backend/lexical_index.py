@@ -0,0 +1,292 @@
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from collections.abc import Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Words, plus identifiers joined by - . / : such as part numbers, versions and error codes
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+TOKEN_SEPARATORS = re.compile(r"[-./:]")
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Rank constant of reciprocal-rank fusion
+RRF_K = 60
+
+# Deleted chunks tolerated before the postings are compacted
+COMPACT_MIN_DELETED = 1024
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase terms for lexical matching
+
+    Compound identifiers such as "XR-2040" or "v2.3.1" are kept whole and
+    also indexed by their parts, so exact codes match precisely while
+    "XR 2040" still finds them.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in TOKEN_SEPARATORS.split(token) if part)
+    return terms
+
+
+class BM25Index:
+    """
+    Incrementally built BM25 inverted index over chunk texts
+
+    Every term has one array of unsigned ints holding interleaved
+    (row, term frequency) pairs, and chunks are numbered by row in insertion
+    order, so the postings cost 8 bytes per term occurrence per chunk.
+    Each row also keeps the ids of its terms (4 bytes each), so deleting it
+    can lower the live document frequency of those terms. Adding chunks
+    appends to the arrays; deleting marks rows dead, and the postings are
+    compacted once more than half of the rows are dead.
+
+    An index over existing chunks is filled by build(), usually in the
+    background; until it finishes, ready is False and searches should fall
+    back to other retrievers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._epoch = 0  # changed by clear(), which stops a running build
+        self.clear()
+
+    def clear(self):
+        """Remove all chunks"""
+        with self._lock:
+            self._terms: dict[str, int] = {}  # term -> term id
+            self._postings: list[array] = []  # term id -> [row, tf, row, tf, ...]
+            self._document_frequencies = array("I")  # term id -> number of live rows with it
+            self._row_terms = array("I")  # term ids of each row, one row after another
+            self._row_starts = array("Q", [0])  # row -> start of its term ids in _row_terms
+            self._lengths = array("I")  # row -> number of terms
+            self._alive = bytearray()  # row -> 1 unless deleted
+            self._ids: list[str] = []  # row -> chunk id
+            self._rows: dict[str, int] = {}  # chunk id -> row of live chunks
+            self._live_length = 0
+            self._deleted_while_building: set[str] = set()
+            self._epoch += 1
+            self.ready = True
+            self.build_seconds: float | None = None
+
+    def add(self, ids: list[str], texts: list[str]):
+        """Index chunks; chunks already indexed are skipped"""
+        tokenized = [Counter(tokenize(text)) for text in texts]
+        with self._lock:
+            self._deleted_while_building.difference_update(ids)
+            self._add(ids, tokenized)
+
+    def build(self, batches: Iterable[tuple[list[str], list[str]]]):
+        """
+        Index the chunks already stored while add() and delete() keep working
+
+        Chunks added meanwhile are indexed once, and chunks deleted meanwhile
+        are skipped. ready is set when done, or when clear() stops the build.
+
+        Args:
+            batches: (ids, texts) batches of the stored chunks, such as VectorStore.iter_texts
+        """
+        with self._lock:
+            self.ready = False
+            epoch = self._epoch
+        start = time.perf_counter()
+        try:
+            for ids, texts in batches:
+                tokenized = [Counter(tokenize(text)) for text in texts]
+                with self._lock:
+                    if self._epoch != epoch:
+                        return
+                    kept = [
+                        (chunk_id, counts)
+                        for chunk_id, counts in zip(ids, tokenized, strict=True)
+                        if chunk_id not in self._deleted_while_building
+                    ]
+                    self._add([chunk_id for chunk_id, _ in kept], [counts for _, counts in kept])
+        except Exception:
+            # Reading the store fails once it is closed; that is not an error if cleared first
+            with self._lock:
+                if self._epoch != epoch:
+                    return
+            raise
+
+        with self._lock:
+            if self._epoch == epoch:
+                self._deleted_while_building = set()
+                self.ready = True
+                self.build_seconds = time.perf_counter() - start
+                logger.info(
+                    f"Built lexical index of {len(self._rows)} chunks in {self.build_seconds:.2f}s"
+                )
+
+    def build_in_background(self, batches: Iterable[tuple[list[str], list[str]]]):
+        """Run build() in a daemon thread, logging its failure; ready is False until it is done"""
+
+        def run():
+            try:
+                self.build(batches)
+            except Exception as e:
+                logger.error(f"Building the lexical index failed: {e}")
+
+        with self._lock:
+            self.ready = False
+        threading.Thread(target=run, name="lexical-index-build", daemon=True).start()
+
+    def _add(self, ids: list[str], tokenized: list[Counter]):
+        """Index tokenized chunks not indexed yet (caller holds the lock)"""
+        for chunk_id, counts in zip(ids, tokenized, strict=True):
+            if chunk_id in self._rows:
+                continue
+            row = len(self._ids)
+            for term, frequency in counts.items():
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    term_id = self._terms[term] = len(self._postings)
+                    self._postings.append(array("I"))
+                    self._document_frequencies.append(0)
+                self._postings[term_id].extend((row, frequency))
+                self._document_frequencies[term_id] += 1
+                self._row_terms.append(term_id)
+
+            self._row_starts.append(len(self._row_terms))
+            length = sum(counts.values())
+            self._ids.append(chunk_id)
+            self._rows[chunk_id] = row
+            self._lengths.append(length)
+            self._alive.append(1)
+            self._live_length += length
+
+    def delete(self, ids: list[str]):
+        """Remove chunks by id"""
+        with self._lock:
+            for chunk_id in ids:
+                row = self._rows.pop(chunk_id, None)
+                if not self.ready:
+                    self._deleted_while_building.add(chunk_id)
+                if row is not None:
+                    self._alive[row] = 0
+                    self._live_length -= self._lengths[row]
+                    start, end = self._row_starts[row], self._row_starts[row + 1]
+                    for term_id in self._row_terms[start:end]:
+                        self._document_frequencies[term_id] -= 1
+
+            deleted = len(self._ids) - len(self._rows)
+            if deleted > max(len(self._rows), COMPACT_MIN_DELETED):
+                self._compact()
+
+    def _compact(self):
+        """Drop dead rows from the postings and renumber the rest (caller holds the lock)"""
+        alive = np.frombuffer(bytes(self._alive), dtype=bool)
+        new_rows = np.cumsum(alive, dtype=np.uint32) - 1
+        for term_id, postings in enumerate(self._postings):
+            pairs = np.frombuffer(postings, dtype=np.uint32).reshape(-1, 2)
+            pairs = pairs[alive[pairs[:, 0]]].copy()
+            pairs[:, 0] = new_rows[pairs[:, 0]]
+            self._postings[term_id] = array("I", pairs.tobytes())
+
+        self._lengths = array("I", np.frombuffer(self._lengths, dtype=np.uint32)[alive].tobytes())
+        term_counts = np.diff(np.frombuffer(self._row_starts, dtype=np.uint64)).astype(np.int64)
+        row_terms = np.frombuffer(self._row_terms, dtype=np.uint32)[np.repeat(alive, term_counts)]
+        starts = np.zeros(int(alive.sum()) + 1, dtype=np.uint64)
+        np.cumsum(term_counts[alive], out=starts[1:])
+        self._row_terms = array("I", row_terms.tobytes())
+        self._row_starts = array("Q", starts.tobytes())
+        self._ids = [chunk_id for chunk_id, live in zip(self._ids, alive, strict=True) if live]
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._alive = bytearray(b"\x01" * len(self._ids))
+        logger.info(f"Compacted lexical index to {len(self._ids)} chunks")
+
+    def search(self, query: str, n_results: int) -> list[tuple[str, float]]:
+        """
+        Find the chunks with the highest BM25 score for a query
+
+        Args:
+            query: Query text
+            n_results: Maximum number of chunks returned
+
+        Returns:
+            List of (chunk id, score) pairs, best first; only chunks sharing a term with the query
+        """
+        with self._lock:
+            live = len(self._rows)
+            term_ids = [self._terms[term] for term in set(tokenize(query)) if term in self._terms]
+            if not live or not term_ids:
+                return []
+
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            average_length = max(self._live_length / live, 1.0)
+            rows, contributions = [], []
+            for term_id in term_ids:
+                frequency_in_documents = self._document_frequencies[term_id]
+                if not frequency_in_documents:
+                    continue
+                pairs = np.frombuffer(self._postings[term_id], dtype=np.uint32).reshape(-1, 2)
+                frequency = pairs[:, 1].astype(np.float32)
+                idf = math.log(
+                    1 + (live - frequency_in_documents + 0.5) / (frequency_in_documents + 0.5)
+                )
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[pairs[:, 0]] / average_length)
+                rows.append(pairs[:, 0])
+                contributions.append(idf * frequency * (BM25_K1 + 1) / (frequency + norm))
+            if not rows:
+                return []
+
+            # Score only the rows that contain a query term, dropping the dead ones
+            candidates, positions = np.unique(np.concatenate(rows), return_inverse=True)
+            scores = np.bincount(positions, weights=np.concatenate(contributions))
+            # The temporary view of _alive is released before the bytearray can grow again
+            live_rows = np.frombuffer(self._alive, dtype=bool)[candidates]
+            candidates, scores = candidates[live_rows], scores[live_rows]
+            n_results = min(n_results, len(candidates))
+            if not n_results:
+                return []
+
+            top = np.argpartition(-scores, n_results - 1)[:n_results]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[candidates[i]], float(scores[i])) for i in top]
+
+    def stats(self) -> dict:
+        """Get the number of chunks, terms and postings and the size of the postings"""
+        with self._lock:
+            postings = sum(len(entries) for entries in self._postings) // 2
+            size = postings * 8 + len(self._row_terms) * 4 + len(self._row_starts) * 8
+            return {
+                "ready": self.ready,
+                "build_seconds": None
+                if self.build_seconds is None
+                else round(self.build_seconds, 2),
+                "chunks": len(self._rows),
+                "terms": len(self._terms),
+                "postings": postings,
+                "postings_mb": round(size / 1e6, 2),
+            }
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[str]:
+    """
+    Merge rankings of chunk ids by reciprocal-rank fusion
+
+    Args:
+        rankings: Lists of chunk ids, best first
+        k: Rank constant; larger values flatten the weight of the top ranks
+
+    Returns:
+        Chunk ids ordered by their summed 1 / (k + rank) over all rankings
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (k + rank)
+    return sorted(scores, key=scores.__getitem__, reverse=True)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: rate limits and transient server failures
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class LLMTimeoutError(Exception):
+    """Raised when every attempt of an LLM call timed out"""
+
+
+class LLMClient:
+    """
+    Non-blocking Gemini calls with a limit on calls in flight, timeouts and retries
+
+    Calls use the async generation API, so the event loop keeps serving other
+    requests while a call waits on Gemini. Calls beyond max_concurrency wait
+    for a free slot; the timeout applies to each attempt, not to this wait.
+    """
+
+    def __init__(
+        self,
+        model: genai.GenerativeModel,
+        max_concurrency: int = 8,
+        timeout_seconds: float = 60,
+        max_retries: int = 2,
+        retry_backoff_seconds: float = 1.0,
+    ):
+        """
+        Initialize LLMClient
+
+        Args:
+            model: Gemini model
+            max_concurrency: Maximum number of calls in flight
+            timeout_seconds: Seconds an attempt may take before it is cancelled
+            max_retries: Attempts after the first for timeouts and transient errors
+            retry_backoff_seconds: Wait before the first retry, doubled for each later one
+        """
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._calls = 0
+        self._attempts = 0
+        self._retries = 0
+        self._timeouts = 0
+        self._failures = 0
+        self._total_seconds = 0.0
+
+    async def generate(self, prompt: str) -> str:
+        """
+        Generate a response
+
+        Args:
+            prompt: Prompt text
+
+        Returns:
+            Response text
+
+        Raises:
+            LLMTimeoutError: If every attempt timed out
+        """
+        self._calls += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self._in_flight += 1
+                    self._attempts += 1
+                    start = time.perf_counter()
+                    try:
+                        response = await asyncio.wait_for(
+                            self.model.generate_content_async(prompt), self.timeout_seconds
+                        )
+                    finally:
+                        self._in_flight -= 1
+                        self._total_seconds += time.perf_counter() - start
+                return response.text
+            except RETRYABLE_ERRORS as e:
+                await self._retry_or_raise(e, attempt)
+            except Exception:
+                self._failures += 1
+                raise
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Generate a response as it is produced
+
+        Failed attempts are retried only until the first text is yielded; after
+        that, an error ends the stream. The timeout applies to the wait for each
+        piece of text, so long answers are not cut off.
+
+        Args:
+            prompt: Prompt text
+
+        Yields:
+            Pieces of the response text
+
+        Raises:
+            LLMTimeoutError: If every attempt timed out before yielding text
+        """
+        self._calls += 1
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async with self._semaphore:
+                    self._in_flight += 1
+                    self._attempts += 1
+                    start = time.perf_counter()
+                    try:
+                        response = await asyncio.wait_for(
+                            self.model.generate_content_async(prompt, stream=True),
+                            self.timeout_seconds,
+                        )
+                        chunks = aiter(response)
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(anext(chunks), self.timeout_seconds)
+                            except StopAsyncIteration:
+                                break
+                            started = True
+                            yield chunk.text
+                    finally:
+                        self._in_flight -= 1
+                        self._total_seconds += time.perf_counter() - start
+                return
+            except RETRYABLE_ERRORS as e:
+                if started:
+                    self._failures += 1
+                    raise
+                await self._retry_or_raise(e, attempt)
+            except Exception:
+                self._failures += 1
+                raise
+
+    async def _retry_or_raise(self, error: Exception, attempt: int):
+        """Wait before retrying a failed attempt, or raise if it was the last one"""
+        timed_out = isinstance(error, asyncio.TimeoutError)
+        if timed_out:
+            self._timeouts += 1
+        if attempt == self.max_retries:
+            self._failures += 1
+            if timed_out:
+                raise LLMTimeoutError(
+                    f"No response from the model after {attempt + 1} attempts "
+                    f"of {self.timeout_seconds:g}s"
+                ) from error
+            raise error
+        delay = self.retry_backoff_seconds * 2**attempt
+        logger.warning(f"LLM call failed ({type(error).__name__}), retrying in {delay:g}s")
+        self._retries += 1
+        await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """Get the concurrency limit, calls in flight, call, retry, timeout and failure counts"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "calls": self._calls,
+            "retries": self._retries,
+            "timeouts": self._timeouts,
+            "failures": self._failures,
+            "mean_attempt_seconds": round(self._total_seconds / self._attempts, 3)
+            if self._attempts
+            else 0.0,
+        }
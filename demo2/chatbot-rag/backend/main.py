@@ -1,28 +1,42 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
 import os
-import shutil
+import queue
+import threading
+import time
 import uuid
 from pathlib import Path
 
+import aiofiles
+import aiofiles.os
 import google.generativeai as genai
 from document_processor import DocumentProcessor
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import (
+    FastAPI,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from ingestion_queue import IngestionQueue, remove_upload
+from llm_client import LLMTimeoutError
 from pydantic import BaseModel
 from rag_engine import RAGEngine
+from tenant_collections import UnknownTenantError, validate_tenant
 
 load_dotenv()
 
-app = FastAPI(title="Chatbot RAG API", version="1.0.0")
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+logger = logging.getLogger(__name__)
 
 # Initialize directories
 UPLOAD_DIR = Path("uploads")
@@ -31,18 +45,126 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
 
+# Block size used when saving and hashing uploads
+UPLOAD_READ_SIZE = 1024 * 1024
+
+# Largest accepted upload
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+
+# Allowance for multipart boundaries and headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Endpoints served while the components are still loading
+STARTUP_EXEMPT_PATHS = {"/", "/healthz", "/readyz", "/docs", "/openapi.json"}
+
 # Configure Gemini
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-# Initialize RAG engine
-rag_engine = RAGEngine()
-document_processor = DocumentProcessor()
+# Heavy components, loaded by load_components() in the background after startup
+rag_engine: RAGEngine | None = None
+document_processor: DocumentProcessor | None = None
+ingestion_queue: IngestionQueue | None = None
+
+# Progress of the background load, reported by /readyz
+startup_status = {"ready": False, "error": None, "total_seconds": None, "components": {}}
+
+
+def load_components():
+    """Load the RAG engine, warm up the embedding model and start the ingestion workers"""
+    global rag_engine, document_processor, ingestion_queue
+
+    start = time.perf_counter()
+    try:
+        # Initialize RAG engine, reopening the persisted index when a directory is configured
+        engine = RAGEngine(
+            collection_name=os.getenv("CHROMA_COLLECTION", "documents"),
+            persist_directory=os.getenv("CHROMA_PERSIST_DIRECTORY") or None,
+            query_cache_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            query_batch_size=int(os.getenv("QUERY_BATCH_SIZE", "32")),
+            query_batch_wait_ms=float(os.getenv("QUERY_BATCH_WAIT_MS", "2")),
+            embedding_backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+            embedding_onnx_file=os.getenv("EMBEDDING_ONNX_FILE") or None,
+            vector_store=os.getenv("VECTOR_STORE", "chroma"),
+            vector_dtype=os.getenv("VECTOR_DTYPE", "float32"),
+            hybrid_search=os.getenv("HYBRID_SEARCH", "false").lower() == "true",
+            response_cache_size=int(os.getenv("RESPONSE_CACHE_SIZE", "0")),
+            response_cache_threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+            response_cache_ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+            llm_max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            llm_timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+            llm_max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000")),
+            max_open_collections=int(os.getenv("MAX_OPEN_COLLECTIONS", "16")),
+            collection_idle_seconds=float(os.getenv("COLLECTION_IDLE_SECONDS", "900")),
+        )
+        engine.warm_up()
+        timings = dict(engine.startup_timings)
+
+        # Size chunks with the embedding model's own tokenizer unless character chunking is asked for
+        component_start = time.perf_counter()
+        token_chunking = os.getenv("CHUNKING_MODE", "tokens") == "tokens"
+        ingestion_workers = int(os.getenv("INGESTION_WORKERS", "2"))
+        processor = DocumentProcessor(
+            # One PDF pool is shared by the ingestion workers, which keep a core each busy
+            pdf_workers=int(
+                os.getenv("PDF_WORKERS", str(max((os.cpu_count() or 1) - ingestion_workers, 1)))
+            ),
+            excel_max_rows_per_sheet=int(os.getenv("EXCEL_MAX_ROWS_PER_SHEET", "0")) or None,
+            excel_skip_sheets=[
+                name for name in os.getenv("EXCEL_SKIP_SHEETS", "").split(",") if name
+            ],
+            tokenizer=engine.embedder.tokenizer if token_chunking else None,
+            max_tokens=engine.embedder.max_seq_length if token_chunking else None,
+        )
+
+        # Background workers that extract, embed and index uploads
+        workers = IngestionQueue(
+            engine,
+            processor,
+            workers=ingestion_workers,
+            max_pending=int(os.getenv("INGESTION_QUEUE_SIZE", "16")),
+        )
+        timings["ingestion"] = time.perf_counter() - component_start
+    except Exception as e:
+        logger.error(f"Error loading components: {e}")
+        startup_status["error"] = str(e)
+        return
+
+    rag_engine, document_processor, ingestion_queue = engine, processor, workers
+    startup_status.update(
+        ready=True,
+        total_seconds=round(time.perf_counter() - start, 3),
+        components={name: round(seconds, 3) for name, seconds in timings.items()},
+    )
+    logger.info(f"Components loaded in {startup_status['total_seconds']}s: {timings}")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load in the background so the server accepts connections (and health checks) immediately
+    threading.Thread(target=load_components, name="warm-up", daemon=True).start()
+    yield
+    if document_processor:
+        document_processor.close()
+
+
+app = FastAPI(title="Chatbot RAG API", version="1.0.0", lifespan=lifespan)
+
+# CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 
 class ChatMessage(BaseModel):
     message: str
     session_id: str | None = None
     use_rag: bool = True
+    tenant: str | None = None
 
 
 class ChatResponse(BaseModel):
@@ -51,93 +173,377 @@ class ChatResponse(BaseModel):
     sources: list[str] | None = None
 
 
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """Reject oversized request bodies before they are read"""
+    content_length = request.headers.get("content-length")
+    if (
+        content_length
+        and content_length.isdigit()
+        and int(content_length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+    ):
+        return JSONResponse(status_code=413, content={"detail": _too_large_message()})
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def require_ready(request: Request, call_next):
+    """Refuse requests that need the loaded components until the warm-up has finished"""
+    if not startup_status["ready"] and request.url.path not in STARTUP_EXEMPT_PATHS:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Service is starting up, please retry shortly"},
+            headers={"Retry-After": "5"},
+        )
+    return await call_next(request)
+
+
+def resolve_tenant(tenant: str | None, header: str | None) -> str | None:
+    """
+    Get the tenant of a request, given in a field or else in the X-Tenant-ID header
+
+    Raises:
+        HTTPException: 400 if the tenant id is not allowed
+    """
+    tenant = tenant or header
+    if not tenant:
+        return None
+    try:
+        validate_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return tenant
+
+
+def _too_large_message() -> str:
+    return f"File exceeds the maximum upload size of {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+
+
+async def save_upload(file: UploadFile) -> tuple[Path, str]:
+    """
+    Stream an upload into UPLOAD_DIR without blocking the event loop
+
+    The file is written to a temporary file, hashed in the same pass and
+    atomically renamed into place, so a partial or oversized upload never
+    appears in UPLOAD_DIR. Each upload gets its own directory, so uploads
+    with the same file name never overwrite each other; remove it with
+    remove_upload once it has been processed.
+
+    Args:
+        file: The uploaded file
+
+    Returns:
+        Tuple of the saved file path and the SHA-256 hex digest of its content
+
+    Raises:
+        HTTPException: 413 if the file exceeds MAX_UPLOAD_BYTES
+    """
+    upload_dir = UPLOAD_DIR / uuid.uuid4().hex
+    file_path = upload_dir / Path(file.filename).name
+    temp_path = file_path.with_name(f".{file_path.name}.part")
+    sha256 = hashlib.sha256()
+    size = 0
+
+    await aiofiles.os.makedirs(upload_dir)
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while block := await file.read(UPLOAD_READ_SIZE):
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=_too_large_message())
+                sha256.update(block)
+                await buffer.write(block)
+        await aiofiles.os.replace(temp_path, file_path)
+    except BaseException:
+        await asyncio.to_thread(remove_upload, temp_path)
+        raise
+
+    return file_path, sha256.hexdigest()
+
+
 @app.get("/")
 async def root():
     return {"message": "Chatbot RAG API is running"}
 
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload and process a document for RAG"""
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: the embedding model and index are loaded"""
+    if startup_status["ready"]:
+        return {"status": "ready", **startup_status}
+    status = "failed" if startup_status["error"] else "starting"
+    return JSONResponse(status_code=503, content={"status": status, **startup_status})
+
+
+@app.post("/upload", status_code=202)
+async def upload_file(
+    response: Response,
+    file: UploadFile = File(...),
+    tenant: str | None = Form(None),
+    x_tenant_id: str | None = Header(None),
+):
+    """Upload a document into the tenant's collection and queue it for processing"""
+    tenant = resolve_tenant(tenant, x_tenant_id)
+    file_path = None
+    queued = False
     try:
-        # Save uploaded file
-        file_path = UPLOAD_DIR / file.filename
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Process document
-        text_chunks = document_processor.process_document(str(file_path))
-
-        if not text_chunks:
-            raise HTTPException(status_code=400, detail="Could not extract text from document")
-
-        # Add to vector store
-        doc_id = rag_engine.add_documents(text_chunks, file.filename)
-
-        return {
-            "status": "success",
-            "filename": file.filename,
-            "chunks_processed": len(text_chunks),
-            "document_id": doc_id,
-        }
+        # Save uploaded file, hashing it on the way to disk
+        file_path, content_hash = await save_upload(file)
+
+        # Skip extraction and embedding for content that is already indexed; the lookup
+        # may open the tenant's collection, so it runs off the event loop
+        existing = await asyncio.to_thread(rag_engine.find_document_by_hash, content_hash, tenant)
+        if existing:
+            doc_id, chunks_processed = existing
+            response.status_code = 200
+            return {
+                "status": "success",
+                "filename": file.filename,
+                "chunks_processed": chunks_processed,
+                "document_id": doc_id,
+                "duplicate": True,
+            }
+
+        # Extraction, embedding and indexing happen on the ingestion workers
+        job = ingestion_queue.submit(file_path, file.filename, content_hash, tenant=tenant)
+        queued = True
+        return {"status": "queued", "filename": file.filename, "job_id": job["job_id"]}
+    except queue.Full as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many documents are being processed, please retry shortly",
+            headers={"Retry-After": "5"},
+        ) from e
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {e!s}") from e
+    finally:
+        # Once queued, the file belongs to the ingestion queue
+        if file_path and not queued:
+            await asyncio.to_thread(remove_upload, file_path)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the progress of a document ingestion job"""
+    job = ingestion_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    job.pop("file_path")
+    return job
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(chat_message: ChatMessage):
-    """Chat endpoint with optional RAG"""
+async def chat(chat_message: ChatMessage, x_tenant_id: str | None = Header(None)):
+    """Chat endpoint with optional RAG over the tenant's documents"""
+    tenant = resolve_tenant(chat_message.tenant, x_tenant_id)
     try:
         session_id = chat_message.session_id or str(uuid.uuid4())
 
         if chat_message.use_rag:
             # Use RAG to get relevant context
-            response, sources = rag_engine.generate_response(chat_message.message, session_id)
+            response, sources = await rag_engine.generate_response(
+                chat_message.message, session_id, tenant=tenant
+            )
             return ChatResponse(response=response, session_id=session_id, sources=sources)
         else:
-            # Direct chat without RAG
-            model = genai.GenerativeModel(os.getenv("GEMINI_MODEL"))
-            response = model.generate_content(chat_message.message)
-            return ChatResponse(response=response.text, session_id=session_id)
+            # Direct chat without RAG, sharing the engine's limit on Gemini calls
+            response = await rag_engine.llm.generate(chat_message.message)
+            return ChatResponse(response=response, session_id=session_id)
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Error generating response: {e!s}") from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {e!s}") from e
 
 
+@app.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage, x_tenant_id: str | None = Header(None)):
+    """
+    Chat endpoint that streams the answer as server-sent events
+
+    Events:
+        sources: {"session_id", "sources"}, sent before the answer
+        token: {"text"}, one per piece of the answer
+        done: {"session_id"}, after the answer is complete and the session saved
+        error: {"detail"}, if generation fails; the session is not saved
+    """
+    tenant = resolve_tenant(chat_message.tenant, x_tenant_id)
+    session_id = chat_message.session_id or str(uuid.uuid4())
+    # Reject unknown tenants with a status code, before the response starts
+    if chat_message.use_rag and not rag_engine.has_collection(tenant):
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {tenant}")
+
+    async def events():
+        try:
+            if chat_message.use_rag:
+                stream = rag_engine.stream_response(chat_message.message, session_id, tenant=tenant)
+            else:
+                stream = _direct_stream(chat_message.message)
+            # Close the stream as soon as the client goes away, so the LLM call
+            # and its concurrency slot are released without waiting for GC
+            async with contextlib.aclosing(stream):
+                async for event, data in stream:
+                    if event == "sources":
+                        yield _sse("sources", {"session_id": session_id, "sources": data})
+                    else:
+                        yield _sse("token", {"text": data})
+            yield _sse("done", {"session_id": session_id})
+        except Exception as e:
+            logger.exception("Streaming chat failed")
+            yield _sse("error", {"detail": f"Error generating response: {e!s}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _direct_stream(message: str):
+    """Stream an answer without RAG, in the event format of RAGEngine.stream_response"""
+    yield "sources", []
+    async with contextlib.aclosing(rag_engine.llm.stream(message)) as pieces:
+        async for piece in pieces:
+            yield "token", piece
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/stats")
+async def get_stats():
+    """Get cache hit/miss statistics"""
+    return rag_engine.get_stats()
+
+
 @app.delete("/documents")
-async def clear_documents():
-    """Clear all documents from vector store"""
+def clear_documents(x_tenant_id: str | None = Header(None)):
+    """Clear all documents and sessions of the tenant, or of the default collection"""
+    tenant = resolve_tenant(None, x_tenant_id)
     try:
-        rag_engine.clear_all()
+        rag_engine.clear_all(tenant)
         return {"status": "success", "message": "All documents cleared"}
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing documents: {e!s}") from e
 
 
+@app.delete("/documents/{doc_id}")
+def delete_document(doc_id: str, x_tenant_id: str | None = Header(None)):
+    """Remove one document's chunks, leaving the rest of the collection and the sessions"""
+    tenant = resolve_tenant(None, x_tenant_id)
+    try:
+        if rag_engine.get_document(doc_id, tenant) is None:
+            raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+        chunks_deleted = rag_engine.delete_document(doc_id, tenant)
+        return {"status": "success", "document_id": doc_id, "chunks_deleted": chunks_deleted}
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {e!s}") from e
+
+
+@app.put("/documents/{doc_id}", status_code=202)
+async def replace_document(
+    doc_id: str,
+    response: Response,
+    file: UploadFile = File(...),
+    tenant: str | None = Form(None),
+    x_tenant_id: str | None = Header(None),
+):
+    """Upload a new version of a document; the old version is removed once it is indexed"""
+    tenant = resolve_tenant(tenant, x_tenant_id)
+    file_path = None
+    queued = False
+    try:
+        document = await asyncio.to_thread(rag_engine.get_document, doc_id, tenant)
+        if document is None:
+            raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+
+        file_path, content_hash = await save_upload(file)
+        if content_hash == document["content_hash"]:
+            response.status_code = 200
+            return {
+                "status": "success",
+                "filename": file.filename,
+                "chunks_processed": document["chunk_count"],
+                "document_id": doc_id,
+                "duplicate": True,
+            }
+
+        job = ingestion_queue.submit(
+            file_path, file.filename, content_hash, replaces=doc_id, tenant=tenant
+        )
+        queued = True
+        return {"status": "queued", "filename": file.filename, "job_id": job["job_id"]}
+    except queue.Full as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many documents are being processed, please retry shortly",
+            headers={"Retry-After": "5"},
+        ) from e
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing file: {e!s}") from e
+    finally:
+        # Once queued, the file belongs to the ingestion queue
+        if file_path and not queued:
+            await asyncio.to_thread(remove_upload, file_path)
+
+
 @app.get("/documents")
-async def list_documents():
-    """List all uploaded documents"""
+def list_documents(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    x_tenant_id: str | None = Header(None),
+):
+    """List the tenant's documents, one page at a time; pass next_cursor to get the next page"""
+    tenant = resolve_tenant(None, x_tenant_id)
     try:
-        documents = rag_engine.list_documents()
-        return {"documents": documents}
+        documents, next_cursor = rag_engine.list_documents(limit, cursor, tenant)
+        return {"documents": documents, "next_cursor": next_cursor}
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing documents: {e!s}") from e
 
 
 @app.get("/sessions")
-async def list_sessions():
-    """List all chat sessions"""
+async def list_sessions(x_tenant_id: str | None = Header(None)):
+    """List the tenant's chat sessions"""
+    tenant = resolve_tenant(None, x_tenant_id)
     try:
-        sessions = rag_engine.session_manager.list_sessions()
+        sessions = rag_engine.session_manager.list_sessions(tenant)
         return {"sessions": sessions, "total": len(sessions)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing sessions: {e!s}") from e
 
 
 @app.get("/sessions/{session_id}")
-async def get_session(session_id: str):
-    """Get details of a specific session"""
+async def get_session(session_id: str, x_tenant_id: str | None = Header(None)):
+    """Get details of a specific session of the tenant"""
+    tenant = resolve_tenant(None, x_tenant_id)
     try:
-        session_data = rag_engine.session_manager.export_session(session_id)
+        session_data = rag_engine.session_manager.export_session(session_id, tenant)
         if session_data is None:
             raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
         return session_data
@@ -148,10 +554,11 @@ async def get_session(session_id: str):
 
 
 @app.delete("/sessions/{session_id}")
-async def delete_session(session_id: str):
-    """Delete a specific session"""
+async def delete_session(session_id: str, x_tenant_id: str | None = Header(None)):
+    """Delete a specific session of the tenant"""
+    tenant = resolve_tenant(None, x_tenant_id)
     try:
-        deleted = rag_engine.session_manager.delete_session(session_id)
+        deleted = rag_engine.session_manager.delete_session(session_id, tenant)
         if not deleted:
             raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
         return {"status": "success", "message": f"Session {session_id} deleted"}
@@ -162,10 +569,11 @@ async def delete_session(session_id: str):
 
 
 @app.delete("/sessions")
-async def clear_all_sessions():
-    """Clear all chat sessions"""
+async def clear_all_sessions(x_tenant_id: str | None = Header(None)):
+    """Clear the tenant's chat sessions"""
+    tenant = resolve_tenant(None, x_tenant_id)
     try:
-        rag_engine.session_manager.clear_all_sessions()
+        rag_engine.session_manager.clear_all_sessions(tenant)
         return {"status": "success", "message": "All sessions cleared"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing sessions: {e!s}") from e
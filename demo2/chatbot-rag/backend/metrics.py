@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Records how long each stage of a pipeline takes, over a window of recent runs"""
+
+    def __init__(self, window: int = 1000):
+        """
+        Initialize StageTimer
+
+        Args:
+            window: Number of recent timings kept per stage for percentiles
+        """
+        self.window = window
+        self._counts: dict[str, int] = {}
+        self._totals: dict[str, float] = {}
+        self._recent: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Time the body of a with block as one run of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        """Record one run of a stage"""
+        with self._lock:
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+            self._recent.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def stats(self) -> dict:
+        """Get the run count, mean and recent p50/p95 in milliseconds of every stage"""
+        with self._lock:
+            stats = {}
+            for stage, count in self._counts.items():
+                recent = sorted(self._recent[stage])
+                stats[stage] = {
+                    "count": count,
+                    "mean_ms": round(self._totals[stage] / count * 1000, 3),
+                    "p50_ms": round(recent[len(recent) // 2] * 1000, 3),
+                    "p95_ms": round(
+                        recent[min(int(len(recent) * 0.95), len(recent) - 1)] * 1000, 3
+                    ),
+                }
+            return stats
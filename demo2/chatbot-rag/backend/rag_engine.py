@@ -1,93 +1,669 @@
+import asyncio
+import contextlib
+import logging
 import os
+import threading
+import time
 import uuid
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
 from datetime import datetime
+from itertools import count, islice
 
-import chromadb
 import google.generativeai as genai
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+from cache import LRUCache, SemanticCache
+from context_builder import pack_context
+from document_processor import TextChunk
+from document_registry import DocumentRegistry
+from embedders import EMBEDDING_MODEL, Embedder, load_embedder
+from embedding_batcher import EmbeddingBatcher
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from llm_client import LLMClient
+from metrics import StageTimer
 from session_manager import SessionManager
+from tenant_collections import (
+    Collection,
+    CollectionPool,
+    UnknownTenantError,
+    tenant_collection_name,
+)
+from vector_store import VectorStore, create_vector_store
+
+# Number of chunks embedded and indexed per batch when streaming a document
+EMBED_BATCH_SIZE = 64
+
+# Number of chunk records read per call when scanning the vector store
+LIST_PAGE_SIZE = 5000
+
+# Candidates taken from each retriever per requested chunk before hybrid fusion
+FUSION_CANDIDATES_PER_RESULT = 4
+
+logger = logging.getLogger(__name__)
 
 
 class RAGEngine:
     """RAG engine for document retrieval and response generation"""
 
-    def __init__(self, collection_name: str = "documents"):
-        # Initialize ChromaDB
-        self.client = chromadb.Client(Settings(anonymized_telemetry=False, allow_reset=True))
-
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name, metadata={"hnsw:space": "cosine"}
+    def __init__(
+        self,
+        collection_name: str = "documents",
+        persist_directory: str | None = None,
+        query_cache_size: int = 1024,
+        query_batch_size: int = 32,
+        query_batch_wait_ms: float = 2.0,
+        embedding_backend: str = "torch",
+        embedding_onnx_file: str | None = None,
+        vector_store: str = "chroma",
+        vector_dtype: str = "float32",
+        hybrid_search: bool = False,
+        response_cache_size: int = 0,
+        response_cache_threshold: float = 0.95,
+        response_cache_ttl_seconds: float = 3600,
+        llm_max_concurrency: int = 8,
+        llm_timeout_seconds: float = 60,
+        llm_max_retries: int = 2,
+        context_token_budget: int = 2000,
+        max_open_collections: int = 16,
+        collection_idle_seconds: float = 900,
+    ):
+        # Seconds spent loading each component, reported by the readiness endpoint
+        self.startup_timings: dict[str, float] = {}
+
+        # Each tenant has its own collection (vector store, keyword index and document
+        # registry), opened on first use; without a tenant, collection_name is used
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.vector_store = vector_store
+        self.vector_dtype = vector_dtype
+        self.hybrid_search = hybrid_search
+
+        # Versions are never reused, so answers cached for a closed collection
+        # do not match it once it is reopened
+        self._versions = count(1)
+
+        # Collections without a directory live only in memory and are never closed, so
+        # at most max_open_collections of them can be created
+        self.collections = CollectionPool(
+            self._open_collection,
+            max_open=max_open_collections,
+            idle_seconds=collection_idle_seconds,
+            evictable=bool(persist_directory),
         )
+        with self.collections.use(collection_name) as collection:
+            self.startup_timings.update(collection.open_timings)
 
-        # Initialize embedding model
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+        # Initialize embedding model with the configured runtime
+        start = time.perf_counter()
+        self.embedder: Embedder = load_embedder(
+            EMBEDDING_MODEL, embedding_backend, embedding_onnx_file
+        )
+        self.embedder_name = f"{EMBEDDING_MODEL}:{embedding_onnx_file or embedding_backend}"
+        self.startup_timings["embedding_model"] = time.perf_counter() - start
 
-        # Initialize Gemini
+        # Initialize Gemini, called without blocking the event loop
         self.model = genai.GenerativeModel(os.getenv("GEMINI_MODEL"))
+        self.llm = LLMClient(
+            self.model,
+            max_concurrency=llm_max_concurrency,
+            timeout_seconds=llm_timeout_seconds,
+            max_retries=llm_max_retries,
+        )
 
         # Session manager for persistence
+        start = time.perf_counter()
         self.session_manager = SessionManager()
+        self.startup_timings["sessions"] = time.perf_counter() - start
+
+        # (normalized query, model and backend name) -> query embedding
+        self.query_cache = LRUCache(query_cache_size)
 
-    def add_documents(self, chunks: list[str], source_name: str) -> str:
+        # Answers to first questions of a session, matched by query embedding similarity and
+        # scoped to the collection and its version, which adding or clearing documents bumps
+        self.response_cache = SemanticCache(
+            response_cache_size, response_cache_threshold, response_cache_ttl_seconds
+        )
+        # Orders caching an answer after its documents are checked against discarding
+        # the answers of a deleted document
+        self._response_cache_lock = threading.Lock()
+
+        # Estimated token limit of the document context in a prompt (0 for no limit), and
+        # the characters of retrieved chunks against those left after packing
+        self.context_token_budget = context_token_budget
+        self._context_chars = {"retrieved": 0, "packed": 0}
+
+        # Time spent in each retrieval stage and until the first and last token of an
+        # answer, reported by the stats endpoint
+        self.retrieval_timer = StageTimer()
+        self.response_timer = StageTimer()
+
+        # Uncased models lowercase their input anyway, so case variants can share an entry
+        self._uncased = getattr(self.embedder.tokenizer, "do_lower_case", False)
+
+        # Concurrent query embeddings share forward passes unless batching is disabled
+        self.query_batcher = None
+        if query_batch_size > 1:
+            self.query_batcher = EmbeddingBatcher(
+                lambda texts: self.embedder.encode(texts, batch_size=len(texts)),
+                max_batch_size=query_batch_size,
+                max_wait_ms=query_batch_wait_ms,
+            )
+
+    def warm_up(self):
+        """Run a dummy encode so the first real query does not pay for kernel and allocator setup"""
+        start = time.perf_counter()
+        self.embedder.encode(["warm up"])
+        self.startup_timings["warm_up_encode"] = time.perf_counter() - start
+
+    def _open_collection(self, name: str) -> Collection:
+        """Open a collection's vector store, keyword index and document registry"""
+        timings = {}
+
+        # Initialize the vector store, reopening its index when a directory is given
+        start = time.perf_counter()
+        # Tenants' collections get their own directory, so closing one unloads its index
+        store = create_vector_store(
+            self.vector_store,
+            name,
+            self.persist_directory,
+            self.vector_dtype,
+            own_directory=name != self.collection_name,
+        )
+        timings["vector_store"] = time.perf_counter() - start
+        if self.persist_directory:
+            logger.info(
+                f"Opened {self.vector_store} collection {name} in {self.persist_directory} with "
+                f"{store.count()} chunks in {timings['vector_store']:.2f}s"
+            )
+
+        # Keyword index next to the vector store, rebuilt from the stored texts in the
+        # background; until it is ready, queries use the vector store alone
+        lexical_index = None
+        if self.hybrid_search:
+            lexical_index = BM25Index()
+            if store.count():
+                lexical_index.build_in_background(store.iter_texts(LIST_PAGE_SIZE))
+
+        # One record per document, for listing and duplicate checks without scanning chunks
+        start = time.perf_counter()
+        registry = DocumentRegistry(self._registry_path(name))
+        if not registry.count() and store.count():
+            _rebuild_registry(store, registry)
+        timings["document_registry"] = time.perf_counter() - start
+
+        collection = Collection(name, store, lexical_index, registry, next(self._versions))
+        collection.open_timings = timings
+        return collection
+
+    def _collection_name(self, tenant: str | None) -> str:
+        """Get the collection of a tenant, raising ValueError for an invalid tenant id"""
+        return tenant_collection_name(self.collection_name, tenant)
+
+    def _registry_path(self, name: str) -> str | None:
+        """Get the document registry file of a collection; None when kept in memory"""
+        if not self.persist_directory:
+            return None
+        return os.path.join(self.persist_directory, f"{name}.documents.sqlite3")
+
+    def has_collection(self, tenant: str | None) -> bool:
+        """Whether a tenant has a collection; the default collection always exists"""
+        name = self._collection_name(tenant)
+        if name == self.collection_name or self.collections.is_open(name):
+            return True
+        # In-memory collections are never closed, so only persisted ones can be closed
+        registry_path = self._registry_path(name)
+        return bool(registry_path) and os.path.exists(registry_path)
+
+    def _use_collection(self, tenant: str | None, create: bool = False):
+        """
+        Open a tenant's collection for a with block
+
+        Args:
+            tenant: Tenant id; the default collection when None
+            create: Whether to create the collection if the tenant has none
+
+        Raises:
+            UnknownTenantError: If the tenant has no collection and create is False
+        """
+        if not create and not self.has_collection(tenant):
+            raise UnknownTenantError(f"Unknown tenant: {tenant}")
+        return self.collections.use(self._collection_name(tenant))
+
+    def _acquire_collection(self, tenant: str | None) -> Collection:
+        """Acquire an existing collection of a tenant, see _use_collection"""
+        if not self.has_collection(tenant):
+            raise UnknownTenantError(f"Unknown tenant: {tenant}")
+        return self.collections.acquire(self._collection_name(tenant))
+
+    def add_documents(self, chunks: list[str], source_name: str, tenant: str | None = None) -> str:
         """Add document chunks to vector store"""
-        doc_id = str(uuid.uuid4())
+        doc_id, _ = self.add_document_stream(chunks, source_name, tenant=tenant)
+        return doc_id
 
+    def add_document_stream(
+        self,
+        chunks: Iterable[str | TextChunk],
+        source_name: str,
+        batch_size: int = EMBED_BATCH_SIZE,
+        content_hash: str | None = None,
+        progress: Callable[[int], None] | None = None,
+        tenant: str | None = None,
+    ) -> tuple[str, int]:
+        """
+        Embed and index document chunks in bounded batches as they arrive
+
+        If extraction or indexing fails, the chunks already indexed are removed
+        before the error is raised again.
+
+        Args:
+            chunks: Iterable of text chunks, e.g. a streaming DocumentProcessor result.
+                The offsets of TextChunk items are stored in the chunk metadata.
+            source_name: Name of the source document
+            batch_size: Number of chunks embedded and added per batch
+            content_hash: Hash of the source file, used to detect re-uploads
+            progress: Called with the number of chunks indexed so far after each batch
+            tenant: Tenant whose collection the document is added to; the default one when None
+
+        Returns:
+            Tuple of the new document id and the number of chunks indexed
+        """
+        doc_id = str(uuid.uuid4())
+        timestamp = datetime.now().isoformat()
+        chunk_count = 0
+
+        # Keep the collection open between batches, creating it for a new tenant
+        with self._use_collection(tenant, create=True):
+            try:
+                for batch in _batched(chunks, batch_size):
+                    records = [
+                        build_chunk_record(doc_id, source_name, i, chunk, timestamp, content_hash)
+                        for i, chunk in enumerate(batch, start=chunk_count)
+                    ]
+                    self.add_chunks(*zip(*records, strict=True), tenant=tenant)
+                    chunk_count += len(batch)
+                    if progress:
+                        progress(chunk_count)
+
+                if chunk_count:
+                    self.record_document(
+                        doc_id, source_name, timestamp, chunk_count, content_hash, tenant=tenant
+                    )
+            except BaseException:
+                # Remove the batches already indexed, so a failed document is not half-searchable
+                if chunk_count:
+                    self.delete_document(doc_id, tenant)
+                raise
+
+        return doc_id, chunk_count
+
+    def add_chunks(
+        self, ids: list[str], texts: list[str], metadatas: list[dict], tenant: str | None = None
+    ):
+        """
+        Embed and index a batch of chunks, which may belong to several documents
+
+        Args:
+            ids: Chunk ids
+            texts: Chunk texts
+            metadatas: Chunk metadata, see build_chunk_record
+            tenant: Tenant whose collection the chunks are added to; the default one when None
+        """
         # Generate embeddings
-        embeddings = self.embedder.encode(chunks).tolist()
-
-        # Prepare metadata
-        ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
-        metadatas = [
-            {
-                "source": source_name,
-                "doc_id": doc_id,
-                "chunk_index": i,
-                "timestamp": datetime.now().isoformat(),
-            }
-            for i in range(len(chunks))
-        ]
-
-        # Add to collection
-        self.collection.add(embeddings=embeddings, documents=chunks, metadatas=metadatas, ids=ids)
-
-        return doc_id
+        embeddings = self.embedder.encode(list(texts)).tolist()
+
+        with self._use_collection(tenant, create=True) as collection:
+            # Add to vector store
+            collection.store.add(list(ids), embeddings, list(texts), list(metadatas))
+
+            # Add to keyword index
+            if collection.lexical_index:
+                collection.lexical_index.add(list(ids), list(texts))
+
+            collection.version = next(self._versions)
+
+    def record_document(
+        self,
+        doc_id: str,
+        source_name: str,
+        timestamp: str,
+        chunk_count: int,
+        content_hash: str | None = None,
+        tenant: str | None = None,
+    ):
+        """Record a fully indexed document so it is listed and re-uploads of it are detected"""
+        with self._use_collection(tenant, create=True) as collection:
+            collection.registry.add(doc_id, source_name, timestamp, chunk_count, content_hash)
+
+    def delete_document(self, doc_id: str, tenant: str | None = None) -> int:
+        """
+        Remove all chunks of a document from the vector store
+
+        Args:
+            doc_id: Unique document identifier
+            tenant: Tenant whose collection holds the document; the default one when None
+
+        Returns:
+            Number of chunks removed
+
+        Raises:
+            UnknownTenantError: If the tenant has no collection
+        """
+        with self._use_collection(tenant) as collection:
+            ids, _ = collection.store.get(where={"doc_id": doc_id})
+            if collection.lexical_index:
+                collection.lexical_index.delete(ids)
+            collection.store.delete(ids)
+            collection.registry.remove(doc_id)
+
+        # Removing a document only changes the answers whose context came from it,
+        # so drop those instead of invalidating the whole response cache
+        with self._response_cache_lock:
+            self.response_cache.discard(doc_id)
+        return len(ids)
+
+    def get_document(self, doc_id: str, tenant: str | None = None) -> dict | None:
+        """Get the registry record of a document, or None if the collection does not hold it"""
+        with self._use_collection(tenant) as collection:
+            return collection.registry.get(doc_id)
+
+    def find_document_by_hash(
+        self, content_hash: str, tenant: str | None = None
+    ) -> tuple[str, int] | None:
+        """
+        Look up an already indexed document by the hash of its source file
+
+        Args:
+            content_hash: Hash of the source file
+            tenant: Tenant whose collection is searched; the default one when None
+
+        Returns:
+            Tuple of the document id and its chunk count, or None if not indexed,
+            also when the tenant has no collection yet
+        """
+        if not self.has_collection(tenant):
+            return None
+        with self._use_collection(tenant) as collection:
+            document = collection.registry.find_by_hash(content_hash)
+        if document is None:
+            return None
+        return document["doc_id"], document["chunk_count"]
 
     def retrieve_relevant_chunks(
-        self, query: str, n_results: int = 5
+        self, query: str, n_results: int = 5, tenant: str | None = None
     ) -> tuple[list[str], list[str]]:
         """Retrieve relevant chunks for a query"""
-        # Generate query embedding
-        query_embedding = self.embedder.encode([query]).tolist()
+        documents, metadatas = self.retrieve_chunks(query, n_results, tenant)
+        sources = [meta.get("source", "Unknown") for meta in metadatas]
+        return documents, sources
 
-        # Query collection
-        results = self.collection.query(query_embeddings=query_embedding, n_results=n_results)
+    def retrieve_chunks(
+        self, query: str, n_results: int = 5, tenant: str | None = None
+    ) -> tuple[list[str], list[dict]]:
+        """
+        Retrieve relevant chunks for a query with their metadata, best first
+
+        With hybrid search, the closest chunks by embedding and the best BM25
+        matches are merged by reciprocal-rank fusion, so exact terms such as
+        part numbers and error codes are found even when the embedding misses them.
+        While the keyword index is still being built, only the embedding is used.
+        Only the tenant's own collection is searched.
+        """
+        with self._use_collection(tenant) as collection:
+            return self._retrieve(collection, query, n_results)
+
+    def _retrieve(
+        self, collection: Collection, query: str, n_results: int
+    ) -> tuple[list[str], list[dict]]:
+        """Retrieve relevant chunks from an acquired collection, see retrieve_chunks"""
+        timer = self.retrieval_timer
+        store, lexical_index = collection.store, collection.lexical_index
 
-        if not results["documents"] or not results["documents"][0]:
-            return [], []
+        # Generate query embedding
+        with timer.time("embed"):
+            query_embedding = self.embed_query(query)
 
-        documents = results["documents"][0]
-        sources = [meta.get("source", "Unknown") for meta in results["metadatas"][0]]
+        if not lexical_index or not lexical_index.ready:
+            with timer.time("dense"):
+                _, documents, metadatas, _ = store.query(query_embedding, n_results)
+        else:
+            candidates = n_results * FUSION_CANDIDATES_PER_RESULT
+
+            # Query vector store and keyword index
+            with timer.time("dense"):
+                ids, texts, dense_metadatas, _ = store.query(query_embedding, candidates)
+            with timer.time("lexical"):
+                lexical_ids = [chunk_id for chunk_id, _ in lexical_index.search(query, candidates)]
+
+            # Merge both rankings, reading back chunks only the keyword index found
+            with timer.time("fusion"):
+                fused = reciprocal_rank_fusion([ids, lexical_ids])[:n_results]
+                found = dict(zip(ids, zip(texts, dense_metadatas, strict=True), strict=True))
+                missing = [chunk_id for chunk_id in fused if chunk_id not in found]
+                if missing:
+                    fetched = store.fetch(missing)
+                    found.update(zip(fetched[0], zip(*fetched[1:], strict=True), strict=True))
+                # Chunks deleted since the keyword search are dropped
+                fused = [chunk_id for chunk_id in fused if chunk_id in found]
+                documents = [found[chunk_id][0] for chunk_id in fused]
+                metadatas = [found[chunk_id][1] for chunk_id in fused]
+
+        return documents, metadatas
+
+    def embed_query(self, query: str) -> list[float]:
+        """
+        Embed a query, reusing the embedding of a previous identical query
+
+        Queries are compared after collapsing whitespace (and case, for uncased
+        models), so trivially different spellings of the same question share
+        one cache entry.
+
+        Args:
+            query: Query text
+
+        Returns:
+            Query embedding; shared with the cache, so it must not be modified
+        """
+        normalized = " ".join(query.split())
+        if self._uncased:
+            normalized = normalized.lower()
+        key = (normalized, self.embedder_name)
+
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            if self.query_batcher:
+                embedding = self.query_batcher.encode(normalized)
+            else:
+                embedding = self.embedder.encode([normalized])[0].tolist()
+            self.query_cache.put(key, embedding)
+        return embedding
+
+    def get_stats(self) -> dict:
+        """Get cache, query batching, collection and retrieval timing statistics"""
+        stats = {"query_embedding_cache": self.query_cache.stats()}
+        if self.query_batcher:
+            stats["query_batching"] = self.query_batcher.stats()
+        stats["collections"] = self.collections.stats()
+        if self.response_cache.max_size > 0:
+            stats["response_cache"] = self.response_cache.stats()
+        retrieved, packed = self._context_chars["retrieved"], self._context_chars["packed"]
+        stats["context_packing"] = {
+            "token_budget": self.context_token_budget,
+            "retrieved_chars": retrieved,
+            "packed_chars": packed,
+            "reduction": round(1 - packed / retrieved, 4) if retrieved else 0.0,
+        }
+        stats["retrieval_timings"] = self.retrieval_timer.stats()
+        stats["response_timings"] = self.response_timer.stats()
+        stats["llm"] = self.llm.stats()
+        return stats
+
+    async def generate_response(
+        self, query: str, session_id: str, n_results: int = 5, tenant: str | None = None
+    ) -> tuple[str, list[str]]:
+        """Generate response using RAG, with context from the tenant's collection"""
+        start = time.perf_counter()
 
-        return documents, sources
+        # Retrieve relevant chunks off the event loop, as opening a collection, embedding
+        # and search are blocking
+        collection = await asyncio.to_thread(self._acquire_collection, tenant)
+        try:
+            # Get session history from SessionManager
+            history = self.session_manager.load_session(session_id, tenant)
+
+            # Reuse the answer to a near-identical question; follow-ups depend on the
+            # conversation, so only first turns are cached
+            cacheable = self.response_cache.max_size > 0 and not history
+            if cacheable:
+                scope = (collection.name, collection.version, n_results)
+                query_embedding = await asyncio.to_thread(self.embed_query, query)
+                cached = self.response_cache.get(query_embedding, scope)
+                if cached is not None:
+                    response_text, unique_sources = cached
+                    self._save_turn(session_id, history, query, response_text, tenant)
+                    return response_text, unique_sources
+
+            relevant_chunks, metadatas = await asyncio.to_thread(
+                self._retrieve, collection, query, n_results
+            )
+        finally:
+            self.collections.release(collection)
+        sources = [meta.get("source", "Unknown") for meta in metadatas]
 
-    def generate_response(
-        self, query: str, session_id: str, n_results: int = 5
-    ) -> tuple[str, list[str]]:
-        """Generate response using RAG"""
-        # Retrieve relevant chunks
-        relevant_chunks, sources = self.retrieve_relevant_chunks(query, n_results)
+        # Generate response
+        prompt = self._build_prompt(query, self._pack_context(relevant_chunks, metadatas), history)
+        response_text = await self.llm.generate(prompt)
+        self.response_timer.record("response", time.perf_counter() - start)
+
+        # Update session history
+        self._save_turn(session_id, history, query, response_text, tenant)
 
-        # Get session history from SessionManager
-        history = self.session_manager.load_session(session_id)
+        # Get unique sources
+        unique_sources = list(set(sources)) if sources else []
 
-        # Build context
-        context = "\n\n".join(relevant_chunks) if relevant_chunks else ""
+        if cacheable:
+            await asyncio.to_thread(
+                self._cache_response,
+                query_embedding,
+                response_text,
+                unique_sources,
+                scope,
+                metadatas,
+            )
+
+        return response_text, unique_sources
+
+    async def stream_response(
+        self, query: str, session_id: str, n_results: int = 5, tenant: str | None = None
+    ) -> AsyncIterator[tuple[str, list[str] | str]]:
+        """
+        Generate a response using RAG, yielding the sources before the answer text
+
+        The session history is only saved once the whole answer has been
+        generated, so an interrupted stream leaves the session unchanged.
+
+        Args:
+            query: User question
+            session_id: Session the question belongs to
+            n_results: Number of chunks retrieved as context
+            tenant: Tenant whose collection the context comes from; the default one when None
+
+        Yields:
+            ("sources", unique source names) once, then ("token", text) per piece of the answer
+        """
+        start = time.perf_counter()
+        collection = await asyncio.to_thread(self._acquire_collection, tenant)
+        try:
+            history = self.session_manager.load_session(session_id, tenant)
+            cacheable = self.response_cache.max_size > 0 and not history
+            cached = None
+            if cacheable:
+                scope = (collection.name, collection.version, n_results)
+                query_embedding = await asyncio.to_thread(self.embed_query, query)
+                cached = self.response_cache.get(query_embedding, scope)
+            if cached is None:
+                relevant_chunks, metadatas = await asyncio.to_thread(
+                    self._retrieve, collection, query, n_results
+                )
+        finally:
+            self.collections.release(collection)
+
+        if cached is not None:
+            response_text, unique_sources = cached
+            yield "sources", unique_sources
+            yield "token", response_text
+            self._save_turn(session_id, history, query, response_text, tenant)
+            return
+
+        sources = [meta.get("source", "Unknown") for meta in metadatas]
+        unique_sources = list(set(sources)) if sources else []
+        yield "sources", unique_sources
+
+        # Stream the answer, keeping it whole for the history
+        pieces = []
+        prompt = self._build_prompt(query, self._pack_context(relevant_chunks, metadatas), history)
+        async with contextlib.aclosing(self.llm.stream(prompt)) as stream:
+            async for piece in stream:
+                if not pieces:
+                    self.response_timer.record("first_token", time.perf_counter() - start)
+                pieces.append(piece)
+                yield "token", piece
+        self.response_timer.record("response", time.perf_counter() - start)
+
+        response_text = "".join(pieces)
+        self._save_turn(session_id, history, query, response_text, tenant)
+        if cacheable:
+            await asyncio.to_thread(
+                self._cache_response,
+                query_embedding,
+                response_text,
+                unique_sources,
+                scope,
+                metadatas,
+            )
+
+    def _cache_response(
+        self,
+        query_embedding: list[float],
+        response_text: str,
+        sources: list[str],
+        scope: tuple,
+        metadatas: list[dict],
+    ):
+        """
+        Cache an answer, tagged with the documents its context came from
+
+        The answer is dropped if the collection changed while it was generated:
+        the answers of a document deleted meanwhile have already been discarded,
+        so one built from it would otherwise be served until it expires.
+        """
+        name, version, _ = scope
+        doc_ids = frozenset(meta.get("doc_id") for meta in metadatas)
+        if not self.collections.is_open(name):
+            # A closed collection is reopened with a new version, which the answer would not match
+            return
+        with self.collections.use(name) as collection, self._response_cache_lock:
+            # Versions are never reused, so this also catches a closed and reopened collection
+            if collection.version != version:
+                return
+            if any(
+                doc_id is not None and collection.registry.get(doc_id) is None for doc_id in doc_ids
+            ):
+                return
+            self.response_cache.put(query_embedding, (response_text, sources), scope, doc_ids)
+
+    def _pack_context(self, relevant_chunks: list[str], metadatas: list[dict]) -> str:
+        """Merge overlapping chunks and fit them into the context budget, see pack_context"""
+        with self.retrieval_timer.time("packing"):
+            passages = pack_context(relevant_chunks, metadatas, self.context_token_budget)
+        context = "\n\n".join(passages)
+        self._context_chars["retrieved"] += sum(len(chunk) for chunk in relevant_chunks)
+        self._context_chars["packed"] += len(context)
+        return context
+
+    def _build_prompt(self, query: str, context: str, history: list[dict]) -> str:
+        """Build the prompt from the packed document context and the conversation so far"""
 
         # Build prompt
         if context:
-            prompt = f"""You are a helpful AI assistant. Use the following context from the uploaded documents to answer the user's question. If the context doesn't contain relevant information, use your general knowledge but mention that the answer is not from the uploaded documents.
+            return f"""You are a helpful AI assistant. Use the following context from the uploaded documents to answer the user's question. If the context doesn't contain relevant information, use your general knowledge but mention that the answer is not from the uploaded documents.
 
 Context from documents:
 {context}
@@ -98,8 +674,7 @@ Previous conversation:
 User question: {query}
 
 Please provide a helpful and accurate response:"""
-        else:
-            prompt = f"""You are a helpful AI assistant. No specific documents have been uploaded yet, so please answer based on your general knowledge.
+        return f"""You are a helpful AI assistant. No specific documents have been uploaded yet, so please answer based on your general knowledge.
 
 Previous conversation:
 {self._format_history(history)}
@@ -108,21 +683,21 @@ User question: {query}
 
 Please provide a helpful response:"""
 
-        # Generate response
-        response = self.model.generate_content(prompt)
-
-        # Update session history
+    def _save_turn(
+        self,
+        session_id: str,
+        history: list[dict],
+        query: str,
+        response: str,
+        tenant: str | None = None,
+    ):
+        """Append a question and its answer to the tenant's session history"""
         history.append({"role": "user", "content": query})
-        history.append({"role": "assistant", "content": response.text})
+        history.append({"role": "assistant", "content": response})
 
         # Keep last 10 messages and save to disk
         history = history[-10:]
-        self.session_manager.save_session(session_id, history)
-
-        # Get unique sources
-        unique_sources = list(set(sources)) if sources else []
-
-        return response.text, unique_sources
+        self.session_manager.save_session(session_id, history, tenant)
 
     def _format_history(self, history: list[dict]) -> str:
         """Format conversation history"""
@@ -137,32 +712,116 @@ Please provide a helpful response:"""
 
         return "\n".join(formatted)
 
-    def clear_all(self):
-        """Clear all documents from collection and all sessions"""
-        self.client.delete_collection(self.collection.name)
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection.name, metadata={"hnsw:space": "cosine"}
-        )
-        self.session_manager.clear_all_sessions()
-
-    def list_documents(self) -> list[dict]:
-        """List all documents in the collection"""
-        try:
-            results = self.collection.get()
-            if not results["metadatas"]:
-                return []
-
-            # Get unique documents
-            docs = {}
-            for metadata in results["metadatas"]:
-                doc_id = metadata.get("doc_id")
-                if doc_id and doc_id not in docs:
-                    docs[doc_id] = {
-                        "doc_id": doc_id,
-                        "source": metadata.get("source"),
-                        "timestamp": metadata.get("timestamp"),
-                    }
-
-            return list(docs.values())
-        except Exception:
-            return []
+    def clear_all(self, tenant: str | None = None):
+        """
+        Clear all documents from a collection
+
+        Args:
+            tenant: Tenant whose documents and sessions are removed; the default
+                collection when None
+
+        Raises:
+            UnknownTenantError: If the tenant has no collection
+        """
+        with self._use_collection(tenant) as collection:
+            collection.store.clear()
+            if collection.lexical_index:
+                collection.lexical_index.clear()
+            collection.registry.clear()
+            collection.version = next(self._versions)
+        if tenant is None:
+            self.response_cache.clear()
+        self.session_manager.clear_all_sessions(tenant)
+
+    def list_documents(
+        self, limit: int = 100, cursor: str | None = None, tenant: str | None = None
+    ) -> tuple[list[dict], str | None]:
+        """
+        List documents in the collection from the registry, one page at a time
+
+        Args:
+            limit: Maximum number of documents returned
+            cursor: Cursor returned with the previous page; the first page when None
+            tenant: Tenant whose documents are listed; the default collection when None
+
+        Returns:
+            Tuple of documents (doc_id, source, timestamp, chunk_count, content_hash)
+            and the cursor of the next page, None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+            UnknownTenantError: If the tenant has no collection
+        """
+        with self._use_collection(tenant) as collection:
+            return collection.registry.list(limit, cursor)
+
+
+def build_chunk_record(
+    doc_id: str,
+    source_name: str,
+    index: int,
+    chunk: str | TextChunk,
+    timestamp: str,
+    content_hash: str | None = None,
+) -> tuple[str, str, dict]:
+    """
+    Build the id, text and metadata stored for one chunk of a document
+
+    Args:
+        doc_id: Unique document identifier
+        source_name: Name of the source document
+        index: Position of the chunk in the document
+        chunk: Chunk text; the offsets of a TextChunk are stored in the metadata
+        timestamp: Time the document was indexed
+        content_hash: Hash of the source file
+
+    Returns:
+        Tuple of chunk id, chunk text and chunk metadata
+    """
+    metadata = {
+        "source": source_name,
+        "doc_id": doc_id,
+        "chunk_index": index,
+        "timestamp": timestamp,
+    }
+    if content_hash:
+        metadata["content_hash"] = content_hash
+    if isinstance(chunk, TextChunk):
+        metadata["start_offset"] = chunk.start
+        metadata["end_offset"] = chunk.end
+        chunk = chunk.text
+    return f"{doc_id}_{index}", chunk, metadata
+
+
+def _rebuild_registry(store: VectorStore, registry: DocumentRegistry):
+    """Record the documents of an index created before the registry existed"""
+    logger.info("Rebuilding the document registry from the chunk metadata")
+    docs = {}
+    offset = 0
+    while True:
+        ids, metadatas = store.get(limit=LIST_PAGE_SIZE, offset=offset)
+        for metadata in metadatas:
+            doc_id = metadata.get("doc_id")
+            if doc_id not in docs:
+                docs[doc_id] = [metadata, 0]
+            docs[doc_id][1] += 1
+        if len(ids) < LIST_PAGE_SIZE:
+            break
+        offset += LIST_PAGE_SIZE
+
+    for doc_id, (metadata, chunk_count) in docs.items():
+        if doc_id:
+            registry.add(
+                doc_id,
+                metadata.get("source"),
+                metadata.get("timestamp"),
+                chunk_count,
+                metadata.get("content_hash"),
+            )
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of at most size items"""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -7,7 +7,13 @@ logger = logging.getLogger(__name__)
 
 
 class SessionManager:
-    """Manages persistent storage of chat sessions"""
+    """
+    Manages persistent storage of chat sessions
+
+    Sessions belong to a tenant: those of the default collection are stored
+    in sessions_dir, those of a tenant in a subdirectory named after it, so
+    the same session id under two tenants refers to two sessions.
+    """
 
     def __init__(self, sessions_dir: str = "data/sessions"):
         """
@@ -18,21 +24,31 @@ class SessionManager:
         """
         self.sessions_dir = Path(sessions_dir)
         self.sessions_dir.mkdir(parents=True, exist_ok=True)
-        self.sessions = {}
+        self.sessions = {}  # (tenant, session_id) -> messages
         self._load_all_sessions()
 
+    def _tenant_dir(self, tenant: str | None) -> Path:
+        """Get the directory of a tenant's sessions"""
+        return self.sessions_dir / tenant if tenant else self.sessions_dir
+
+    def _session_file(self, session_id: str, tenant: str | None) -> Path:
+        return self._tenant_dir(tenant) / f"{session_id}.json"
+
     def _load_all_sessions(self):
         """Load all existing sessions from disk"""
         try:
-            for session_file in self.sessions_dir.glob("*.json"):
+            session_files = [(None, path) for path in self.sessions_dir.glob("*.json")]
+            session_files += [
+                (path.parent.name, path) for path in self.sessions_dir.glob("*/*.json")
+            ]
+            for tenant, session_file in session_files:
                 session_id = session_file.stem
                 try:
                     with open(session_file, encoding="utf-8") as f:
                         session_data = json.load(f)
-                        self.sessions[session_id] = session_data.get("messages", [])
-                        logger.info(
-                            f"Loaded session {session_id} with {len(self.sessions[session_id])} messages"
-                        )
+                        messages = session_data.get("messages", [])
+                        self.sessions[(tenant, session_id)] = messages
+                        logger.info(f"Loaded session {session_id} with {len(messages)} messages")
                 except Exception as e:
                     logger.error(f"Error loading session {session_id}: {e}")
 
@@ -40,16 +56,20 @@ class SessionManager:
         except Exception as e:
             logger.error(f"Error loading sessions: {e}")
 
-    def save_session(self, session_id: str, messages: list[dict[str, str]]):
+    def save_session(
+        self, session_id: str, messages: list[dict[str, str]], tenant: str | None = None
+    ):
         """
         Save a session to disk
 
         Args:
             session_id: Unique session identifier
             messages: List of message dicts with 'role' and 'content' keys
+            tenant: Tenant the session belongs to; the default collection when None
         """
         try:
-            session_file = self.sessions_dir / f"{session_id}.json"
+            session_file = self._session_file(session_id, tenant)
+            session_file.parent.mkdir(parents=True, exist_ok=True)
 
             # Check if session exists to get created_at timestamp
             if session_file.exists():
@@ -71,56 +91,57 @@ class SessionManager:
                 json.dump(session_data, f, indent=2, ensure_ascii=False)
 
             # Update in-memory cache
-            self.sessions[session_id] = messages
+            self.sessions[(tenant, session_id)] = messages
             logger.info(f"Saved session {session_id} with {len(messages)} messages")
         except Exception as e:
             logger.error(f"Error saving session {session_id}: {e}")
             raise
 
-    def load_session(self, session_id: str) -> list[dict[str, str]]:
+    def load_session(self, session_id: str, tenant: str | None = None) -> list[dict[str, str]]:
         """
         Load a session from memory or disk
 
         Args:
             session_id: Unique session identifier
+            tenant: Tenant the session belongs to; the default collection when None
 
         Returns:
             List of message dicts, or empty list if session doesn't exist
         """
         # Check in-memory cache first
-        if session_id in self.sessions:
-            return self.sessions[session_id]
+        if (tenant, session_id) in self.sessions:
+            return self.sessions[(tenant, session_id)]
 
         # Try loading from disk
-        session_file = self.sessions_dir / f"{session_id}.json"
+        session_file = self._session_file(session_id, tenant)
         if session_file.exists():
             try:
                 with open(session_file, encoding="utf-8") as f:
                     session_data = json.load(f)
                     messages = session_data.get("messages", [])
-                    self.sessions[session_id] = messages
+                    self.sessions[(tenant, session_id)] = messages
                     return messages
             except Exception as e:
                 logger.error(f"Error loading session {session_id}: {e}")
 
         return []
 
-    def delete_session(self, session_id: str) -> bool:
+    def delete_session(self, session_id: str, tenant: str | None = None) -> bool:
         """
         Delete a session from memory and disk
 
         Args:
             session_id: Unique session identifier
+            tenant: Tenant the session belongs to; the default collection when None
 
         Returns:
             True if session was deleted, False if it didn't exist
         """
         try:
-            session_file = self.sessions_dir / f"{session_id}.json"
+            session_file = self._session_file(session_id, tenant)
 
             # Remove from memory
-            if session_id in self.sessions:
-                del self.sessions[session_id]
+            self.sessions.pop((tenant, session_id), None)
 
             # Remove from disk
             if session_file.exists():
@@ -133,9 +154,12 @@ class SessionManager:
             logger.error(f"Error deleting session {session_id}: {e}")
             raise
 
-    def list_sessions(self) -> list[dict]:
+    def list_sessions(self, tenant: str | None = None) -> list[dict]:
         """
-        List all available sessions with metadata
+        List all available sessions of a tenant with metadata
+
+        Args:
+            tenant: Tenant whose sessions are listed; the default collection when None
 
         Returns:
             List of session metadata dicts
@@ -143,7 +167,7 @@ class SessionManager:
         sessions_list = []
 
         try:
-            for session_file in self.sessions_dir.glob("*.json"):
+            for session_file in self._tenant_dir(tenant).glob("*.json"):
                 try:
                     with open(session_file, encoding="utf-8") as f:
                         session_data = json.load(f)
@@ -177,36 +201,39 @@ class SessionManager:
 
         return sessions_list
 
-    def clear_all_sessions(self):
-        """Delete all sessions from memory and disk"""
+    def clear_all_sessions(self, tenant: str | None = None):
+        """Delete all sessions of a tenant (the default collection when None) from memory and disk"""
         try:
             # Clear memory
-            self.sessions = {}
+            self.sessions = {key: value for key, value in self.sessions.items() if key[0] != tenant}
 
             # Clear disk
-            for session_file in self.sessions_dir.glob("*.json"):
+            for session_file in self._tenant_dir(tenant).glob("*.json"):
                 session_file.unlink()
 
-            logger.info("Cleared all sessions")
+            logger.info(f"Cleared all sessions of {tenant or 'the default collection'}")
         except Exception as e:
             logger.error(f"Error clearing sessions: {e}")
             raise
 
     def get_session_count(self) -> int:
-        """Get total number of stored sessions"""
-        return len(list(self.sessions_dir.glob("*.json")))
+        """Get total number of stored sessions, of all tenants"""
+        return len(list(self.sessions_dir.glob("*.json"))) + len(
+            list(self.sessions_dir.glob("*/*.json"))
+        )
 
-    def export_session(self, session_id: str) -> dict | None:
+    def export_session(self, session_id: str, tenant: str | None = None) -> dict | None:
         """
         Export a session's full data
 
         Args:
             session_id: Unique session identifier
+            tenant: Tenant the session belongs to; the default collection when None
 
         Returns:
             Full session data dict or None if not found
         """
-        session_file = self.sessions_dir / f"{session_id}.json"
+        session_file = self._session_file(session_id, tenant)
         if session_file.exists():
             try:
                 with open(session_file, encoding="utf-8") as f:
@@ -0,0 +1,265 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from document_registry import DocumentRegistry
+from lexical_index import BM25Index
+from vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Tenant ids: short, and safe in collection, directory and file names
+TENANT_ID_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,47}")
+
+
+class UnknownTenantError(LookupError):
+    """Raised when a tenant has no collection; only indexing a document creates one"""
+
+
+class CollectionLimitError(RuntimeError):
+    """Raised when a collection cannot be opened because the pool is full of unclosable ones"""
+
+
+def validate_tenant(tenant: str):
+    """Raise ValueError if a tenant id is not allowed"""
+    if not TENANT_ID_PATTERN.fullmatch(tenant):
+        raise ValueError(
+            f"Invalid tenant id: {tenant!r} (expected up to 48 letters, digits, - or _)"
+        )
+
+
+def tenant_collection_name(base_name: str, tenant: str | None) -> str:
+    """
+    Get the name of a tenant's collection
+
+    Args:
+        base_name: Name of the default collection, used when no tenant is given
+        tenant: Tenant or workspace id
+
+    Returns:
+        The collection name
+
+    Raises:
+        ValueError: If the tenant id is not allowed
+    """
+    if not tenant:
+        return base_name
+    validate_tenant(tenant)
+    return f"{base_name}_{tenant}"
+
+
+class Collection:
+    """The vector store, keyword index and document registry of one collection"""
+
+    def __init__(
+        self,
+        name: str,
+        store: VectorStore,
+        lexical_index: BM25Index | None,
+        registry: DocumentRegistry,
+        version: int,
+    ):
+        self.name = name
+        self.store = store
+        self.lexical_index = lexical_index
+        self.registry = registry
+
+        # Changed whenever documents are added or cleared, to scope cached answers
+        self.version = version
+
+        # Seconds spent opening each part
+        self.open_timings: dict[str, float] = {}
+
+        self.users = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        """Release the memory and files held by the collection"""
+        if self.lexical_index:
+            # Also stops a background build of the index
+            self.lexical_index.clear()
+        self.store.close()
+        self.registry.close()
+
+    def stats(self) -> dict:
+        stats = {"users": self.users, "idle_seconds": round(time.monotonic() - self.last_used, 1)}
+        if self.lexical_index:
+            stats["lexical_index"] = self.lexical_index.stats()
+        return stats
+
+
+class CollectionPool:
+    """
+    Open collections by name, keeping at most max_open of them in memory
+
+    Collections are opened on first use. Beyond max_open, the least recently
+    used ones are closed, and a background thread closes those idle for longer
+    than idle_seconds. Collections in use are never closed. When evictable is
+    False, as for in-memory collections that cannot be reopened, none are
+    closed, and opening more than max_open fails instead.
+    """
+
+    def __init__(
+        self,
+        open_collection: Callable[[str], Collection],
+        max_open: int = 16,
+        idle_seconds: float = 900,
+        evictable: bool = True,
+    ):
+        """
+        Initialize CollectionPool
+
+        Args:
+            open_collection: Opens a collection by name
+            max_open: Number of open collections kept
+            idle_seconds: Seconds unused before a collection is closed; 0 keeps them open
+            evictable: Whether collections can be closed and reopened later
+        """
+        self.open_collection = open_collection
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.evictable = evictable
+        self.opened = 0
+        self.evicted = 0
+        self._collections: OrderedDict[str, Collection] = OrderedDict()
+        # name -> [lock held while it is opened, number of threads waiting for it]
+        self._opening: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+        if evictable and idle_seconds > 0:
+            threading.Thread(target=self._sweep, name="collection-sweeper", daemon=True).start()
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Collection]:
+        """Open a collection, or reuse the open one, and keep it open for the with block"""
+        collection = self.acquire(name)
+        try:
+            yield collection
+        finally:
+            self.release(collection)
+
+    def acquire(self, name: str) -> Collection:
+        """
+        Open a collection, or reuse the open one, and keep it open until released
+
+        Raises:
+            CollectionLimitError: If max_open collections are open and none can be closed
+        """
+        with self._lock:
+            collection = self._use_open(name)
+            if collection:
+                return collection
+            opening = self._opening.setdefault(name, [threading.Lock(), 0])
+            opening[1] += 1
+
+        # Open each collection once, without blocking the others while it loads
+        try:
+            with opening[0]:
+                with self._lock:
+                    collection = self._use_open(name)
+                    if collection:
+                        return collection
+                    if not self.evictable and len(self._collections) >= self.max_open:
+                        raise CollectionLimitError(
+                            f"Cannot open collection {name}: {self.max_open} collections are"
+                            " open and in-memory collections are never closed"
+                        )
+
+                collection = self.open_collection(name)
+                with self._lock:
+                    self._collections[name] = collection
+                    collection.users += 1
+                    self.opened += 1
+                    evicted = self._evict(len(self._collections) - self.max_open)
+        finally:
+            with self._lock:
+                opening[1] -= 1
+                if not opening[1]:
+                    del self._opening[name]
+
+        self._close(evicted)
+        return collection
+
+    def _use_open(self, name: str) -> Collection | None:
+        """Mark an open collection used and return it, or None if closed (needs the lock)"""
+        collection = self._collections.get(name)
+        if collection:
+            self._collections.move_to_end(name)
+            collection.users += 1
+        return collection
+
+    def is_open(self, name: str) -> bool:
+        """Whether a collection is open"""
+        with self._lock:
+            return name in self._collections
+
+    def release(self, collection: Collection):
+        """Allow an acquired collection to be closed again"""
+        with self._lock:
+            collection.users -= 1
+            collection.last_used = time.monotonic()
+            # Collections opened while all others were in use may be over capacity
+            evicted = self._evict(len(self._collections) - self.max_open)
+        self._close(evicted)
+
+    def evict_idle(self) -> list[str]:
+        """Close the collections unused for longer than idle_seconds, returning their names"""
+        if self.idle_seconds <= 0:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                name
+                for name, collection in self._collections.items()
+                if now - collection.last_used > self.idle_seconds
+            ]
+            evicted = self._evict(len(idle), idle)
+        self._close(evicted)
+        return [collection.name for collection in evicted]
+
+    def _evict(self, count: int, names: list[str] | None = None) -> list[Collection]:
+        """Remove up to count unused collections, least recently used first; needs the lock"""
+        if count <= 0 or not self.evictable:
+            return []
+        evicted = []
+        for name in names or list(self._collections):
+            collection = self._collections[name]
+            if collection.users:
+                continue
+            del self._collections[name]
+            evicted.append(collection)
+            if len(evicted) == count:
+                break
+        self.evicted += len(evicted)
+        return evicted
+
+    def _close(self, collections: list[Collection]):
+        for collection in collections:
+            collection.close()
+            logger.info(f"Closed collection {collection.name}")
+
+    def _sweep(self):
+        """Close idle collections until the process exits"""
+        while True:
+            time.sleep(min(self.idle_seconds / 2, 60))
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Closing idle collections failed: {e}")
+
+    def stats(self) -> dict:
+        """Get the capacity, open and evicted counts and the state of each open collection"""
+        with self._lock:
+            return {
+                "max_open": self.max_open,
+                "idle_seconds": self.idle_seconds,
+                "opened": self.opened,
+                "evicted": self.evicted,
+                "open": {
+                    name: collection.stats() for name, collection in self._collections.items()
+                },
+            }
@@ -0,0 +1,622 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from pathlib import Path
+from typing import ClassVar
+
+import chromadb
+import numpy as np
+from chromadb.api.shared_system_client import SharedSystemClient
+from chromadb.config import Settings
+
+logger = logging.getLogger(__name__)
+
+# Vector stores selectable with the VECTOR_STORE setting
+VECTOR_STORES = ("chroma", "numpy")
+
+# Rows scored per block when searching; float16 blocks are widened into a float32
+# buffer of this many rows, small enough to stay in cache
+SEARCH_BLOCK_ROWS = 4096
+
+# Deleted rows tolerated before the numpy store compacts its files
+COMPACT_MIN_DELETED_ROWS = 1024
+
+
+class VectorStore(ABC):
+    """Storage and nearest-neighbour search over chunk embeddings"""
+
+    @abstractmethod
+    def add(
+        self, ids: list[str], embeddings: list[list[float]], texts: list[str], metadatas: list[dict]
+    ):
+        """Add chunks with their embeddings"""
+
+    @abstractmethod
+    def query(
+        self, embedding: list[float], n_results: int
+    ) -> tuple[list[str], list[str], list[dict], list[float]]:
+        """
+        Find the chunks closest to an embedding
+
+        Args:
+            embedding: Query embedding
+            n_results: Maximum number of chunks returned
+
+        Returns:
+            Tuple of chunk ids, chunk texts, chunk metadata and cosine distances, closest first
+        """
+
+    @abstractmethod
+    def fetch(self, ids: list[str]) -> tuple[list[str], list[str], list[dict]]:
+        """
+        Get chunks by id
+
+        Args:
+            ids: Chunk ids
+
+        Returns:
+            Tuple of chunk ids, chunk texts and chunk metadata of the ids that
+            are stored, in the order of the ids
+        """
+
+    @abstractmethod
+    def iter_texts(self, batch_size: int = 1000) -> Iterator[tuple[list[str], list[str]]]:
+        """Iterate over the ids and texts of all chunks, in batches"""
+
+    @abstractmethod
+    def get(
+        self, where: dict | None = None, limit: int | None = None, offset: int = 0
+    ) -> tuple[list[str], list[dict]]:
+        """
+        Get chunk ids and metadata, optionally filtered on metadata values
+
+        Args:
+            where: Metadata fields the chunks must be equal to
+            limit: Maximum number of chunks returned
+            offset: Number of matching chunks skipped
+
+        Returns:
+            Tuple of chunk ids and chunk metadata
+        """
+
+    @abstractmethod
+    def delete(self, ids: list[str]):
+        """Remove chunks by id"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Get the number of chunks stored"""
+
+    @abstractmethod
+    def clear(self):
+        """Remove all chunks"""
+
+    @abstractmethod
+    def close(self):
+        """Release the memory held for the index; the store is not used afterwards"""
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    Vector store backed by a ChromaDB collection
+
+    All clients of a directory share one ChromaDB system, which keeps the
+    indexes it has loaded until it is stopped, so closing the last store of
+    a persistent directory stops its system.
+    """
+
+    # Directory -> number of open stores in it, guarded by _directories_lock
+    _directories: ClassVar[dict[str, int]] = {}
+    _directories_lock = threading.Lock()
+
+    def __init__(self, collection_name: str = "documents", persist_directory: str | None = None):
+        """
+        Initialize ChromaVectorStore
+
+        Args:
+            collection_name: Name of the collection
+            persist_directory: Directory of a persistent ChromaDB; in memory when None
+        """
+        settings = Settings(anonymized_telemetry=False, allow_reset=True)
+        self.persist_directory = persist_directory
+        if persist_directory:
+            # Counted with the client created, so a closing store cannot stop its system
+            with self._directories_lock:
+                self.client = chromadb.PersistentClient(path=persist_directory, settings=settings)
+                self._directories[persist_directory] = (
+                    self._directories.get(persist_directory, 0) + 1
+                )
+        else:
+            self.client = chromadb.Client(settings)
+
+        # Get or create collection, reopening the existing index of a persistent store
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name, metadata={"hnsw:space": "cosine"}
+        )
+
+    def add(self, ids, embeddings, texts, metadatas):
+        self.collection.add(embeddings=embeddings, documents=texts, metadatas=metadatas, ids=ids)
+
+    def query(self, embedding, n_results):
+        results = self.collection.query(query_embeddings=[embedding], n_results=n_results)
+        if not results["documents"] or not results["documents"][0]:
+            return [], [], [], []
+        return (
+            results["ids"][0],
+            results["documents"][0],
+            results["metadatas"][0],
+            results["distances"][0],
+        )
+
+    def fetch(self, ids):
+        results = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        found = {
+            chunk_id: (text, metadata)
+            for chunk_id, text, metadata in zip(
+                results["ids"], results["documents"], results["metadatas"], strict=True
+            )
+        }
+        ids = [chunk_id for chunk_id in ids if chunk_id in found]
+        return (
+            ids,
+            [found[chunk_id][0] for chunk_id in ids],
+            [found[chunk_id][1] for chunk_id in ids],
+        )
+
+    def iter_texts(self, batch_size=1000):
+        # Page by id, as every page read by offset rescans the rows before it
+        ids = self.collection.get(include=[])["ids"]
+        for start in range(0, len(ids), batch_size):
+            results = self.collection.get(
+                ids=ids[start : start + batch_size], include=["documents"]
+            )
+            if results["ids"]:
+                yield results["ids"], results["documents"]
+
+    def get(self, where=None, limit=None, offset=0):
+        results = self.collection.get(
+            where=where, include=["metadatas"], limit=limit, offset=offset or None
+        )
+        return results["ids"], results["metadatas"] or []
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def count(self):
+        return self.collection.count()
+
+    def clear(self):
+        name = self.collection.name
+        self.client.delete_collection(name)
+        self.collection = self.client.get_or_create_collection(
+            name=name, metadata={"hnsw:space": "cosine"}
+        )
+
+    def close(self):
+        client, self.client, self.collection = self.client, None, None
+        if client is None or not self.persist_directory:
+            return
+
+        # The Rust bindings ignore the segment cache settings (chroma_segment_cache_policy,
+        # chroma_memory_limit_bytes), so stopping the system is what unloads the indexes
+        with self._directories_lock:
+            users = self._directories.pop(self.persist_directory) - 1
+            if users:
+                self._directories[self.persist_directory] = users
+                return
+            system = SharedSystemClient._identifier_to_system.pop(client._identifier, None)
+            if system is not None:
+                system.stop()
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process exact search over a memory-mapped matrix of normalized embeddings
+
+    The directory holds three files:
+    - embeddings.bin: the embeddings as raw float16 or float32 rows, appended
+      to as documents are added and memory-mapped read-only, so processes
+      serving the same directory share its pages
+    - records.jsonl: one line per added chunk (id, text, metadata) or per
+      deletion, replayed at startup; texts are read back only for results
+    - meta.json: dtype and dimensions of the matrix, and the generation of
+      the other two files
+
+    Top-k is a blocked matrix-vector product followed by argpartition, run
+    outside the lock on a snapshot of the rows. Deleted rows are masked until
+    more than half of the rows are dead, then both files are compacted into a
+    new generation (embeddings.N.bin and records.N.jsonl), which replacing
+    meta.json switches to at once. Other processes pick up appends, deletions
+    and compactions on their next call. Only one process may write to a
+    directory at a time.
+    """
+
+    def __init__(self, directory: str | None = None, dtype: str = "float32"):
+        """
+        Initialize NumpyVectorStore, reopening the index in the directory if there is one
+
+        Args:
+            directory: Directory of the index; a temporary one when None
+            dtype: "float32", or "float16" to halve the memory of the matrix
+
+        Raises:
+            ValueError: If the directory holds an index of a different dtype
+        """
+        if directory is None:
+            self._temp_dir = tempfile.TemporaryDirectory(prefix="vector-store-")
+            directory = self._temp_dir.name
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        self.dimensions: int | None = None
+
+        self._meta_path = self.directory / "meta.json"
+        self._meta_stat = None  # identity of the meta.json last read
+        self._file_generation = 0  # generation of the files in use
+        self._lock = threading.RLock()
+        self._records_handle = None
+        self._embeddings_handle = None
+        self._search_buffers = threading.local()  # float32 widening buffers for float16 blocks
+        self._generation = 0
+
+        self._reset()
+        self._refresh()
+
+    def _paths(self, generation: int) -> tuple[Path, Path]:
+        """Get the embeddings and records files of a generation"""
+        if not generation:
+            return self.directory / "embeddings.bin", self.directory / "records.jsonl"
+        return (
+            self.directory / f"embeddings.{generation}.bin",
+            self.directory / f"records.{generation}.jsonl",
+        )
+
+    @property
+    def _embeddings_path(self) -> Path:
+        return self._paths(self._file_generation)[0]
+
+    @property
+    def _records_path(self) -> Path:
+        return self._paths(self._file_generation)[1]
+
+    def _reset(self):
+        """Forget the loaded state so the next refresh replays the files from the start"""
+        for handle in (self._records_handle, self._embeddings_handle):
+            if handle:
+                handle.close()
+        # Kept open so rows stay readable after another process replaces the files
+        self._records_handle = None
+        self._embeddings_handle = None
+        self._generation += 1  # rows are renumbered from here on
+        self._records_read = 0
+        self._ids: list[str] = []
+        self._metadatas: list[dict] = []
+        self._offsets: list[int] = []  # byte offset of each row's record line
+        self._alive = bytearray()
+        self._rows: dict[str, int] = {}  # id -> row of live chunks
+        self._doc_rows: dict[str, list[int]] = {}  # doc_id -> rows, so deletes skip the scan
+        self._matrix = np.empty((0, self.dimensions or 0), dtype=self.dtype)
+
+    def _read_meta(self):
+        """Load meta.json if it was replaced, switching to its generation of the files"""
+        try:
+            stat = self._meta_path.stat()
+        except FileNotFoundError:
+            return
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self._meta_stat:
+            return
+
+        meta = json.loads(self._meta_path.read_text())
+        if np.dtype(meta["dtype"]) != self.dtype:
+            raise ValueError(
+                f"Vector index in {self.directory} stores {meta['dtype']}, not {self.dtype}"
+            )
+        self.dimensions = meta["dimensions"]
+        self._meta_stat = identity
+        if meta.get("generation", 0) != self._file_generation:
+            self._reset()
+            self._file_generation = meta.get("generation", 0)
+
+    def _refresh(self):
+        """Apply records appended since the last call, by this or another process"""
+        self._read_meta()
+
+        if self._records_handle is None:
+            try:
+                records_handle = open(self._records_path, "rb")  # noqa: SIM115
+            except FileNotFoundError:
+                return
+            try:
+                embeddings_handle = open(self._embeddings_path, "rb")  # noqa: SIM115
+            except FileNotFoundError:
+                # Another process compacted the files since meta.json was read
+                records_handle.close()
+                return
+            self._records_handle = records_handle
+            self._embeddings_handle = embeddings_handle
+
+        size = os.fstat(self._records_handle.fileno()).st_size
+        if size == self._records_read:
+            return
+
+        self._records_handle.seek(self._records_read)
+        data = self._records_handle.read()
+
+        # Skip a trailing line that is still being written
+        position = self._records_read
+        for line in data[: data.rfind(b"\n") + 1].splitlines(keepends=True):
+            record = json.loads(line)
+            if "delete" in record:
+                for chunk_id in record["delete"]:
+                    row = self._rows.pop(chunk_id, None)
+                    if row is not None:
+                        self._alive[row] = 0
+            else:
+                self._rows[record["id"]] = len(self._ids)
+                self._doc_rows.setdefault(record["metadata"].get("doc_id"), []).append(
+                    len(self._ids)
+                )
+                self._ids.append(record["id"])
+                self._metadatas.append(record["metadata"])
+                self._offsets.append(position)
+                self._alive.append(1)
+            position += len(line)
+        self._records_read = position
+
+        if len(self._ids) != len(self._matrix):
+            self._matrix = np.memmap(
+                self._embeddings_handle,
+                dtype=self.dtype,
+                mode="r",
+                shape=(len(self._ids), self.dimensions),
+            )
+
+    def _write_meta(self):
+        """Atomically replace meta.json, switching readers to the current generation"""
+        temp_path = self._meta_path.with_suffix(".json.tmp")
+        temp_path.write_text(
+            json.dumps(
+                {
+                    "dtype": self.dtype.name,
+                    "dimensions": self.dimensions,
+                    "generation": self._file_generation,
+                }
+            )
+        )
+        os.replace(temp_path, self._meta_path)
+
+    def add(self, ids, embeddings, texts, metadatas):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            self._refresh()
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                self._write_meta()
+
+            # Rows are written before their records; drop rows left by an interrupted add
+            row_bytes = self.dimensions * self.dtype.itemsize
+            if (
+                self._embeddings_path.exists()
+                and self._embeddings_path.stat().st_size > len(self._ids) * row_bytes
+            ):
+                os.truncate(self._embeddings_path, len(self._ids) * row_bytes)
+
+            with open(self._embeddings_path, "ab") as f:
+                f.write(vectors.astype(self.dtype).tobytes())
+            with open(self._records_path, "a", encoding="utf-8") as f:
+                f.writelines(
+                    json.dumps({"id": chunk_id, "text": text, "metadata": metadata}) + "\n"
+                    for chunk_id, text, metadata in zip(ids, texts, metadatas, strict=True)
+                )
+            self._refresh()
+
+    def query(self, embedding, n_results):
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        while True:
+            with self._lock:
+                self._refresh()
+                n_results = min(n_results, len(self._rows))
+                if n_results <= 0:
+                    return [], [], [], []
+                # Rows are only appended until the next reset, so a snapshot stays valid
+                generation = self._generation
+                matrix = self._matrix
+                alive = np.frombuffer(self._alive, dtype=bool).copy()
+                ids, metadatas = self._ids, self._metadatas
+
+            scores = self._score(matrix, query)
+            scores[~alive] = -np.inf
+            top = np.argpartition(-scores, n_results - 1)[:n_results]
+            top = top[np.argsort(-scores[top])]
+
+            with self._lock:
+                # The records handle moved on to a compacted or cleared file; search again
+                if self._generation != generation:
+                    continue
+                texts = [self._read_record(row)["text"] for row in top]
+            return (
+                [ids[row] for row in top],
+                texts,
+                [metadatas[row] for row in top],
+                (1 - scores[top]).tolist(),
+            )
+
+    def _score(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Get the dot product of each row with the query, block by block"""
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+            block = matrix[start : start + SEARCH_BLOCK_ROWS]
+            if block.dtype != np.float32:
+                buffer = getattr(self._search_buffers, "buffer", None)
+                if buffer is None or buffer.shape[1] != matrix.shape[1]:
+                    buffer = np.empty((SEARCH_BLOCK_ROWS, matrix.shape[1]), dtype=np.float32)
+                    self._search_buffers.buffer = buffer
+                np.copyto(buffer[: len(block)], block)
+                block = buffer[: len(block)]
+            np.matmul(block, query, out=scores[start : start + len(block)])
+        return scores
+
+    def fetch(self, ids):
+        with self._lock:
+            self._refresh()
+            ids = [chunk_id for chunk_id in ids if chunk_id in self._rows]
+            rows = [self._rows[chunk_id] for chunk_id in ids]
+            texts = [self._read_record(row)["text"] for row in rows]
+            return ids, texts, [self._metadatas[row] for row in rows]
+
+    def iter_texts(self, batch_size=1000):
+        row = 0
+        generation = self._generation
+        seen: set[str] = set()
+        while True:
+            with self._lock:
+                self._refresh()
+                # A compaction renumbered the rows; start over, skipping chunks already returned
+                if self._generation != generation:
+                    row, generation = 0, self._generation
+                ids, texts = [], []
+                while row < len(self._ids) and len(ids) < batch_size:
+                    chunk_id = self._ids[row]
+                    if self._alive[row] and chunk_id not in seen:
+                        ids.append(chunk_id)
+                        texts.append(self._read_record(row)["text"])
+                    row += 1
+            if not ids:
+                return
+            seen.update(ids)
+            yield ids, texts
+
+    def _read_record(self, row: int) -> dict:
+        """Read a row's record line back (caller holds the lock)"""
+        self._records_handle.seek(self._offsets[row])
+        return json.loads(self._records_handle.readline())
+
+    def get(self, where=None, limit=None, offset=0):
+        with self._lock:
+            self._refresh()
+            ids, metadatas = [], []
+            skipped = 0
+            rows = range(len(self._metadatas))
+            if where and "doc_id" in where:
+                rows = self._doc_rows.get(where["doc_id"], [])
+            for row in rows:
+                metadata = self._metadatas[row]
+                if not self._alive[row] or (
+                    where and any(metadata.get(key) != value for key, value in where.items())
+                ):
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if limit is not None and len(ids) >= limit:
+                    break
+                ids.append(self._ids[row])
+                metadatas.append(metadata)
+            return ids, metadatas
+
+    def delete(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            with open(self._records_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"delete": list(ids)}) + "\n")
+            self._refresh()
+            if len(self._ids) - len(self._rows) > max(len(self._rows), COMPACT_MIN_DELETED_ROWS):
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the files without deleted rows (caller holds the lock)"""
+        live = [row for row in range(len(self._ids)) if self._alive[row]]
+        logger.info(f"Compacting vector index from {len(self._ids)} to {len(live)} rows")
+
+        def write(embeddings, records):
+            for start in range(0, len(live), SEARCH_BLOCK_ROWS):
+                embeddings.write(
+                    np.ascontiguousarray(self._matrix[live[start : start + SEARCH_BLOCK_ROWS]])
+                )
+            for row in live:
+                self._records_handle.seek(self._offsets[row])
+                records.write(self._records_handle.readline())
+
+        self._switch_generation(write)
+
+    def _switch_generation(self, write):
+        """
+        Write the next generation of the files and switch to it (caller holds the lock)
+
+        Readers in other processes keep the files of the previous generation
+        open, so removing them does not disturb searches already running.
+
+        Args:
+            write: Writes the contents of the new files to their binary handles
+        """
+        old_paths = self._paths(self._file_generation)
+        new_paths = self._paths(self._file_generation + 1)
+        with open(new_paths[0], "wb") as embeddings, open(new_paths[1], "wb") as records:
+            write(embeddings, records)
+
+        self._reset()
+        self._file_generation += 1
+        self._write_meta()
+        for path in old_paths:
+            path.unlink(missing_ok=True)
+        self._refresh()
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def clear(self):
+        with self._lock:
+            self._refresh()
+            self._switch_generation(lambda embeddings, records: None)
+
+    def close(self):
+        with self._lock:
+            self._reset()
+            self._search_buffers = threading.local()
+
+
+def create_vector_store(
+    kind: str = "chroma",
+    collection_name: str = "documents",
+    persist_directory: str | None = None,
+    dtype: str = "float32",
+    own_directory: bool = False,
+) -> VectorStore:
+    """
+    Create the configured vector store
+
+    Args:
+        kind: "chroma" or "numpy"
+        collection_name: Name of the collection (a subdirectory for the numpy store)
+        persist_directory: Directory the index is kept in; in memory or temporary when None
+        dtype: Matrix dtype of the numpy store, "float32" or "float16"
+        own_directory: Keep a chroma collection in a subdirectory named after it, so
+            closing it unloads its index (numpy collections always have one)
+
+    Returns:
+        The vector store
+
+    Raises:
+        ValueError: If the kind is unknown
+    """
+    if kind == "chroma":
+        if own_directory and persist_directory:
+            persist_directory = os.path.join(persist_directory, collection_name)
+        return ChromaVectorStore(collection_name, persist_directory)
+    if kind == "numpy":
+        directory = os.path.join(persist_directory, collection_name) if persist_directory else None
+        return NumpyVectorStore(directory, dtype)
+    raise ValueError(f"Unknown vector store: {kind} (expected one of {VECTOR_STORES})")
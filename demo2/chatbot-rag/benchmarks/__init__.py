@@ -0,0 +1,11 @@
+# Benchmark package initialization
+#
+# The backend modules import each other by bare name (they are run from the
+# backend directory), so make them importable when running
+# `python -m benchmarks.<name>` from the project root.
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
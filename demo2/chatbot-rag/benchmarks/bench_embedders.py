@@ -0,0 +1,154 @@
+"""
+Compare embedding backends: cosine parity with PyTorch and encode throughput
+
+Encodes the same synthetic chunks and queries with the baseline (PyTorch)
+model and each candidate backend. Reports the cosine similarity between the
+two embeddings of every text, the share of the baseline's top-10 search
+results each backend reproduces, chunk throughput at the ingestion batch size
+and single-query latency. Exits with status 1 when a backend's minimum cosine
+falls below --min-cosine, so the check can gate a change of EMBEDDING_BACKEND.
+
+Usage (from the project root):
+    python -m benchmarks.bench_embedders --backends onnx onnx-int8
+    python -m benchmarks.bench_embedders --chunks 2000 --output embedders.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import numpy as np
+from rag_engine import EMBED_BATCH_SIZE
+
+from benchmarks.stubs import EMBEDDER_CHOICES, load_benchmark_embedder
+from benchmarks.synthetic import sentences
+
+TOP_K = 10
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def top_k(queries: np.ndarray, chunks: np.ndarray, k: int = TOP_K) -> list[set[int]]:
+    """Indices of the k chunks most similar to each query"""
+    scores = queries @ chunks.T
+    return [set(row) for row in np.argpartition(-scores, k, axis=1)[:, :k]]
+
+
+def bench_backend(name: str, chunks: list[str], queries: list[str], repeat: int) -> tuple:
+    """Load a backend, time it and return its metrics with its chunk and query embeddings"""
+    start = time.perf_counter()
+    embedder = load_benchmark_embedder(name)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up before timing
+    embedder.encode(chunks[:EMBED_BATCH_SIZE], batch_size=EMBED_BATCH_SIZE)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunk_embeddings = embedder.encode(chunks, batch_size=EMBED_BATCH_SIZE)
+        best = min(best, time.perf_counter() - start)
+
+    latencies = []
+    query_embeddings = []
+    for query in queries:
+        start = time.perf_counter()
+        query_embeddings.append(embedder.encode([query])[0])
+        latencies.append(time.perf_counter() - start)
+
+    metrics = {
+        "load_seconds": round(load_seconds, 2),
+        "chunks_per_s": round(len(chunks) / best, 1),
+        "query_p50_ms": round(statistics.median(latencies) * 1000, 2),
+    }
+    return metrics, normalize(chunk_embeddings), normalize(np.stack(query_embeddings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--baseline", choices=EMBEDDER_CHOICES, default="torch")
+    parser.add_argument(
+        "--backends", nargs="+", choices=EMBEDDER_CHOICES, default=["onnx", "onnx-int8"]
+    )
+    parser.add_argument("--chunks", type=int, default=1000, help="Synthetic chunks encoded")
+    parser.add_argument("--queries", type=int, default=200, help="Synthetic queries encoded")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Parity threshold")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    # Chunks of varying length, up to and beyond the model's input limit
+    rng = random.Random(args.seed)
+    chunks = [" ".join(sentences(rng, rng.randint(2, 24))) for _ in range(args.chunks)]
+    queries = sentences(rng, args.queries)
+
+    baseline, base_chunks, base_queries = bench_backend(args.baseline, chunks, queries, args.repeat)
+    base_top = top_k(base_queries, base_chunks)
+    results = {args.baseline: baseline}
+
+    for name in args.backends:
+        metrics, chunk_embeddings, query_embeddings = bench_backend(
+            name, chunks, queries, args.repeat
+        )
+        cosines = np.concatenate(
+            [
+                np.sum(chunk_embeddings * base_chunks, axis=1),
+                np.sum(query_embeddings * base_queries, axis=1),
+            ]
+        )
+        overlap = [
+            len(found & expected) / TOP_K
+            for found, expected in zip(
+                top_k(query_embeddings, chunk_embeddings), base_top, strict=True
+            )
+        ]
+        metrics.update(
+            mean_cosine=round(float(cosines.mean()), 5),
+            min_cosine=round(float(cosines.min()), 5),
+            recall_at_10=round(statistics.mean(overlap), 4),
+            speedup=round(metrics["chunks_per_s"] / baseline["chunks_per_s"], 2),
+            parity=bool(cosines.min() >= args.min_cosine),
+        )
+        results[name] = metrics
+
+    print(
+        f"{'backend':<10} {'load s':>7} {'chunks/s':>9} {'speedup':>8} {'query ms':>9}"
+        f" {'mean cos':>9} {'min cos':>8} {'recall@10':>10}"
+    )
+    for name, metrics in results.items():
+        print(
+            f"{name:<10} {metrics['load_seconds']:>7.2f} {metrics['chunks_per_s']:>9.1f}"
+            f" {metrics.get('speedup', 1.0):>7.2f}x {metrics['query_p50_ms']:>9.2f}"
+            f" {metrics.get('mean_cosine', 1.0):>9.5f} {metrics.get('min_cosine', 1.0):>8.5f}"
+            f" {metrics.get('recall_at_10', 1.0):>10.4f}"
+        )
+
+    if args.output:
+        config = {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in vars(args).items()
+        }
+        args.output.write_text(json.dumps({"config": config, "results": results}, indent=2))
+        print(f"Results written to {args.output}")
+
+    failed = [name for name in args.backends if not results[name]["parity"]]
+    if failed:
+        print(f"Parity check failed (min cosine < {args.min_cosine}): {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark Excel extraction time and memory: full workbook load vs. read-only streaming
+
+Each run happens in a fresh process so peak RSS measurements don't leak
+between modes.
+
+Usage (from the project root):
+    python -m benchmarks.bench_excel_extraction --rows 200000
+    python -m benchmarks.bench_excel_extraction --xlsx path/to/export.xlsx
+"""
+
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import openpyxl
+from document_processor import DocumentProcessor
+
+from benchmarks.synthetic import write_xlsx
+
+
+def extract_full(file_path: Path) -> str:
+    """The previous implementation: full workbook load and string concatenation"""
+    workbook = openpyxl.load_workbook(file_path)
+    text = ""
+    for sheet in workbook.worksheets:
+        for row in sheet.iter_rows(values_only=True):
+            text += " ".join([str(cell) for cell in row if cell is not None]) + "\n"
+    return text
+
+
+def extract_streaming(file_path: Path) -> str:
+    """The current implementation: read-only row streaming"""
+    return "".join(DocumentProcessor()._extract_from_excel(file_path))
+
+
+def extract_chunks(file_path: Path) -> int:
+    """Read-only streaming straight into the chunker, as /upload does"""
+    chunks = DocumentProcessor().process_document(str(file_path), stream=True)
+    return sum(1 for _ in chunks)
+
+
+MODES = {
+    "full load": extract_full,
+    "read-only": extract_streaming,
+    "read-only + chunks": extract_chunks,
+}
+
+
+def run_mode(mode: str, file_path: Path, results):
+    """Run one mode and report elapsed time and RSS growth (runs in a child process)"""
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    output = MODES[mode](file_path)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = len(output) if isinstance(output, str) else output
+    results.put((elapsed, (peak_kb - baseline_kb) / 1024, size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--xlsx", type=Path, help="Workbook to benchmark (default: synthetic)")
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows in the synthetic sheet")
+    parser.add_argument("--columns", type=int, default=8)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = args.xlsx
+        if file_path is None:
+            file_path = write_xlsx(Path(tmp_dir) / "synthetic.xlsx", args.rows, args.columns)
+        print(f"{file_path.name}: {file_path.stat().st_size / 1024 / 1024:.1f} MB on disk")
+        print(f"{'mode':<20} {'seconds':>9} {'peak RSS +MB':>13} {'output':>14}")
+
+        for mode in MODES:
+            results = context.Queue()
+            process = context.Process(target=run_mode, args=(mode, file_path, results))
+            process.start()
+            elapsed, peak_mb, size = results.get()
+            process.join()
+            unit = "chunks" if mode.endswith("chunks") else "chars"
+            print(f"{mode:<20} {elapsed:>9.2f} {peak_mb:>13.1f} {size:>8,} {unit}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Ingestion throughput benchmark: extraction, chunking, embedding and vector insertion
+
+Generates a synthetic corpus of PDF, DOCX, XLSX, PPTX, TXT and MD files, then
+times each ingestion stage separately per format and writes the results as
+JSON so runs can be compared over time. Everything runs offline on the CPU:
+the real embedding model must already be in the local Hugging Face cache, or
+use --embedder hashing for a download-free stand-in.
+
+Usage (from the project root):
+    python -m benchmarks.bench_ingestion --files 5 --pages 20 --output results.json
+    python -m benchmarks.bench_ingestion --formats pdf txt --embedder hashing
+    python -m benchmarks.bench_ingestion --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Keep Hugging Face from reaching the network, the model must come from the cache
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+from document_processor import DocumentProcessor
+from rag_engine import build_chunk_record
+from vector_store import VECTOR_STORES, VectorStore, create_vector_store
+
+from benchmarks.stubs import EMBEDDER_CHOICES, load_benchmark_embedder
+from benchmarks.synthetic import FORMATS, generate_corpus
+
+STAGES = ["extraction", "chunking", "embedding", "insertion"]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def bench_format(
+    files: list[tuple[Path, str, int]],
+    processor: DocumentProcessor,
+    embedder,
+    store: VectorStore,
+    batch_size: int,
+) -> dict:
+    """Run every ingestion stage over the files of one format and collect metrics"""
+    seconds = dict.fromkeys(STAGES, 0.0)
+    rss_after = {}
+    characters = 0
+    chunk_count = 0
+
+    for path, _, _ in files:
+        # Extraction: read the document into text segments
+        start = time.perf_counter()
+        segments = list(processor._iter_segments(path))
+        seconds["extraction"] += time.perf_counter() - start
+        characters += sum(len(segment) for segment in segments)
+        rss_after["extraction"] = peak_rss_mb()
+
+        # Chunking: normalize and split the segments
+        start = time.perf_counter()
+        chunks = list(processor._iter_chunks(segments))
+        seconds["chunking"] += time.perf_counter() - start
+        chunk_count += len(chunks)
+        rss_after["chunking"] = peak_rss_mb()
+
+        # Embedding and insertion, batch by batch like RAGEngine.add_document_stream
+        doc_id = path.stem
+        for first in range(0, len(chunks), batch_size):
+            records = [
+                build_chunk_record(doc_id, path.name, i, chunk, "benchmark")
+                for i, chunk in enumerate(chunks[first : first + batch_size], start=first)
+            ]
+            ids, texts, metadatas = (list(column) for column in zip(*records, strict=True))
+
+            start = time.perf_counter()
+            embeddings = embedder.encode(texts).tolist()
+            seconds["embedding"] += time.perf_counter() - start
+            rss_after["embedding"] = peak_rss_mb()
+
+            start = time.perf_counter()
+            store.add(ids, embeddings, texts, metadatas)
+            seconds["insertion"] += time.perf_counter() - start
+            rss_after["insertion"] = peak_rss_mb()
+
+    pages = sum(file_pages for _, _, file_pages in files)
+    return {
+        "files": len(files),
+        "pages": pages,
+        "characters": characters,
+        "chunks": chunk_count,
+        "seconds": {stage: round(value, 4) for stage, value in seconds.items()},
+        "throughput": {
+            "extraction_pages_per_s": _rate(pages, seconds["extraction"]),
+            "extraction_mb_per_s": _rate(characters / 1e6, seconds["extraction"]),
+            "chunking_chunks_per_s": _rate(chunk_count, seconds["chunking"]),
+            "embedding_chunks_per_s": _rate(chunk_count, seconds["embedding"]),
+            "insertion_chunks_per_s": _rate(chunk_count, seconds["insertion"]),
+            "end_to_end_pages_per_s": _rate(pages, sum(seconds.values())),
+        },
+        "peak_rss_mb_after": {stage: round(value, 1) for stage, value in rss_after.items()},
+    }
+
+
+def _rate(amount: float, seconds: float) -> float | None:
+    return round(amount / seconds, 2) if seconds > 0 else None
+
+
+def git_commit() -> str | None:
+    """Commit of the working tree, to label results"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    """Generate the corpus, run the benchmark and return the results"""
+    embedder = load_benchmark_embedder(args.embedder)
+    processor_options = {"pdf_workers": args.pdf_workers}
+    if args.chunk_by == "tokens":
+        if embedder.tokenizer is None:
+            raise SystemExit("--chunk-by tokens needs the real embedder's tokenizer")
+        processor_options.update(tokenizer=embedder.tokenizer, max_tokens=embedder.max_seq_length)
+    processor = DocumentProcessor(**processor_options)
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "files_per_format": args.files,
+            "pages_per_file": args.pages,
+            "embedder": args.embedder,
+            "chunk_by": args.chunk_by,
+            "batch_size": args.batch_size,
+            "pdf_workers": args.pdf_workers,
+            "vector_store": args.vector_store,
+            "vector_dtype": args.vector_dtype,
+            "seed": args.seed,
+        },
+        "formats": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        corpus = generate_corpus(Path(tmp_dir), args.formats, args.files, args.pages, args.seed)
+        results["corpus_generation_seconds"] = round(time.perf_counter() - start, 2)
+
+        for fmt in args.formats:
+            files = [entry for entry in corpus if entry[1] == fmt]
+            store = create_vector_store(
+                args.vector_store, f"benchmark_{fmt}", dtype=args.vector_dtype
+            )
+            results["formats"][fmt] = bench_format(
+                files, processor, embedder, store, args.batch_size
+            )
+            store.clear()
+
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return results
+
+
+def print_results(results: dict):
+    """Print a per-format summary table"""
+    print(f"{'format':<6} {'pages':>6} {'chunks':>7} ", end="")
+    print(" ".join(f"{stage + ' s':>13}" for stage in STAGES), end="")
+    print(f" {'pages/s':>9} {'chunks/s emb':>13}")
+    for fmt, metrics in results["formats"].items():
+        print(f"{fmt:<6} {metrics['pages']:>6} {metrics['chunks']:>7} ", end="")
+        print(" ".join(f"{metrics['seconds'][stage]:>13.3f}" for stage in STAGES), end="")
+        throughput = metrics["throughput"]
+        print(
+            f" {throughput['end_to_end_pages_per_s'] or 0:>9.1f}"
+            f" {throughput['embedding_chunks_per_s'] or 0:>13.1f}"
+        )
+    print(f"peak RSS: {results['peak_rss_mb']} MB")
+
+
+def compare(old_path: Path, new_path: Path):
+    """Print the per-stage time change between two result files"""
+    old = json.loads(old_path.read_text())
+    new = json.loads(new_path.read_text())
+    print(f"{old_path.name} ({old['commit']}) -> {new_path.name} ({new['commit']})")
+    for fmt in sorted(set(old["formats"]) & set(new["formats"])):
+        changes = []
+        for stage in STAGES:
+            before = old["formats"][fmt]["seconds"][stage]
+            after = new["formats"][fmt]["seconds"][stage]
+            change = (after - before) / before * 100 if before else 0.0
+            changes.append(f"{stage} {change:+.1f}%")
+        print(f"{fmt:<6} " + ", ".join(changes))
+    print(f"peak RSS {old['peak_rss_mb']} MB -> {new['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--files", type=int, default=3, help="Documents per format")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per document")
+    parser.add_argument("--embedder", choices=EMBEDDER_CHOICES, default="torch")
+    parser.add_argument("--chunk-by", choices=["tokens", "chars"], default="chars")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding batch")
+    parser.add_argument("--pdf-workers", type=int, default=1)
+    parser.add_argument("--vector-store", choices=VECTOR_STORES, default="chroma")
+    parser.add_argument("--vector-dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument(
+        "--compare", nargs=2, type=Path, metavar=("OLD", "NEW"), help="Compare two result files"
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run(args)
+    print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
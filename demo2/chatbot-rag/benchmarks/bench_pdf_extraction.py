@@ -0,0 +1,60 @@
+"""
+Benchmark serial vs. process-pool PDF text extraction
+
+Usage (from the project root):
+    python -m benchmarks.bench_pdf_extraction --pages 500 --workers 1 2 4
+    python -m benchmarks.bench_pdf_extraction --pdf path/to/large.pdf
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from document_processor import DocumentProcessor
+
+from benchmarks.synthetic import write_pdf
+
+
+def time_extraction(processor: DocumentProcessor, pdf_path: Path, repeat: int) -> tuple[float, str]:
+    """Return the best extraction time over repeat runs and the extracted text"""
+    best = float("inf")
+    text = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = "".join(processor._extract_from_pdf(pdf_path))
+        best = min(best, time.perf_counter() - start)
+    return best, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdf", type=Path, help="PDF to benchmark (default: synthetic)")
+    parser.add_argument("--pages", type=int, default=500, help="Pages in the synthetic PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = args.pdf or write_pdf(Path(tmp_dir) / "synthetic.pdf", args.pages)
+
+        serial_time, serial_text = time_extraction(
+            DocumentProcessor(pdf_workers=1), pdf_path, args.repeat
+        )
+        print(f"{pdf_path.name}: {len(serial_text):,} characters")
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+        print(f"{1:>8} {serial_time:>9.3f} {1.0:>7.2f}x")
+
+        for workers in sorted(set(args.workers) - {1}):
+            processor = DocumentProcessor(pdf_workers=workers, parallel_pdf_min_pages=1)
+            try:
+                parallel_time, parallel_text = time_extraction(processor, pdf_path, args.repeat)
+            finally:
+                processor.close()
+            assert parallel_text == serial_text, "parallel extraction changed the text"
+            print(f"{workers:>8} {parallel_time:>9.3f} {serial_time / parallel_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark per-request vs. micro-batched query embedding under concurrent load
+
+Each concurrency level runs the same set of unique queries from that many
+threads, once calling the embedder per request as a /chat handler used to,
+and once through the EmbeddingBatcher that RAGEngine now uses. Reports
+p50/p99 latency and queries/s for both paths.
+
+Usage (from the project root):
+    python -m benchmarks.bench_query_batching --concurrency 1 8 32 --requests 1000
+    python -m benchmarks.bench_query_batching --embedder hashing --row-latency-ms 1
+
+The hashing embedder only models the cost of a forward pass, so its numbers
+depend on the costs given; run with the real embedder to measure the gain.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+from embedding_batcher import EmbeddingBatcher
+
+from benchmarks.stubs import EMBEDDER_CHOICES, load_benchmark_embedder
+from benchmarks.synthetic import sentences
+
+
+def run_load(embed: Callable[[str], list[float]], queries: list[str], concurrency: int) -> dict:
+    """Embed every query from concurrency threads and collect latency and throughput"""
+
+    def timed(query: str) -> float:
+        start = time.perf_counter()
+        embed(query)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(timed, queries))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000, 2),
+        "qps": round(len(queries) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=512, help="Queries per run")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batcher max batch size")
+    parser.add_argument("--wait-ms", type=float, default=2.0, help="Batcher max wait")
+    parser.add_argument("--embedder", choices=EMBEDDER_CHOICES, default="torch")
+    parser.add_argument(
+        "--call-latency-ms",
+        type=float,
+        default=5.0,
+        help="Simulated fixed cost per call of the hashing embedder",
+    )
+    parser.add_argument(
+        "--row-latency-ms",
+        type=float,
+        default=1.0,
+        help="Simulated cost per query embedded by the hashing embedder",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    embedder = load_benchmark_embedder(args.embedder, args.call_latency_ms, args.row_latency_ms)
+    batcher = EmbeddingBatcher(
+        lambda texts: embedder.encode(texts, batch_size=len(texts)),
+        max_batch_size=args.batch_size,
+        max_wait_ms=args.wait_ms,
+    )
+
+    # Unique questions, so neither path benefits from a cache
+    rng = random.Random(args.seed)
+    queries = [f"{i} {sentences(rng, 1)[0]}" for i in range(args.requests)]
+
+    # Warm up both paths before timing
+    embedder.encode(queries[:8])
+    batcher.encode(queries[0])
+
+    results = []
+    print(f"{'threads':>7} {'path':>10} {'p50 ms':>8} {'p99 ms':>8} {'qps':>8}")
+    for concurrency in args.concurrency:
+        for path, embed in [
+            ("direct", lambda query: embedder.encode([query])[0].tolist()),
+            ("batched", batcher.encode),
+        ]:
+            metrics = run_load(embed, queries, concurrency)
+            results.append({"concurrency": concurrency, "path": path, **metrics})
+            print(
+                f"{concurrency:>7} {path:>10} {metrics['p50_ms']:>8.2f}"
+                f" {metrics['p99_ms']:>8.2f} {metrics['qps']:>8.1f}"
+            )
+    print(f"batcher: {batcher.stats()}")
+
+    if args.output:
+        config = {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in vars(args).items()
+        }
+        args.output.write_text(json.dumps({"config": config, "results": results}, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark vector store search: ChromaDB vs. the NumPy memmap store
+
+Fills each store with the same synthetic, clustered embeddings, then reports
+insertion time, query p50/p99 latency, recall@k against exact float32 search
+and the size of the embedding matrix.
+
+Usage (from the project root):
+    python -m benchmarks.bench_vector_store --rows 10000 50000
+    python -m benchmarks.bench_vector_store --stores numpy:float32 numpy:float16 --rows 200000
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from vector_store import create_vector_store
+
+STORES = ["chroma", "numpy:float32", "numpy:float16"]
+
+
+def synthetic_embeddings(rng: np.random.Generator, rows: int, dimensions: int) -> np.ndarray:
+    """Normalized embeddings grouped around topics, like chunks of related documents"""
+    centers = rng.normal(size=(max(rows // 100, 1), dimensions))
+    vectors = centers[rng.integers(len(centers), size=rows)] + rng.normal(
+        scale=0.6, size=(rows, dimensions)
+    )
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def bench_store(spec: str, directory: Path, embeddings, queries, expected, k: int, batch: int):
+    """Fill one store and time its queries"""
+    kind, _, dtype = spec.partition(":")
+    store = create_vector_store(kind, "benchmark", str(directory), dtype or "float32")
+    store.clear()
+
+    start = time.perf_counter()
+    for first in range(0, len(embeddings), batch):
+        rows = range(first, min(first + batch, len(embeddings)))
+        store.add(
+            [str(row) for row in rows],
+            embeddings[first : first + batch].tolist(),
+            [f"chunk {row}" for row in rows],
+            [{"doc_id": str(row // 20), "chunk_index": row % 20} for row in rows],
+        )
+    insert_seconds = time.perf_counter() - start
+
+    # Warm up before timing
+    store.query(queries[0].tolist(), k)
+
+    latencies = []
+    recalls = []
+    for query, exact in zip(queries, expected, strict=True):
+        start = time.perf_counter()
+        _, texts, _, _ = store.query(query.tolist(), k)
+        latencies.append(time.perf_counter() - start)
+        found = {int(text.split()[1]) for text in texts}
+        recalls.append(len(found & exact) / k)
+
+    latencies.sort()
+    itemsize = np.dtype(dtype).itemsize if kind == "numpy" else 4
+    return {
+        "insert_seconds": round(insert_seconds, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000, 3),
+        f"recall_at_{k}": round(statistics.mean(recalls), 4),
+        "matrix_mb": round(embeddings.shape[0] * embeddings.shape[1] * itemsize / 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stores", nargs="+", choices=STORES, default=STORES)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per add call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    print(
+        f"{'rows':>8} {'store':<14} {'insert s':>9} {'p50 ms':>8} {'p99 ms':>8}"
+        f" {'recall':>7} {'matrix MB':>10}"
+    )
+    for rows in args.rows:
+        embeddings = synthetic_embeddings(rng, rows, args.dimensions)
+        queries = embeddings[rng.integers(rows, size=args.queries)] + rng.normal(
+            scale=0.05, size=(args.queries, args.dimensions)
+        ).astype(np.float32)
+        scores = queries @ embeddings.T
+        expected = [set(row) for row in np.argpartition(-scores, args.k, axis=1)[:, : args.k]]
+
+        for spec in args.stores:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                metrics = bench_store(
+                    spec, Path(tmp_dir), embeddings, queries, expected, args.k, args.batch_size
+                )
+            results.append({"rows": rows, "store": spec, **metrics})
+            print(
+                f"{rows:>8} {spec:<14} {metrics['insert_seconds']:>9.2f}"
+                f" {metrics['p50_ms']:>8.3f} {metrics['p99_ms']:>8.3f}"
+                f" {metrics[f'recall_at_{args.k}']:>7.4f} {metrics['matrix_mb']:>10.1f}"
+            )
+
+    if args.output:
+        config = {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in vars(args).items()
+        }
+        args.output.write_text(json.dumps({"config": config, "results": results}, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+Load-test the API offline with stand-ins for Gemini and, optionally, the embedding model
+
+Starts the backend in a child process on a local port, with Gemini replaced
+by StubGenerativeModel (configurable time to first token and token rate) and
+the embedding model by the hashing stand-in unless another runtime is chosen.
+Each concurrency level runs that many clients for a fixed time, each sending
+a weighted mix of /chat, /chat/stream and /upload requests back to back, then
+waits for the queued uploads to be indexed. Reports requests/s, p50/p95/p99
+latency and error rate per request kind, and time to first token for streams.
+
+Nothing leaves the machine: the server and the clients talk over loopback.
+Without --embedder hashing, the embedding model must be in the local Hugging
+Face cache.
+
+Usage (from the project root):
+    python -m benchmarks.load_test --concurrency 1 8 32 --duration 20
+    python -m benchmarks.load_test --mix chat=6,stream=3,upload=1 --llm-latency-ms 1500
+    python -m benchmarks.load_test --embedder torch --llm-tokens-per-second 100 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from benchmarks.stubs import EMBEDDER_CHOICES
+from benchmarks.synthetic import sentences
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Request kinds of a traffic mix
+REQUEST_KINDS = ["chat", "stream", "upload"]
+
+# Seconds between polls of the readiness and job endpoints
+POLL_INTERVAL = 0.2
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """Parse a traffic mix such as "chat=8,stream=1,upload=1" into weights per kind"""
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in REQUEST_KINDS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown request kind: {kind} (expected one of {REQUEST_KINDS})"
+            )
+        try:
+            mix[kind] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight for {kind}: {weight}") from None
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("The mix needs at least one positive weight")
+    return mix
+
+
+def serve(args: argparse.Namespace):
+    """Run the API with the stand-in models; the child process of the load test"""
+    import google.generativeai as genai
+    import rag_engine
+    import uvicorn
+
+    from benchmarks.stubs import HashingEmbedder, StubGenerativeModel
+
+    genai.GenerativeModel = lambda *_, **__: StubGenerativeModel(
+        args.llm_latency_ms, args.llm_tokens_per_second, args.answer_tokens, args.llm_error_rate
+    )
+    if args.embedder == "hashing":
+        rag_engine.load_embedder = lambda *_: HashingEmbedder(
+            call_latency_ms=args.embed_latency_ms, row_latency_ms=args.embed_row_latency_ms
+        )
+
+    import main
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.serve, log_level="warning")
+
+
+def start_server(args: argparse.Namespace, work_dir: Path) -> tuple[subprocess.Popen, str]:
+    """Start the API in a child process working in work_dir, returning it and its URL"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(PROJECT_DIR), os.getenv("PYTHONPATH")])),
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+        "GEMINI_API_KEY": "offline",
+        "GEMINI_MODEL": "stub",
+        "CHROMA_PERSIST_DIRECTORY": str(work_dir / "index"),
+        "VECTOR_STORE": args.vector_store,
+        # The hashing stand-in has no tokenizer to size chunks with
+        "CHUNKING_MODE": "chars" if args.embedder == "hashing" else "tokens",
+    }
+    if args.embedder != "hashing":
+        env["EMBEDDING_BACKEND"] = args.embedder
+
+    command = [sys.executable, "-m", "benchmarks.load_test", "--serve", str(port)]
+    for option in (
+        "embedder",
+        "embed_latency_ms",
+        "embed_row_latency_ms",
+        "llm_latency_ms",
+        "llm_tokens_per_second",
+        "answer_tokens",
+        "llm_error_rate",
+    ):
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+
+    process = subprocess.Popen(command, cwd=work_dir, env=env)
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_until_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float):
+    """Wait for /readyz to report the components loaded, returning their startup timings"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            response = await client.get("/readyz")
+            status = response.json()
+            if response.status_code == 200:
+                return status["components"]
+            if status.get("status") == "failed":
+                raise RuntimeError(f"Server failed to start: {status['error']}")
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(POLL_INTERVAL)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+def make_document(rng: random.Random, sentence_count: int) -> bytes:
+    """Text document with unique content, so uploads are never skipped as duplicates"""
+    return "\n".join([f"Document {uuid.uuid4()}.", *sentences(rng, sentence_count)]).encode()
+
+
+async def wait_for_jobs(client: httpx.AsyncClient, job_ids: list[str]) -> Counter:
+    """Wait for ingestion jobs to finish, returning the number in each final status"""
+    statuses = Counter()
+    for job_id in job_ids:
+        while True:
+            job = (await client.get(f"/jobs/{job_id}")).json()
+            if job.get("status") in ("completed", "failed", None):
+                statuses[job.get("status") or "unknown"] += 1
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+    return statuses
+
+
+async def send_chat(client: httpx.AsyncClient, question: str, record: dict):
+    response = await client.post(
+        "/chat", json={"message": question, "session_id": f"load-{uuid.uuid4()}"}
+    )
+    record["status"] = response.status_code
+
+
+async def send_stream(client: httpx.AsyncClient, question: str, record: dict):
+    payload = {"message": question, "session_id": f"load-{uuid.uuid4()}"}
+    async with client.stream("POST", "/chat/stream", json=payload) as response:
+        record["status"] = response.status_code
+        async for line in response.aiter_lines():
+            if line == "event: token" and "first_token" not in record:
+                record["first_token"] = time.perf_counter() - record["start"]
+            elif line == "event: error":
+                record["status"] = "stream error"
+            elif line == "event: done":
+                record["done"] = True
+    if record["status"] == 200 and not record.get("done"):
+        record["status"] = "stream incomplete"
+
+
+async def send_upload(client: httpx.AsyncClient, document: bytes, record: dict):
+    response = await client.post(
+        "/upload", files={"file": (f"load-{uuid.uuid4().hex}.txt", document, "text/plain")}
+    )
+    record["status"] = response.status_code
+    if response.status_code == 202:
+        record["job_id"] = response.json()["job_id"]
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    mix: dict[str, float],
+    concurrency: int,
+    duration: float,
+    rng: random.Random,
+    upload_sentences: int,
+) -> tuple[list[dict], float]:
+    """Send requests from concurrency clients for duration seconds, returning their records"""
+    kinds, weights = list(mix), list(mix.values())
+    records = []
+    deadline = time.perf_counter() + duration
+
+    async def client_loop():
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            record = {"kind": kind, "start": time.perf_counter()}
+            try:
+                if kind == "upload":
+                    await send_upload(client, make_document(rng, upload_sentences), record)
+                elif kind == "stream":
+                    await send_stream(client, " ".join(sentences(rng, 1)), record)
+                else:
+                    await send_chat(client, " ".join(sentences(rng, 1)), record)
+            except httpx.HTTPError as e:
+                record["status"] = type(e).__name__
+            record["latency"] = time.perf_counter() - record["start"]
+            records.append(record)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return records, time.perf_counter() - start
+
+
+def summarize(records: list[dict], elapsed: float) -> dict:
+    """Throughput, latency percentiles and errors of a set of request records"""
+    latencies = sorted(record["latency"] for record in records)
+    errors = Counter(
+        str(record["status"]) for record in records if record["status"] not in (200, 202)
+    )
+    summary = {
+        "requests": len(records),
+        "rps": round(len(records) / elapsed, 2),
+        "p50_ms": percentile_ms(latencies, 0.50),
+        "p95_ms": percentile_ms(latencies, 0.95),
+        "p99_ms": percentile_ms(latencies, 0.99),
+        "error_rate": round(sum(errors.values()) / len(records), 4) if records else 0.0,
+        "errors": dict(errors),
+    }
+    first_tokens = sorted(record["first_token"] for record in records if "first_token" in record)
+    if first_tokens:
+        summary["first_token_p50_ms"] = percentile_ms(first_tokens, 0.50)
+        summary["first_token_p95_ms"] = percentile_ms(first_tokens, 0.95)
+    return summary
+
+
+def percentile_ms(sorted_seconds: list[float], fraction: float) -> float | None:
+    if not sorted_seconds:
+        return None
+    index = min(int(len(sorted_seconds) * fraction), len(sorted_seconds) - 1)
+    return round(sorted_seconds[index] * 1000, 1)
+
+
+async def run(args: argparse.Namespace, url: str, process: subprocess.Popen) -> dict:
+    """Seed the index, run every concurrency level and collect the results"""
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 1)
+    async with httpx.AsyncClient(
+        base_url=url, timeout=args.request_timeout, limits=limits
+    ) as client:
+        startup = await wait_until_ready(client, process, args.startup_timeout)
+        print(f"Server ready: {startup}")
+
+        # Index some documents first, so chat requests retrieve real context
+        seed_jobs = []
+        for _ in range(args.documents):
+            record = {}
+            await send_upload(client, make_document(rng, args.upload_sentences), record)
+            if "job_id" in record:
+                seed_jobs.append(record["job_id"])
+        print(f"Seeded documents: {dict(await wait_for_jobs(client, seed_jobs))}")
+
+        results = []
+        print(
+            f"{'clients':>7} {'kind':<7} {'requests':>8} {'req/s':>8} {'p50 ms':>9}"
+            f" {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'ttft p50':>9}"
+        )
+        for concurrency in args.concurrency:
+            records, elapsed = await run_level(
+                client, args.mix, concurrency, args.duration, rng, args.upload_sentences
+            )
+
+            # Uploads return once queued, so also time how long indexing them takes
+            start = time.perf_counter()
+            jobs = await wait_for_jobs(client, [r["job_id"] for r in records if "job_id" in r])
+            drain_seconds = time.perf_counter() - start
+
+            level = {
+                "concurrency": concurrency,
+                "elapsed_seconds": round(elapsed, 2),
+                "all": summarize(records, elapsed),
+                "ingestion": {**jobs, "drain_seconds": round(drain_seconds, 2)},
+            }
+            for kind in args.mix:
+                level[kind] = summarize([r for r in records if r["kind"] == kind], elapsed)
+            results.append(level)
+
+            for kind in ["all", *args.mix]:
+                metrics = level[kind]
+                print(
+                    f"{concurrency:>7} {kind:<7} {metrics['requests']:>8} {metrics['rps']:>8.2f}"
+                    f" {_format_ms(metrics['p50_ms'])} {_format_ms(metrics['p95_ms'])}"
+                    f" {_format_ms(metrics['p99_ms'])} {metrics['error_rate']:>7.2%}"
+                    f" {_format_ms(metrics.get('first_token_p50_ms'))}"
+                )
+            if "upload" in args.mix:
+                print(f"{'':>7} indexed {dict(jobs)} in {drain_seconds:.1f}s after the run")
+
+        server_stats = (await client.get("/stats")).json()
+        return {"startup": startup, "results": results, "server_stats": server_stats}
+
+
+def _format_ms(value: float | None) -> str:
+    return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per level")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default="chat=8,stream=1,upload=1",
+        help="Weights of the request kinds: chat, stream and upload",
+    )
+    parser.add_argument("--documents", type=int, default=20, help="Documents indexed first")
+    parser.add_argument(
+        "--upload-sentences", type=int, default=200, help="Sentences per uploaded document"
+    )
+    parser.add_argument("--embedder", choices=EMBEDDER_CHOICES, default="hashing")
+    parser.add_argument(
+        "--embed-latency-ms",
+        type=float,
+        default=5.0,
+        help="Simulated fixed cost per call of the hashing embedder",
+    )
+    parser.add_argument(
+        "--embed-row-latency-ms",
+        type=float,
+        default=1.0,
+        help="Simulated cost per text embedded by the hashing embedder",
+    )
+    parser.add_argument(
+        "--llm-latency-ms", type=float, default=500.0, help="Stub LLM time to first token"
+    )
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=150, help="Tokens per stub answer")
+    parser.add_argument(
+        "--llm-error-rate", type=float, default=0.0, help="Fraction of stub LLM calls that fail"
+    )
+    parser.add_argument("--vector-store", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="load-test-") as tmp_dir:
+        process, url = start_server(args, Path(tmp_dir))
+        try:
+            report = asyncio.run(run(args, url, process))
+        finally:
+            process.terminate()
+            process.wait()
+
+    llm = report["server_stats"].get("llm", {})
+    print(f"llm: {llm}")
+
+    if args.output:
+        config = {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in vars(args).items()
+            if key != "serve"
+        }
+        args.output.write_text(json.dumps({"config": config, **report}, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
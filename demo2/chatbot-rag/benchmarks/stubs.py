@@ -0,0 +1,113 @@
+"""Offline stand-ins for the models the backend normally downloads or calls"""
+
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from embedders import EMBEDDING_BACKENDS, EMBEDDING_MODEL, load_embedder
+from google.api_core import exceptions as google_exceptions
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embedder with the same interface as SentenceTransformer.encode
+
+    Words are hashed into a fixed number of dimensions and the vector is
+    L2-normalized, so similar texts still get similar embeddings. It needs no
+    model download, which makes benchmarks runnable on machines without a
+    cached model, but its timings say nothing about the real model's cost.
+    call_latency_ms per encode() call plus row_latency_ms per sentence can
+    stand in for the cost of a model forward pass, whose fixed overhead is
+    shared by a batch but whose compute grows with its size. Calls hold a
+    shared lock while "computing", like forward passes competing for the
+    same CPU cores. Measure both costs on the real model before reading the
+    results as anything more than a model of batching.
+    """
+
+    _device = threading.Lock()
+
+    def __init__(
+        self, dimensions: int = 384, call_latency_ms: float = 0.0, row_latency_ms: float = 0.0
+    ):
+        self.dimensions = dimensions
+        self.call_latency = call_latency_ms / 1000
+        self.row_latency = row_latency_ms / 1000
+        self.tokenizer = None
+        self.max_seq_length = 256
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimensions
+
+    def encode(self, sentences: list[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        latency = self.call_latency + self.row_latency * len(sentences)
+        if latency:
+            with self._device:
+                time.sleep(latency)
+        embeddings = np.zeros((len(sentences), self.dimensions), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for word in TOKEN_PATTERN.findall(sentence.lower()):
+                digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+                embeddings[row, int.from_bytes(digest, "little") % self.dimensions] += 1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+# Choices for the --embedder option of the benchmarks
+EMBEDDER_CHOICES = [*EMBEDDING_BACKENDS, "hashing"]
+
+
+def load_benchmark_embedder(name: str, call_latency_ms: float = 0.0, row_latency_ms: float = 0.0):
+    """Load the embedding model with one of the backend runtimes, or the hashing stand-in"""
+    if name == "hashing":
+        return HashingEmbedder(call_latency_ms=call_latency_ms, row_latency_ms=row_latency_ms)
+    return load_embedder(EMBEDDING_MODEL, name)
+
+
+class StubGenerativeModel:
+    """
+    Stand-in for genai.GenerativeModel that answers locally, paced like a remote model
+
+    Each call waits latency_ms before the first token, then produces
+    answer_tokens words at tokens_per_second, streamed or all at once. Calls
+    do not compete with each other, as requests to a hosted model would not.
+    A fraction error_rate of calls fails with ServiceUnavailable, which
+    LLMClient retries like a real transient error.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 500.0,
+        tokens_per_second: float = 50.0,
+        answer_tokens: int = 150,
+        error_rate: float = 0.0,
+    ):
+        self.latency = latency_ms / 1000
+        self.token_interval = 1 / tokens_per_second if tokens_per_second > 0 else 0.0
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self._random = random.Random(0)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        await asyncio.sleep(self.latency)
+        if self._random.random() < self.error_rate:
+            raise google_exceptions.ServiceUnavailable("Stub model error")
+        if stream:
+            return self._stream()
+        await asyncio.sleep(self.token_interval * self.answer_tokens)
+        return SimpleNamespace(text="".join(self._pieces()))
+
+    async def _stream(self):
+        for i, piece in enumerate(self._pieces()):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            yield SimpleNamespace(text=piece)
+
+    def _pieces(self) -> list[str]:
+        return [f"word{i} " for i in range(self.answer_tokens)]
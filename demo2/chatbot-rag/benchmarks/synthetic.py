@@ -0,0 +1,249 @@
+"""Generators for synthetic benchmark documents"""
+
+import random
+from pathlib import Path
+
+import docx
+import openpyxl
+from docx.enum.text import WD_BREAK
+from pptx import Presentation
+from pptx.util import Inches
+
+# Lines of text that make up one "page" in every generated format
+LINES_PER_PAGE = 45
+
+# File extension written for each corpus format
+FORMATS = {
+    "pdf": ".pdf",
+    "docx": ".docx",
+    "xlsx": ".xlsx",
+    "pptx": ".pptx",
+    "txt": ".txt",
+    "md": ".md",
+}
+
+WORDS = [
+    "policy",
+    "account",
+    "invoice",
+    "customer",
+    "retention",
+    "quarterly",
+    "revenue",
+    "forecast",
+    "compliance",
+    "audit",
+    "network",
+    "latency",
+    "throughput",
+    "service",
+    "contract",
+    "renewal",
+    "warranty",
+    "shipment",
+    "inventory",
+    "supplier",
+    "region",
+    "budget",
+    "headcount",
+    "roadmap",
+    "release",
+    "incident",
+    "review",
+    "security",
+    "access",
+    "token",
+    "database",
+    "replica",
+    "index",
+    "query",
+    "cache",
+    "cluster",
+    "deployment",
+]
+
+
+def sentences(rng: random.Random, count: int) -> list[str]:
+    """Generate count random sentences"""
+    result = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(6, 18))
+        result.append(" ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+    return result
+
+
+def write_pdf(path: Path, pages: int, lines_per_page: int = LINES_PER_PAGE, seed: int = 0) -> Path:
+    """
+    Write a text-only PDF without any PDF library
+
+    Args:
+        path: Output file path
+        pages: Number of pages
+        lines_per_page: Lines of text on each page
+        seed: Random seed for the generated text
+
+    Returns:
+        The output path
+    """
+    rng = random.Random(seed)
+    font_id = 3
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        font_id: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+
+    page_ids = []
+    for page in range(pages):
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        page_ids.append(page_id)
+
+        lines = [line.replace("(", "").replace(")", "") for line in sentences(rng, lines_per_page)]
+        text = " T* ".join(f"({line[:95]}) Tj" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 36 806 Td {text} ET".encode("latin-1")
+
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        objects[content_id] = (
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode()
+
+    # Serialize objects and build the cross-reference table
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(output)
+        output += f"{obj_id} 0 obj\n".encode() + objects[obj_id] + b"\nendobj\n"
+
+    xref_offset = len(output)
+    size = max(objects) + 1
+    output += f"xref\n0 {size}\n0000000000 65535 f \n".encode()
+    for obj_id in range(1, size):
+        output += f"{offsets[obj_id]:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+
+    path.write_bytes(bytes(output))
+    return path
+
+
+def write_xlsx(path: Path, rows: int, columns: int = 8, sheets: int = 1, seed: int = 0) -> Path:
+    """
+    Write a workbook of mixed text and numeric cells in openpyxl's write-only mode
+
+    Args:
+        path: Output file path
+        rows: Rows per sheet
+        columns: Columns per row
+        sheets: Number of sheets
+        seed: Random seed for the generated cells
+
+    Returns:
+        The output path
+    """
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet_index in range(sheets):
+        sheet = workbook.create_sheet(f"Sheet{sheet_index + 1}")
+        sheet.append([f"column_{i}" for i in range(columns)])
+        for row in range(rows):
+            sheet.append(
+                [row, *(rng.choice(WORDS) for _ in range(columns - 3)), rng.random(), None]
+            )
+    workbook.save(path)
+    return path
+
+
+def write_docx(path: Path, pages: int, seed: int = 0) -> Path:
+    """Write a Word document with one paragraph per line and a page break per page"""
+    rng = random.Random(seed)
+    document = docx.Document()
+    for page in range(pages):
+        document.add_heading(f"Section {page + 1}", level=2)
+        for line in sentences(rng, LINES_PER_PAGE - 1):
+            document.add_paragraph(line)
+        document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.save(path)
+    return path
+
+
+def write_pptx(path: Path, slides: int, seed: int = 0) -> Path:
+    """Write a presentation with a title and a text box of bullet lines per slide"""
+    rng = random.Random(seed)
+    presentation = Presentation()
+    layout = presentation.slide_layouts[5]  # Title only
+    for slide_number in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {slide_number + 1}"
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(1.5), Inches(9), Inches(5))
+        box.text_frame.text = "\n".join(sentences(rng, LINES_PER_PAGE - 1))
+    presentation.save(path)
+    return path
+
+
+def write_text(path: Path, pages: int, markdown: bool = False, seed: int = 0) -> Path:
+    """Write a plain text or Markdown file of pages worth of lines"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for page in range(pages):
+            if markdown:
+                f.write(f"## Section {page + 1}\n\n")
+            for line in sentences(rng, LINES_PER_PAGE - 1):
+                f.write(f"- {line}\n" if markdown else f"{line}\n")
+            f.write("\n")
+    return path
+
+
+def write_document(path: Path, fmt: str, pages: int, seed: int = 0) -> Path:
+    """
+    Write a synthetic document of roughly pages pages in the given format
+
+    Args:
+        path: Output file path
+        fmt: One of FORMATS
+        pages: Size of the document in pages (slides for pptx, 45-row blocks for xlsx)
+        seed: Random seed for the generated content
+
+    Returns:
+        The output path
+    """
+    if fmt == "pdf":
+        return write_pdf(path, pages, seed=seed)
+    if fmt == "docx":
+        return write_docx(path, pages, seed=seed)
+    if fmt == "xlsx":
+        return write_xlsx(path, pages * LINES_PER_PAGE, seed=seed)
+    if fmt == "pptx":
+        return write_pptx(path, pages, seed=seed)
+    if fmt in ("txt", "md"):
+        return write_text(path, pages, markdown=fmt == "md", seed=seed)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def generate_corpus(
+    directory: Path, formats: list[str], files_per_format: int, pages_per_file: int, seed: int = 0
+) -> list[tuple[Path, str, int]]:
+    """
+    Write a corpus of synthetic documents
+
+    Args:
+        directory: Output directory
+        formats: Formats to generate, see FORMATS
+        files_per_format: Documents written per format
+        pages_per_file: Size of each document in pages
+        seed: Base random seed
+
+    Returns:
+        List of (path, format, pages) tuples
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    corpus = []
+    for fmt in formats:
+        for i in range(files_per_format):
+            path = directory / f"{fmt}_{i:04d}{FORMATS[fmt]}"
+            write_document(path, fmt, pages_per_file, seed=seed + i)
+            corpus.append((path, fmt, pages_per_file))
+    return corpus
@@ -1,4 +1,6 @@
+import json
 import os
+import time
 from pathlib import Path
 
 import gradio as gr
@@ -12,7 +14,7 @@ session_id = None
 
 
 def upload_file(file):
-    """Upload file to backend"""
+    """Upload file to backend and wait for it to be processed"""
     if file is None:
         return "Please select a file to upload."
 
@@ -23,54 +25,98 @@ def upload_file(file):
 
         if response.status_code == 200:
             result = response.json()
-            return f"✅ Successfully uploaded: {result['filename']}\n📊 Processed {result['chunks_processed']} text chunks"
+            return f"♻️ Already indexed: {result['filename']}\n📊 {result['chunks_processed']} text chunks"
+        elif response.status_code == 202:
+            return wait_for_job(response.json()["job_id"])
         else:
             return f"❌ Error: {response.json().get('detail', 'Upload failed')}"
     except Exception as e:
         return f"❌ Error uploading file: {e!s}"
 
 
+def wait_for_job(job_id: str, poll_interval: float = 1.0):
+    """Poll an ingestion job until it finishes"""
+    while True:
+        response = requests.get(f"{API_URL}/jobs/{job_id}")
+        if response.status_code != 200:
+            return f"❌ Error: {response.json().get('detail', 'Upload failed')}"
+
+        job = response.json()
+        if job["status"] == "completed":
+            if job["duplicate"]:
+                return f"♻️ Already indexed: {job['filename']}\n📊 {job['chunks_done']} text chunks"
+            return f"✅ Successfully uploaded: {job['filename']}\n📊 Processed {job['chunks_done']} text chunks"
+        if job["status"] == "failed":
+            return f"❌ Error processing {job['filename']}: {job['error']}"
+
+        time.sleep(poll_interval)
+
+
 def chat(message: str, history: list[tuple[str, str]], use_rag: bool):
-    """Send message to chatbot"""
+    """Send message to chatbot, showing the answer as it is generated"""
     global session_id
 
     if not message.strip():
-        return history, ""
+        yield history, ""
+        return
 
     try:
         # Add user message to history
         history = [*history, (message, None)]
+        yield history, ""
 
         # Prepare request
         payload = {"message": message, "session_id": session_id, "use_rag": use_rag}
 
         # Send to backend
-        response = requests.post(f"{API_URL}/chat", json=payload)
-
-        if response.status_code == 200:
-            result = response.json()
-            session_id = result["session_id"]
-
-            bot_response = result["response"]
-
-            # Add sources if available
-            if result.get("sources"):
-                sources_text = "\n\n📚 **Sources:** " + ", ".join(result["sources"])
-                bot_response += sources_text
-
-            # Update history with bot response
-            history[-1] = (message, bot_response)
-
-            return history, ""
-        else:
-            error_msg = f"Error: {response.json().get('detail', 'Request failed')}"
-            history[-1] = (message, error_msg)
-            return history, ""
+        with requests.post(f"{API_URL}/chat/stream", json=payload, stream=True) as response:
+            if response.status_code != 200:
+                error_msg = f"Error: {response.json().get('detail', 'Request failed')}"
+                history[-1] = (message, error_msg)
+                yield history, ""
+                return
+
+            bot_response = ""
+            sources = []
+            for event, data in read_events(response):
+                if event == "sources":
+                    session_id = data["session_id"]
+                    sources = data["sources"]
+                elif event == "token":
+                    bot_response += data["text"]
+                    history[-1] = (message, bot_response)
+                    yield history, ""
+                elif event == "error":
+                    history[-1] = (message, f"Error: {data['detail']}")
+                    yield history, ""
+                    return
+
+        # Add sources if available
+        if sources:
+            sources_text = "\n\n📚 **Sources:** " + ", ".join(sources)
+            bot_response += sources_text
+
+        # Update history with bot response
+        history[-1] = (message, bot_response)
+        yield history, ""
 
     except Exception as e:
         error_msg = f"Error: {e!s}"
         history[-1] = (message, error_msg)
-        return history, ""
+        yield history, ""
+
+
+def read_events(response: requests.Response):
+    """Parse a server-sent event stream into (event, data) pairs"""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:") :].strip())
+        elif not line and data:
+            yield event, json.loads("\n".join(data))
+            event, data = "message", []
 
 
 def clear_documents():
@@ -88,18 +134,28 @@ def clear_documents():
 def list_documents():
     """List all uploaded documents"""
     try:
-        response = requests.get(f"{API_URL}/documents")
-        if response.status_code == 200:
-            docs = response.json().get("documents", [])
-            if not docs:
-                return "No documents uploaded yet."
-
-            doc_list = "📁 **Uploaded Documents:**\n\n"
-            for i, doc in enumerate(docs, 1):
-                doc_list += f"{i}. {doc.get('source', 'Unknown')}\n"
-            return doc_list
-        else:
-            return f"❌ Error: {response.json().get('detail', 'Request failed')}"
+        docs = []
+        cursor = None
+        while True:
+            params = {"limit": 1000, "cursor": cursor} if cursor else {"limit": 1000}
+            response = requests.get(f"{API_URL}/documents", params=params)
+            if response.status_code != 200:
+                return f"❌ Error: {response.json().get('detail', 'Request failed')}"
+            page = response.json()
+            docs.extend(page.get("documents", []))
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+
+        if not docs:
+            return "No documents uploaded yet."
+
+        doc_list = "📁 **Uploaded Documents:**\n\n"
+        for i, doc in enumerate(docs, 1):
+            doc_list += (
+                f"{i}. {doc.get('source', 'Unknown')} ({doc.get('chunk_count', 0)} chunks)\n"
+            )
+        return doc_list
     except Exception as e:
         return f"❌ Error: {e!s}"
 
@@ -0,0 +1,37 @@
+# Test configuration
+#
+# The backend modules import each other by bare name (they are run from the
+# backend directory), so make them importable when running `pytest` from the
+# project root, along with the offline stand-ins in benchmarks.stubs.
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+for path in (PROJECT_DIR, PROJECT_DIR / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """Create RAGEngines with the hashing embedder and a local stand-in for Gemini"""
+    import google.generativeai as genai
+    import rag_engine
+
+    from benchmarks.stubs import HashingEmbedder, StubGenerativeModel
+
+    monkeypatch.setattr(rag_engine, "load_embedder", lambda *_: HashingEmbedder())
+    monkeypatch.setattr(
+        genai, "GenerativeModel", lambda *_, **__: StubGenerativeModel(latency_ms=0)
+    )
+    # Sessions are kept relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+    def make(**options) -> rag_engine.RAGEngine:
+        options.setdefault("persist_directory", str(tmp_path / "index"))
+        options.setdefault("collection_idle_seconds", 0)
+        return rag_engine.RAGEngine(**options)
+
+    return make
@@ -0,0 +1,79 @@
+from context_builder import MIN_PARTIAL_TOKENS, estimate_tokens, pack_context
+
+TEXT = " ".join(f"word{i}" for i in range(200))
+
+
+def span(doc_id: str, index: int, start: int, end: int, offsets: bool = True):
+    """A chunk of TEXT with its metadata"""
+    metadata = {"doc_id": doc_id, "chunk_index": index}
+    if offsets:
+        metadata.update(start_offset=start, end_offset=end)
+    return TEXT[start:end], metadata
+
+
+def pack(hits, token_budget=0):
+    chunks, metadatas = zip(*hits, strict=True)
+    return pack_context(list(chunks), list(metadatas), token_budget)
+
+
+def test_overlapping_chunks_with_offsets_are_merged():
+    hits = [span("a", 1, 80, 200), span("a", 0, 0, 120), span("a", 2, 160, 300)]
+    assert pack(hits) == [TEXT[0:300]]
+
+
+def test_overlapping_chunks_without_offsets_are_merged():
+    hits = [
+        span("a", 0, 0, 120, offsets=False),
+        span("a", 1, 60, 200, offsets=False),
+    ]
+    assert pack(hits) == [TEXT[0:200]]
+
+
+def test_chunks_without_overlap_are_joined_with_a_space():
+    # The space between the spans was trimmed from both chunks
+    assert pack([span("a", 0, 0, 5), span("a", 1, 6, 11)]) == [TEXT[0:11]]
+    assert pack([span("a", 0, 0, 5, False), span("a", 1, 6, 11, False)]) == [TEXT[0:11]]
+
+
+def test_non_adjacent_chunks_stay_separate():
+    hits = [span("a", 3, 300, 400), span("a", 0, 0, 100), span("a", 1, 200, 250)]
+    # Chunks 0 and 1 are numbered consecutively but their spans do not meet
+    assert pack(hits) == [TEXT[300:400], TEXT[0:100], TEXT[200:250]]
+
+
+def test_documents_are_grouped_most_relevant_first():
+    hits = [
+        span("b", 5, 500, 560),
+        span("a", 0, 0, 60),
+        span("b", 1, 100, 160),
+        span("a", 4, 400, 460),
+    ]
+    assert pack(hits) == [TEXT[500:560], TEXT[100:160], TEXT[0:60], TEXT[400:460]]
+
+
+def test_budget_keeps_the_most_relevant_passages():
+    first, second, third = TEXT[0:400], TEXT[800:1000], TEXT[500:700]
+    hits = [span("a", 0, 0, 400), span("a", 10, 800, 1000), span("a", 5, 500, 700)]
+
+    # Nothing is left for the third passage, not even enough to truncate it
+    budget = estimate_tokens(first) + estimate_tokens(second)
+    assert pack(hits, budget) == [first, second]
+    assert pack(hits) == [first, second, third]
+
+
+def test_budget_truncates_the_last_passage_at_a_word():
+    hits = [span("a", 0, 0, 40), span("b", 0, 0, 1000)]
+    budget = estimate_tokens(TEXT[0:40]) + MIN_PARTIAL_TOKENS
+    first, truncated = pack(hits, budget)
+
+    assert first == TEXT[0:40]
+    assert truncated.endswith(" ...")
+    body = truncated[: -len(" ...")]
+    assert TEXT.startswith(body + " ")
+    assert estimate_tokens(body) <= MIN_PARTIAL_TOKENS
+
+
+def test_passages_below_the_smallest_partial_are_dropped():
+    hits = [span("a", 0, 0, 400), span("b", 0, 0, 1000)]
+    budget = estimate_tokens(TEXT[0:400]) + MIN_PARTIAL_TOKENS - 1
+    assert pack(hits, budget) == [TEXT[0:400]]
@@ -0,0 +1,93 @@
+import pytest
+from document_registry import DocumentRegistry
+
+
+def add_documents(registry: DocumentRegistry, start: int, stop: int):
+    for i in range(start, stop):
+        registry.add(f"doc{i}", f"file{i}.txt", "2024-01-01T00:00:00", i + 1, f"hash{i}")
+
+
+def list_all(registry: DocumentRegistry, limit: int) -> list[str]:
+    doc_ids, cursor = [], None
+    while True:
+        documents, cursor = registry.list(limit=limit, cursor=cursor)
+        doc_ids.extend(document["doc_id"] for document in documents)
+        if cursor is None:
+            return doc_ids
+
+
+@pytest.mark.parametrize("limit", [1, 3, 5, 10, 100])
+def test_pages_cover_all_documents_in_order(limit):
+    registry = DocumentRegistry()
+    add_documents(registry, 0, 10)
+
+    assert list_all(registry, limit) == [f"doc{i}" for i in range(10)]
+    assert registry.count() == 10
+
+
+def test_last_page_has_no_cursor():
+    registry = DocumentRegistry()
+    add_documents(registry, 0, 4)
+
+    documents, cursor = registry.list(limit=2)
+    assert [document["doc_id"] for document in documents] == ["doc0", "doc1"]
+    documents, cursor = registry.list(limit=2, cursor=cursor)
+    assert [document["doc_id"] for document in documents] == ["doc2", "doc3"]
+    assert cursor is None
+
+
+def test_cursor_is_stable_while_documents_change():
+    registry = DocumentRegistry()
+    add_documents(registry, 0, 6)
+    first_page, cursor = registry.list(limit=3)
+
+    # Removing a listed document and adding new ones neither skips nor repeats documents
+    registry.remove("doc1")
+    add_documents(registry, 6, 8)
+    second_page, cursor = registry.list(limit=3, cursor=cursor)
+    third_page, cursor = registry.list(limit=3, cursor=cursor)
+
+    listed = [document["doc_id"] for document in first_page + second_page + third_page]
+    assert listed == [f"doc{i}" for i in range(8)]
+    assert cursor is None
+
+
+def test_records_and_duplicate_lookup():
+    registry = DocumentRegistry()
+    add_documents(registry, 0, 3)
+    registry.add("copy", "copy.txt", "2024-01-02T00:00:00", 2, "hash1")
+
+    assert registry.get("doc2") == {
+        "doc_id": "doc2",
+        "source": "file2.txt",
+        "timestamp": "2024-01-01T00:00:00",
+        "chunk_count": 3,
+        "content_hash": "hash2",
+    }
+    assert registry.get("missing") is None
+    assert registry.find_by_hash("hash1")["doc_id"] == "doc1"
+    assert registry.remove("doc1") and not registry.remove("doc1")
+    assert registry.find_by_hash("hash1")["doc_id"] == "copy"
+
+
+def test_invalid_cursor():
+    registry = DocumentRegistry()
+    with pytest.raises(ValueError):
+        registry.list(cursor="not-a-cursor")
+
+
+def test_cursor_survives_reopening(tmp_path):
+    path = str(tmp_path / "documents.sqlite3")
+    registry = DocumentRegistry(path)
+    add_documents(registry, 0, 5)
+    _, cursor = registry.list(limit=2)
+    registry.close()
+
+    reopened = DocumentRegistry(path)
+    documents, _ = reopened.list(limit=10, cursor=cursor)
+    assert [document["doc_id"] for document in documents] == ["doc2", "doc3", "doc4"]
+
+    reopened.clear()
+    assert reopened.count() == 0
+    assert reopened.list() == ([], None)
+    reopened.close()
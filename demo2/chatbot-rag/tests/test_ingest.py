@@ -0,0 +1,27 @@
+import pytest
+from ingest import Manifest, ingest
+
+
+@pytest.mark.parametrize("vector_store", ["chroma", "numpy"])
+def test_tenant_corpus_loaded_by_the_cli_is_served(tmp_path, make_engine, vector_store):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "pumps.txt").write_text("The XR-2040 pump needs a new seal every year.")
+    (corpus / "valves.txt").write_text("Valve V-7 is rated for ten bar.")
+
+    # As `ingest.py --tenant acme` runs it
+    cli = make_engine(vector_store=vector_store)
+    manifest = Manifest(tmp_path / "index" / "ingest_manifest_acme.jsonl")
+    ingester = ingest(corpus, cli, manifest, batch_size=1, workers=1, tenant="acme")
+    manifest.close()
+    assert ingester.files_indexed == 2
+    assert cli.list_documents()[0] == []
+
+    server = make_engine(vector_store=vector_store)
+    assert server.has_collection("acme")
+    documents, _ = server.list_documents(tenant="acme")
+    assert sorted(document["source"] for document in documents) == ["pumps.txt", "valves.txt"]
+    chunks, sources = server.retrieve_relevant_chunks("XR-2040 pump seal", 1, tenant="acme")
+    assert sources == ["pumps.txt"]
+    assert "XR-2040" in chunks[0]
+    assert server.retrieve_relevant_chunks("XR-2040 pump seal", 1) == ([], [])
@@ -0,0 +1,166 @@
+import math
+import random
+from collections import Counter
+
+import lexical_index
+import pytest
+from lexical_index import BM25_B, BM25_K1, BM25Index, reciprocal_rank_fusion, tokenize
+
+VOCABULARY = [f"term{i}" for i in range(40)]
+
+
+def reference_scores(chunks: dict[str, str], query: str) -> dict[str, float]:
+    """BM25 scores computed directly from the live chunks"""
+    counts = {chunk_id: Counter(tokenize(text)) for chunk_id, text in chunks.items()}
+    average_length = max(sum(sum(c.values()) for c in counts.values()) / len(counts), 1.0)
+    scores = {}
+    for term in set(tokenize(query)):
+        frequency_in_documents = sum(term in c for c in counts.values())
+        if not frequency_in_documents:
+            continue
+        idf = math.log(
+            1 + (len(counts) - frequency_in_documents + 0.5) / (frequency_in_documents + 0.5)
+        )
+        for chunk_id, c in counts.items():
+            if term in c:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(c.values()) / average_length)
+                score = idf * c[term] * (BM25_K1 + 1) / (c[term] + norm)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + score
+    return scores
+
+
+def assert_matches_reference(index: BM25Index, chunks: dict[str, str], query: str):
+    expected = reference_scores(chunks, query)
+    found = dict(index.search(query, len(chunks) + 1))
+    assert found.keys() == expected.keys()
+    for chunk_id, score in expected.items():
+        assert found[chunk_id] == pytest.approx(score, rel=1e-5)
+
+
+def random_chunks(rng: random.Random, start: int, stop: int) -> dict[str, str]:
+    return {
+        f"c{i}": " ".join(rng.choices(VOCABULARY[: rng.randint(5, 40)], k=rng.randint(1, 30)))
+        for i in range(start, stop)
+    }
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("Error XR-2040 in v2.3.1") == [
+        "error",
+        "xr-2040",
+        "xr",
+        "2040",
+        "in",
+        "v2.3.1",
+        "v2",
+        "3",
+        "1",
+    ]
+
+
+def test_search_ranks_by_bm25():
+    index = BM25Index()
+    chunks = {"a": "pump XR-2040 failure", "b": "pump pump maintenance", "c": "valve"}
+    index.add(list(chunks), list(chunks.values()))
+
+    assert [chunk_id for chunk_id, _ in index.search("XR-2040", 10)] == ["a"]
+    assert [chunk_id for chunk_id, _ in index.search("pump", 10)] == ["b", "a"]
+    assert index.search("unknown", 10) == []
+    assert_matches_reference(index, chunks, "pump failure valve")
+
+
+def test_deleted_chunks_no_longer_count():
+    index = BM25Index()
+    chunks = {"a": "alpha beta", "b": "alpha gamma", "c": "delta"}
+    index.add(list(chunks), list(chunks.values()))
+    index.delete(["a", "missing"])
+    del chunks["a"]
+
+    # Terms only in deleted chunks match nothing, and idf uses live document frequencies
+    assert index.search("beta", 10) == []
+    assert_matches_reference(index, chunks, "alpha gamma delta")
+    assert index.stats()["chunks"] == 2
+
+
+def test_compaction_keeps_scores_and_renumbers_rows(monkeypatch):
+    monkeypatch.setattr(lexical_index, "COMPACT_MIN_DELETED", 8)
+    rng = random.Random(0)
+    index = BM25Index()
+    chunks = random_chunks(rng, 0, 100)
+    index.add(list(chunks), list(chunks.values()))
+
+    # Deleting more than half of the rows compacts the postings
+    deleted = rng.sample(sorted(chunks), 60)
+    index.delete(deleted)
+    for chunk_id in deleted:
+        del chunks[chunk_id]
+    assert len(index._ids) == len(chunks) == 40
+    assert all(index._alive)
+
+    postings = sum(len(set(tokenize(text))) for text in chunks.values())
+    stats = index.stats()
+    assert stats["chunks"] == 40 and stats["postings"] == postings
+    assert list(index._row_starts)[-1] == len(index._row_terms) == postings
+    for query in ("term0", "term3 term7", "term1 term20 term39"):
+        assert_matches_reference(index, chunks, query)
+
+    # Rows stay consistent across more additions, deletions and compactions
+    for round_start in range(100, 400, 100):
+        added = random_chunks(rng, round_start, round_start + 100)
+        index.add(list(added), list(added.values()))
+        chunks.update(added)
+        deleted = rng.sample(sorted(chunks), 70)
+        index.delete(deleted)
+        for chunk_id in deleted:
+            del chunks[chunk_id]
+        assert_matches_reference(index, chunks, "term2 term5 term11")
+
+    # A deleted chunk can be indexed again
+    index.add([deleted[0]], ["term0 term0 fresh"])
+    chunks[deleted[0]] = "term0 term0 fresh"
+    assert_matches_reference(index, chunks, "term0 fresh")
+
+
+def test_add_skips_indexed_chunks():
+    index = BM25Index()
+    index.add(["a"], ["alpha"])
+    index.add(["a", "b"], ["alpha alpha", "beta"])
+
+    assert index.stats()["chunks"] == 2
+    assert_matches_reference(index, {"a": "alpha", "b": "beta"}, "alpha beta")
+
+
+def test_build_skips_chunks_deleted_meanwhile():
+    index = BM25Index()
+
+    def batches():
+        yield ["a", "b"], ["alpha", "beta"]
+        # Changes made while the index is built
+        index.delete(["c"])
+        index.add(["d"], ["delta"])
+        yield ["c", "d"], ["gamma", "delta"]
+
+    index.build(batches())
+
+    assert index.ready and index.build_seconds is not None
+    assert sorted(index._rows) == ["a", "b", "d"]
+    assert_matches_reference(index, {"a": "alpha", "b": "beta", "d": "delta"}, "gamma delta")
+
+
+def test_clear_stops_a_build():
+    index = BM25Index()
+
+    def batches():
+        yield ["a"], ["alpha"]
+        index.clear()
+        yield ["b"], ["beta"]
+
+    index.build(batches())
+
+    assert index.ready
+    assert index.search("alpha beta", 10) == []
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "b"]]) == ["c", "b", "a"]
+    assert reciprocal_rank_fusion([]) == []
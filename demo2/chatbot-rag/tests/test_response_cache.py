@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+
+async def nothing():
+    pass
+
+
+def ask(engine, query: str, session_id: str, stream: bool) -> str:
+    """Answer a question as /chat or /chat/stream does"""
+
+    async def run():
+        if not stream:
+            return (await engine.generate_response(query, session_id))[0]
+        return "".join(
+            [
+                text
+                async for kind, text in engine.stream_response(query, session_id)
+                if kind == "token"
+            ]
+        )
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def engine(make_engine, monkeypatch):
+    engine = make_engine(response_cache_size=16)
+    engine.llm_calls = 0
+
+    async def generate(prompt: str) -> str:
+        engine.llm_calls += 1
+        await engine.during_llm_call()
+        return "The pump needs a new seal."
+
+    async def stream(prompt: str):
+        yield await generate(prompt)
+
+    engine.during_llm_call = nothing
+    monkeypatch.setattr(engine.llm, "generate", generate)
+    monkeypatch.setattr(engine.llm, "stream", stream)
+    return engine
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_answers_are_cached(engine, stream):
+    engine.add_documents(["The XR-2040 pump needs a new seal every year."], "pumps.txt")
+
+    ask(engine, "When does the pump need a seal?", "s1", stream)
+    ask(engine, "When does the pump need a seal?", "s2", stream)
+    assert engine.llm_calls == 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_answer_from_a_document_deleted_during_the_llm_call_is_not_cached(engine, stream):
+    doc_id = engine.add_documents(["The XR-2040 pump needs a new seal every year."], "pumps.txt")
+
+    async def delete():
+        # DELETE /documents/{doc_id} while the answer is generated
+        await asyncio.to_thread(engine.delete_document, doc_id)
+
+    engine.during_llm_call = delete
+    ask(engine, "When does the pump need a seal?", "s1", stream)
+    assert len(engine.response_cache) == 0
+
+    engine.during_llm_call = nothing
+    ask(engine, "When does the pump need a seal?", "s2", stream)
+    assert engine.llm_calls == 2
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_answer_from_a_collection_changed_during_the_llm_call_is_not_cached(engine, stream):
+    engine.add_documents(["The XR-2040 pump needs a new seal every year."], "pumps.txt")
+
+    async def upload():
+        await asyncio.to_thread(engine.add_documents, ["Valve V-7 is rated for ten bar."], "v.txt")
+
+    engine.during_llm_call = upload
+    ask(engine, "When does the pump need a seal?", "s1", stream)
+    assert len(engine.response_cache) == 0
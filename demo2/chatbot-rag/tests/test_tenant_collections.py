@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+
+import pytest
+from tenant_collections import (
+    CollectionLimitError,
+    CollectionPool,
+    tenant_collection_name,
+)
+
+
+class FakeCollection:
+    """Stands in for a Collection, recording when it is closed"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.closed = 0
+        self.closed_in_use = False
+
+    def close(self):
+        self.closed_in_use |= self.users > 0
+        self.closed += 1
+
+    def stats(self) -> dict:
+        return {"users": self.users}
+
+
+class Opener:
+    """open_collection callback counting the collections opened"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.opened: list[FakeCollection] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, name: str) -> FakeCollection:
+        time.sleep(self.delay)
+        collection = FakeCollection(name)
+        with self._lock:
+            self.opened.append(collection)
+        return collection
+
+
+def test_tenant_collection_name():
+    assert tenant_collection_name("documents", None) == "documents"
+    assert tenant_collection_name("documents", "acme-1") == "documents_acme-1"
+    for tenant in ("../etc", "a b", "-x", "x" * 49):
+        with pytest.raises(ValueError):
+            tenant_collection_name("documents", tenant)
+
+
+def test_concurrent_acquires_open_a_collection_once():
+    opener = Opener(delay=0.05)
+    pool = CollectionPool(opener, max_open=4, idle_seconds=0)
+    barrier = threading.Barrier(16)
+    acquired = []
+
+    def acquire():
+        barrier.wait()
+        acquired.append(pool.acquire("a"))
+
+    threads = [threading.Thread(target=acquire) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(opener.opened) == 1
+    assert all(collection is opener.opened[0] for collection in acquired)
+    assert opener.opened[0].users == 16
+    assert not pool._opening
+
+    for collection in acquired:
+        pool.release(collection)
+    assert opener.opened[0].users == 0
+    assert pool.is_open("a")
+
+
+def test_least_recently_used_idle_collection_is_closed():
+    opener = Opener()
+    pool = CollectionPool(opener, max_open=2, idle_seconds=0)
+    held = pool.acquire("a")
+    with pool.use("b"):
+        pass
+    with pool.use("c"):
+        pass
+
+    # "a" is the least recently used but in use, so "b" is closed instead
+    a, b, c = opener.opened
+    assert a is held and not a.closed
+    assert b.closed == 1 and not c.closed
+    assert not pool.is_open("b") and pool.is_open("a") and pool.is_open("c")
+    assert pool.stats()["evicted"] == 1
+
+    pool.release(held)
+    with pool.use("b") as reopened:
+        assert reopened is not b
+    assert a.closed == 1
+
+
+def test_collections_opened_over_capacity_are_closed_on_release():
+    opener = Opener()
+    pool = CollectionPool(opener, max_open=1, idle_seconds=0)
+    a = pool.acquire("a")
+    b = pool.acquire("b")
+    assert pool.is_open("a") and pool.is_open("b")
+
+    pool.release(b)
+    assert b.closed == 1 and not a.closed
+    pool.release(a)
+    assert pool.stats()["open"] == {"a": {"users": 0}}
+
+
+def test_idle_collections_are_closed_in_the_background():
+    opener = Opener()
+    pool = CollectionPool(opener, max_open=4, idle_seconds=0.05)
+    with pool.use("a"):
+        time.sleep(0.2)
+        # In use, so never idle
+        assert pool.is_open("a")
+
+    deadline = time.monotonic() + 5
+    while pool.is_open("a") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not pool.is_open("a")
+    assert opener.opened[0].closed == 1
+
+
+def test_concurrent_use_never_closes_a_collection_in_use():
+    opener = Opener(delay=0.001)
+    pool = CollectionPool(opener, max_open=2, idle_seconds=0)
+    names = [f"t{i}" for i in range(5)]
+    errors = []
+
+    def work(seed: int):
+        rng = random.Random(seed)
+        try:
+            for _ in range(200):
+                with pool.use(rng.choice(names)) as collection:
+                    assert not collection.closed
+                if rng.random() < 0.1:
+                    pool.evict_idle()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert not pool._opening
+    assert not any(collection.closed_in_use for collection in opener.opened)
+    assert all(collection.closed <= 1 for collection in opener.opened)
+    open_collections = [collection for collection in opener.opened if not collection.closed]
+    assert sorted(collection.name for collection in open_collections) == sorted(
+        pool.stats()["open"]
+    )
+    assert len(open_collections) <= 2
+
+
+def test_in_memory_pool_refuses_more_than_max_open():
+    opener = Opener()
+    pool = CollectionPool(opener, max_open=2, idle_seconds=0, evictable=False)
+    with pool.use("a"), pool.use("b"):
+        pass
+
+    with pytest.raises(CollectionLimitError):
+        pool.acquire("c")
+    assert not pool._opening
+    assert len(opener.opened) == 2
+    assert not any(collection.closed for collection in opener.opened)
+
+    # Open collections stay usable
+    with pool.use("a") as collection:
+        assert collection is opener.opened[0]
+
+
+def test_failed_open_can_be_retried():
+    calls = []
+
+    def open_collection(name: str) -> FakeCollection:
+        calls.append(name)
+        if len(calls) == 1:
+            raise OSError("disk unavailable")
+        return FakeCollection(name)
+
+    pool = CollectionPool(open_collection, max_open=2, idle_seconds=0)
+    with pytest.raises(OSError):
+        pool.acquire("a")
+    assert not pool._opening and not pool.is_open("a")
+
+    with pool.use("a") as collection:
+        assert collection.name == "a"
+    assert calls == ["a", "a"]